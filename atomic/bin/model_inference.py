@@ -76,8 +76,12 @@ class AnalysisParseProcessor(ParsingProcessor):
                 next_seen = Distribution({fov: 1})
             else:
                 # The next victim found is one in the player's current location
-                next_seen = {'Yellow': world.getState(WORLD, 'ctr_{}_Gold'.format(location), player_beliefs).expectation(),
-                    'Green': world.getState(WORLD, 'ctr_{}_Green'.format(location), player_beliefs).expectation()}
+                # (locations that never hold victims have no counters)
+                next_seen = {}
+                for color, ctr_color in [('Yellow', 'Gold'), ('Green', 'Green')]:
+                    ctr = stateKey(WORLD, 'ctr_{}_{}'.format(location, ctr_color))
+                    next_seen[color] = world.getFeature(ctr, player_beliefs).expectation() \
+                        if ctr in world.variables else 0
                 if sum(next_seen.values()) == 0:
                     # No victim in the current room
                     next_seen = {'Yellow': 1, 'Green': 1}
@@ -133,8 +137,10 @@ class AnalysisParseProcessor(ParsingProcessor):
 
 class Analyzer(Replayer):
 
-    def __init__(self, files=[], maps=None, models=None, ignore_models=None, mission_times={}, logger=logging):
-        super().__init__(files, maps, models, ignore_models, True, AnalysisParseProcessor(), logger)
+    def __init__(self, files=[], maps=None, models=None, ignore_models=None, mission_times={}, logger=logging,
+                 cache_dir=None):
+        super().__init__(files, maps, models, ignore_models, True, AnalysisParseProcessor(), logger,
+                         cache_dir=cache_dir)
 
         self.mission_times = mission_times
         # Set player models for observer agent
@@ -242,6 +248,7 @@ if __name__ == '__main__':
     parser.add_argument('--reward_file', help='Name of CSV file containing alternate reward functions')
     parser.add_argument('-c','--clusters', help='Name of CSV file containing reward clusters to use as basis for player models')
     parser.add_argument('--metadata', help='Name of JSON file containing raw game log for this trial')
+    parser.add_argument('--cache', help='Directory in which to store parsed logs and built worlds for later runs')
     args = vars(parser.parse_args())
     # Extract logging level from command-line argument
     level = getattr(logging, args['debug'].upper(), None)
@@ -269,7 +276,8 @@ if __name__ == '__main__':
         import atomic.model_learning.linear.post_process.clustering as clustering
 
         apply_cluster_rewards(clustering.load_cluster_reward_weights(args['reward_file']))
-    replayer = Analyzer(args['fname'], get_default_maps(logging), DEFAULT_MODELS, ignore, mission_times, logging)
+    replayer = Analyzer(args['fname'], get_default_maps(logging), DEFAULT_MODELS, ignore, mission_times, logging,
+                        args['cache'])
     if args['profile']:
         cProfile.run('replayer.process_files(args["number"])', sort=1)
     elif args['1']:
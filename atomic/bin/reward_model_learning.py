@@ -79,6 +79,8 @@ if __name__ == '__main__':
     parser.add_argument('-v', '--verbosity', action='count', default=0, help='Verbosity level.')
     parser.add_argument('--format', help='Format of images', default=IMG_FORMAT)
     parser.add_argument('-s', '--seed', type=int, default=SEED, help='Seed for random number generation.')
+    parser.add_argument('--cache',
+                        help='Directory in which to store compiled maps, parsed logs and built worlds for later runs.')
 
     parser.add_argument('-pp', '--post-process', action='store_true',
                         help='Whether to perform post-process over the data resulting from IRL.')
@@ -127,7 +129,8 @@ if __name__ == '__main__':
         seed=args.seed,
         verbosity=args.verbosity,
         processes=args.processes,
-        img_format=args.format
+        img_format=args.format,
+        cache_dir=args.cache
     )
     analyzer.process_files()
 
@@ -1,6 +1,12 @@
+import sys
+import weakref
 from psychsim.pwl import stateKey, WORLD
 from psychsim.agent import Agent
+from atomic.definitions.victims import COLORS
 from atomic.definitions.world import PHASE_FEATURE
+from atomic.definitions.world_map import VISIT_WORD_BITS
+
+_feature_keys = weakref.WeakKeyDictionary()  # registries of each world, by agent name
 
 
 def get_mission_seconds_key():
@@ -64,6 +70,39 @@ def get_num_visits_location_key(agent, location):
     return stateKey(agent.name, 'locvisits_' + location)
 
 
+def get_locations_visited_key(agent, word):
+    """
+    Gets the named key of the feature packing the visited flags of a group of locations, when visits are compact.
+    :param Agent agent: the agent for which to get the feature.
+    :param int word: the index of the group of locations.
+    :rtype: str
+    :return: the corresponding PsychSim feature key.
+    """
+    return stateKey(agent.name, 'locsvisited_{}'.format(word))
+
+
+def has_compact_visits(agent):
+    """
+    Checks whether the agent's visited locations are packed in a few features rather than counted per location.
+    :param Agent agent: the agent for which to check the features.
+    :rtype: bool
+    """
+    return get_locations_visited_key(agent, 0) in agent.world.variables
+
+
+def get_location_visited_bit(agent, location):
+    """
+    Gets the feature and the position within it of the flag stating whether the agent has left a location before,
+    when visits are compact.
+    :param Agent agent: the agent for which to get the feature.
+    :param str location: the location / room of the environment.
+    :rtype: tuple[str, int]
+    :return: a tuple (key, bit) with the corresponding PsychSim feature key and the position of the location's flag.
+    """
+    i = agent.world.variables[get_location_key(agent)]['elements'].index(location)
+    return get_locations_visited_key(agent, i // VISIT_WORD_BITS), i % VISIT_WORD_BITS
+
+
 def get_num_victims_location_key(location, color):
     """
     Gets the named key of the feature corresponding to number of victims of some type in the given location.
@@ -73,3 +112,59 @@ def get_num_victims_location_key(location, color):
     :return: the corresponding PsychSim feature key.
     """
     return stateKey(WORLD, 'ctr_' + location + '_' + color)
+
+
+class FeatureKeys(object):
+    """
+    A registry of the (interned) keys of the state features of an agent and of its world, computed once such that they
+    are not rebuilt whenever accessed. Location-dependent keys are kept in lists indexed by the position of each
+    location in the domain of the agent's location feature. The registry is valid while no other feature is defined in
+    the world (see `get_feature_keys`).
+    """
+
+    def __init__(self, agent):
+        """
+        Creates a new registry with the keys of the features currently defined in the agent's world.
+        :param Agent agent: the agent whose features' keys are registered.
+        """
+        world = agent.world
+        self.num_variables = len(world.variables)
+        self.seconds = sys.intern(get_mission_seconds_key())
+        self.phase = sys.intern(get_mission_phase_key())
+        self.location = sys.intern(get_location_key(agent))
+        self.triaged = {color: sys.intern(get_triaged_key(agent, color)) for color in COLORS}
+        self.num_triaged = {color: sys.intern(get_num_triaged_key(agent, color)) for color in COLORS}
+
+        # locations in the order of the location feature's domain, and index of each location and of its symbol
+        self.locations = list(world.variables[self.location]['elements'])
+        self.location_index = {loc: i for i, loc in enumerate(self.locations)}
+        self.symbol_index = {world.value2float(self.location, loc): i for i, loc in enumerate(self.locations)}
+
+        # key of the visits feature of each location, and position of its flag if visits are compact, otherwise `None`
+        self.compact_visits = has_compact_visits(agent)
+        if self.compact_visits:
+            self.visits = [(sys.intern(get_locations_visited_key(agent, i // VISIT_WORD_BITS)), i % VISIT_WORD_BITS)
+                           for i in range(len(self.locations))]
+        else:
+            self.visits = [(sys.intern(get_num_visits_location_key(agent, loc)), None) for loc in self.locations]
+
+        # key of the victims counter of each color at each location, `None` for the locations without counters
+        self.victims = {}
+        for color in COLORS:
+            keys = [get_num_victims_location_key(loc, color) for loc in self.locations]
+            self.victims[color] = [sys.intern(key) if key in world.variables else None for key in keys]
+
+
+def get_feature_keys(agent):
+    """
+    Gets the registry of feature keys of the given agent, created on first access and kept while the world exists, but
+    created anew whenever features were defined in the world since, e.g., victim counters defined after the players'
+    locations.
+    :param Agent agent: the agent whose features' keys are to be retrieved.
+    :rtype: FeatureKeys
+    """
+    registries = _feature_keys.setdefault(agent.world, {})
+    registry = registries.get(agent.name)
+    if registry is None or registry.num_variables != len(agent.world.variables):
+        registry = registries[agent.name] = FeatureKeys(agent)
+    return registry
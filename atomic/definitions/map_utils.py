@@ -1,7 +1,13 @@
+import hashlib
 import logging
+import os
 import pathlib
+import pickle
+import re
+import numpy as np
 import pandas as pd
 from collections import OrderedDict
+from collections.abc import Mapping
 from atomic.definitions import Directions
 
 MAPS_DIR = (pathlib.Path(__file__).parent / '..' / '..' / 'maps').resolve()
@@ -11,6 +17,9 @@ FALCON_COORDS_FILE = str(MAPS_DIR / 'ASIST_FalconMap_Rooms_v1.1_EMH_OCN_VU-coord
 FALCON_PORTALS_FILE = str(MAPS_DIR / 'ASIST_FalconMap_Portals_v1.1_EMH_OCN_VU.csv')
 FALCON_ROOMS_FILE = str(MAPS_DIR / 'ASIST_FalconMap_Rooms_v1.1_EMH_OCN_VU.csv')
 
+# parts of a room or hallway are named after it followed by the part's index, e.g., `llc12` or `tkt_3`
+REGION_RE = re.compile(r'^([a-z]{2,})_?\d+$')
+
 
 class MapData(object):
     def __init__(self, name, adjacency_file, room_file, victim_file, coords_file, portals_file, logger=logging):
@@ -29,35 +38,326 @@ class MapData(object):
         self.coordinates = getSandRCoords(fname=coords_file)
         self.init_loc = self.rooms_list[0]
 
+        # identifies the contents of the map files, e.g., to invalidate data derived from them
+        self.version = get_file_hash(adjacency_file, room_file, victim_file, coords_file, portals_file)
+
+        # array representations of the map, computed on first use
+        self._locations = None
+        self._location_index = None
+        self._adjacency_matrix = None
+        self._hop_distances = None
+        self._euclidean_distances = None
+        self._victim_counts = None
+        self._regions = None
+
+    @property
+    def regions(self):
+        """
+        The region to which each location in the map belongs, see `get_regions`.
+        :rtype: dict[str, str]
+        """
+        if self._regions is None:
+            self._regions = get_regions(self.adjacency)
+        return self._regions
+
+    @property
+    def locations(self):
+        """
+        All the locations in the map (rooms and their neighbors), sorted by name, defining the index of the rows and
+        columns of the map's matrices.
+        :rtype: list[str]
+        """
+        if self._locations is None:
+            locations = set(self.rooms)
+            for neighbors in self.adjacency.values():
+                locations.update(neighbors.values())
+            self._locations = sorted(locations)
+        return self._locations
+
+    @property
+    def location_index(self):
+        """
+        The index of each location in the map's matrices.
+        :rtype: dict[str, int]
+        """
+        if self._location_index is None:
+            self._location_index = {loc: i for i, loc in enumerate(self.locations)}
+        return self._location_index
+
+    @property
+    def adjacency_matrix(self):
+        """
+        A boolean matrix where entry `[i, j]` indicates whether location `j` is a neighbor of location `i`.
+        :rtype: np.ndarray
+        """
+        if self._adjacency_matrix is None:
+            index = self.location_index
+            self._adjacency_matrix = np.zeros((len(index), len(index)), dtype=bool)
+            for room, neighbors in self.adjacency.items():
+                for neighbor in neighbors.values():
+                    self._adjacency_matrix[index[room], index[neighbor]] = True
+        return self._adjacency_matrix
+
+    @property
+    def hop_distances(self):
+        """
+        An integer matrix with the minimal number of moves from location `i` to location `j` at entry `[i, j]`, or
+        `-1` if `j` is not reachable from `i`.
+        :rtype: np.ndarray
+        """
+        if self._hop_distances is None:
+            adjacency = self.adjacency_matrix.astype(np.int32)
+            distances = np.full(adjacency.shape, -1, dtype=np.int32)
+            np.fill_diagonal(distances, 0)
+            reached = np.eye(len(adjacency), dtype=bool)
+            frontier = reached
+            hops = 0
+            while frontier.any():
+                # expands all the breadth-first searches (one per row) by one move at a time
+                hops += 1
+                frontier = ((frontier.astype(np.int32) @ adjacency) > 0) & ~reached
+                distances[frontier] = hops
+                reached |= frontier
+            self._hop_distances = distances
+        return self._hop_distances
+
+    @property
+    def euclidean_distances(self):
+        """
+        A matrix with the Euclidean distance between the coordinates of location `i` and location `j` at entry
+        `[i, j]`, or `nan` for locations without coordinates.
+        :rtype: np.ndarray
+        """
+        if self._euclidean_distances is None:
+            coords = np.full((len(self.locations), 2), np.nan)
+            for loc, i in self.location_index.items():
+                if self.coordinates is not None and loc in self.coordinates:
+                    coords[i] = self.coordinates[loc]
+            self._euclidean_distances = np.linalg.norm(coords[:, np.newaxis] - coords[np.newaxis], axis=-1)
+        return self._euclidean_distances
+
+    @property
+    def victim_counts(self):
+        """
+        The number of victims of each color in each location, indexed as in the map's matrices.
+        :rtype: dict[str, np.ndarray]
+        """
+        if self._victim_counts is None:
+            index = self.location_index
+            self._victim_counts = {}
+            for loc, colors in self.victims.items():
+                if loc not in index:
+                    continue
+                for color in colors:
+                    if color not in self._victim_counts:
+                        self._victim_counts[color] = np.zeros(len(index), dtype=np.int32)
+                    self._victim_counts[color][index[loc]] += 1
+        return self._victim_counts
+
+
+def get_region(location):
+    """
+    Gets the region of the given location, i.e., the room or hallway of which the location is a part, e.g., `llc` for
+    `llc12`, or the location itself if it is not a part of a larger region.
+    :param str location: the name of the location.
+    :rtype: str
+    """
+    match = REGION_RE.match(location)
+    return location if match is None else match.group(1)
+
+
+def get_regions(adjacency):
+    """
+    Groups the locations of a map into regions, where each region joins connected parts of the same room or hallway
+    (see `get_region`). Parts are only joined if every direction still leads to at most one other region, such that
+    moves between regions can be represented by the same (cardinal direction) actions as moves between locations.
+    :param dict[str, dict[Directions, str]] adjacency: the neighbor in each direction of each location.
+    :rtype: dict[str, str]
+    :return: the region of each location. Regions are named after their room or hallway, or after their first
+    location if the room or hallway had to be split into several regions.
+    """
+    locations = set(adjacency)
+    for neighbors in adjacency.values():
+        locations.update(neighbors.values())
+    candidates = {loc: get_region(loc) for loc in locations}
+
+    # union-find over locations, keeping the locations in each direction of each group
+    parents = {loc: loc for loc in locations}
+    exits = {loc: {d: {n} for d, n in adjacency.get(loc, {}).items()} for loc in locations}
+
+    def find(loc):
+        while parents[loc] != loc:
+            loc = parents[loc]
+        return loc
+
+    for loc in sorted(adjacency):
+        for n in adjacency[loc].values():
+            group1, group2 = find(loc), find(n)
+            if group1 == group2 or candidates[loc] != candidates[n]:
+                continue
+            merged = {d: exits[group1].get(d, set()) | exits[group2].get(d, set())
+                      for d in set(exits[group1]) | set(exits[group2])}
+            if all(len({find(t) for t in targets} - {group1, group2}) <= 1 for targets in merged.values()):
+                parents[group2] = group1
+                exits[group1] = merged
+
+    groups = {}
+    for loc in sorted(locations):
+        groups.setdefault(find(loc), []).append(loc)
+    num_groups = {}
+    for group in groups.values():
+        num_groups[candidates[group[0]]] = num_groups.get(candidates[group[0]], 0) + 1
+    return {loc: candidates[loc] if num_groups[candidates[loc]] == 1 else group[0]
+            for group in groups.values() for loc in group}
+
+
+def make_region_map(adjacency, victims, regions, logger=logging):
+    """
+    Creates a coarse version of a map where each location is replaced by the region it belongs to.
+    :param dict[str, dict[Directions, str]] adjacency: the neighbor in each direction of each location.
+    :param dict[str, list[str]] victims: the colors of the victims in each location.
+    :param dict[str, str] regions: the region of each location (locations not in the dictionary are their own region).
+    :param logger: the logger handler.
+    :rtype: tuple[OrderedDict[str, dict[Directions, str]], dict[str, list[str]]]
+    :return: a tuple with the neighbor in each direction of each region, and the colors of the victims in each region.
+    """
+    region_adjacency = OrderedDict()
+    connections = set()
+    for loc, neighbors in adjacency.items():
+        region = regions.get(loc, loc)
+        region_neighbors = region_adjacency.setdefault(region, {})
+        for direction, neighbor in neighbors.items():
+            neighbor_region = regions.get(neighbor, neighbor)
+            if neighbor_region == region:
+                continue  # moves within the region
+            connections.add((region, neighbor_region))
+            if direction not in region_neighbors:
+                region_neighbors[direction] = neighbor_region
+
+    # regions can only have one neighbor per direction
+    for region, neighbor_region in sorted(connections):
+        if neighbor_region not in region_adjacency[region].values():
+            logger.warning('Region {} has no direction left to its neighbor {}'.format(region, neighbor_region))
+
+    region_victims = {}
+    for loc, colors in victims.items():
+        region_victims.setdefault(regions.get(loc, loc), []).extend(colors)
+    return region_adjacency, region_victims
+
+
+def get_file_hash(*fnames):
+    """
+    Gets a digest of the contents of the given files, ignoring `None` entries.
+    :param str fnames: the names of the files.
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    for fname in fnames:
+        if fname is not None:
+            with open(fname, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+# files of each default map, as (adjacency, rooms, victims, coordinates, portals)
+DEFAULT_MAP_FILES = OrderedDict([
+#    ('sparky', (str(MAPS_DIR / 'sparky_adjacency.csv'), None,
+#                str(MAPS_DIR / 'sparky_vic_locs.csv'),
+#                str(MAPS_DIR / 'sparky_coords.csv'), None)),
+#    ('falcon', (str(MAPS_DIR / 'falcon_adjacency_v1.1_OCN.csv'), None,
+#                str(MAPS_DIR / 'falcon_vic_locs_v1.1_OCN.csv'),
+#                FALCON_COORDS_FILE, None)),
+#    ('FalconEasy', (str(FALCON_MAP_DIR / 'falcon_easy_adjacency.csv'), FALCON_ROOMS_FILE,
+#                    str(FALCON_MAP_DIR / 'ASIST_FalconMap_Easy_Victims_v1.1_OCN_VU.csv'),
+#                    FALCON_COORDS_FILE, FALCON_PORTALS_FILE)),
+#    ('FalconMed', (str(FALCON_MAP_DIR / 'falcon_medium_adjacency.csv'), FALCON_ROOMS_FILE,
+#                   str(FALCON_MAP_DIR / 'ASIST_FalconMap_Medium_Victims_v1.1_OCN_VU.csv'),
+#                   FALCON_COORDS_FILE, FALCON_PORTALS_FILE)),
+#    ('FalconHard', (str(FALCON_MAP_DIR / 'falcon_hard_adjacency.csv'), FALCON_ROOMS_FILE,
+#                    str(FALCON_MAP_DIR / 'ASIST_FalconMap_Hard_Victims_v1.1_OCN_VU.csv'),
+#                    FALCON_COORDS_FILE, FALCON_PORTALS_FILE)),
+    ('saturn', (str(SATURN_MAP_DIR / 'saturn_adjacency.csv'),
+                str(SATURN_MAP_DIR / 'saturn_rooms.csv'),
+                str(SATURN_MAP_DIR / 'saturn_1_0_vic_locs.csv'), None,
+                str(SATURN_MAP_DIR / 'saturn_doors.csv'))),
+#    ('simple', (str(MAPS_DIR / 'simple_adjacency.csv'), None, str(MAPS_DIR / 'simple_victims.csv'), None, None)),
+])
+
+MAP_CACHE_FORMAT = 2  # to be incremented whenever the contents of MapData change
+
+_default_maps = {}  # the default maps loaded so far, for each cache directory
+
+
+class MapRegistry(Mapping):
+    """
+    A dictionary of maps that are loaded only when first accessed and then kept for later accesses.
+    If a cache directory is given, a compiled version of each map is stored there and reused while the map files are
+    not modified.
+    """
+
+    def __init__(self, map_files, cache_dir=None, logger=logging, maps=None):
+        """
+        Creates a new map registry.
+        :param dict[str, tuple] map_files: the files of each map, as (adjacency, rooms, victims, coordinates, portals).
+        :param str cache_dir: the directory in which to store the compiled maps, `None` to not store them.
+        :param logger: the logger handler.
+        :param dict[str, MapData] maps: the maps already loaded, which is updated with the maps loaded by this registry,
+        such that they can be shared with other registries. `None` to start with no maps loaded.
+        """
+        self.map_files = map_files
+        self.cache_dir = cache_dir
+        self.logger = logger
+        self._maps = {} if maps is None else maps
+
+    def __getitem__(self, name):
+        if name not in self._maps:
+            self._maps[name] = self._load(name, self.map_files[name])
+        return self._maps[name]
+
+    def __contains__(self, name):
+        return name in self.map_files
+
+    def __iter__(self):
+        return iter(self.map_files)
+
+    def __len__(self):
+        return len(self.map_files)
+
+    def _load(self, name, files):
+        mtimes = [None if fname is None else os.path.getmtime(fname) for fname in files]
+        key = (MAP_CACHE_FORMAT, files, mtimes)
+        cache_file = None if self.cache_dir is None else os.path.join(self.cache_dir, 'map-{}.pkl'.format(name))
+        if cache_file is not None and os.path.isfile(cache_file):
+            try:
+                with open(cache_file, 'rb') as file:
+                    cached_key, map_data = pickle.load(file)
+                if cached_key == key:
+                    self.logger.info('Loaded compiled "{}" map from {}'.format(name, cache_file))
+                    return map_data
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError, ImportError):
+                self.logger.warning('Unable to load compiled "{}" map from {}'.format(name, cache_file))
+
+        map_data = MapData(name, *files, logger=self.logger)
+        if cache_file is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(cache_file, 'wb') as file:
+                    pickle.dump((key, map_data), file)
+            except OSError:
+                self.logger.warning('Unable to store compiled "{}" map in {}'.format(name, cache_file))
+        return map_data
+
 
-def get_default_maps(logger=logging):
-    return {
-#        'sparky': MapData('sparky', str(MAPS_DIR / 'sparky_adjacency.csv'), None,
-#                          str(MAPS_DIR / 'sparky_vic_locs.csv'),
-#                          str(MAPS_DIR / 'sparky_coords.csv'), None, logger),
-#        'falcon': MapData('falcon', str(MAPS_DIR / 'falcon_adjacency_v1.1_OCN.csv'), None,
-#                          str(MAPS_DIR / 'falcon_vic_locs_v1.1_OCN.csv'),
-#                          FALCON_COORDS_FILE, None, logger),
-#        'FalconEasy': MapData('FalconEasy',
-#                              str(FALCON_MAP_DIR / 'falcon_easy_adjacency.csv'), FALCON_ROOMS_FILE,
-#                              str(FALCON_MAP_DIR / 'ASIST_FalconMap_Easy_Victims_v1.1_OCN_VU.csv'),
-#                              FALCON_COORDS_FILE, FALCON_PORTALS_FILE, logger),
-#        'FalconMed': MapData('FalconMed',
-#                             str(FALCON_MAP_DIR / 'falcon_medium_adjacency.csv'), FALCON_ROOMS_FILE,
-#                             str(FALCON_MAP_DIR / 'ASIST_FalconMap_Medium_Victims_v1.1_OCN_VU.csv'),
-#                             FALCON_COORDS_FILE, FALCON_PORTALS_FILE, logger),
-#        'FalconHard': MapData('FalconHard',
-#                              str(FALCON_MAP_DIR / 'falcon_hard_adjacency.csv'), FALCON_ROOMS_FILE,
-#                              str(FALCON_MAP_DIR / 'ASIST_FalconMap_Hard_Victims_v1.1_OCN_VU.csv'),
-#                              FALCON_COORDS_FILE, FALCON_PORTALS_FILE, logger),
-        'saturn': MapData('saturn',
-                           str(SATURN_MAP_DIR / 'saturn_adjacency.csv'), 
-                           str(SATURN_MAP_DIR / 'saturn_rooms.csv'),
-                           str(SATURN_MAP_DIR / 'saturn_1_0_vic_locs.csv'), None, 
-                           str(SATURN_MAP_DIR / 'saturn_doors.csv'), logger),                           
-#        'simple': MapData('simple',
-#            str(MAPS_DIR / 'simple_adjacency.csv'), None, str(MAPS_DIR / 'simple_victims.csv'), None, None, logger),
-    }
+def get_default_maps(logger=logging, cache_dir=None):
+    """
+    Gets the default maps, which are loaded lazily and shared by all callers within the process that use the same
+    cache directory.
+    :param logger: the logger handler used when loading maps through the returned registry.
+    :param str cache_dir: the directory in which to store the compiled maps, `None` to not store them.
+    :rtype: MapRegistry
+    """
+    return MapRegistry(DEFAULT_MAP_FILES, cache_dir, logger, _default_maps.setdefault(cache_dir, {}))
 
 
 def checkSRMap(SRMap, logger=logging):
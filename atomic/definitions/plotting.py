@@ -213,7 +213,7 @@ def _plot(world, locations, neighbors, output_img, coordinates,
         for loc in locations:
             for i, color in enumerate(COLORS.keys()):
                 vic_amount_feat = get_num_victims_location_key(loc, color)
-                vic_amount = world.getFeature(vic_amount_feat, state, True)
+                vic_amount = world.getFeature(vic_amount_feat, state, True) if vic_amount_feat in world.variables else 0
                 v = g.vs.select(label=loc)[0]
                 x, y = layout.coords[v.index]
                 g.add_vertex(label=vic_amount, label_size=VIC_LABEL_SIZE, color=(0, 0, 0, 0),
@@ -26,6 +26,9 @@ COLOR_PRIOR_P = {GREEN_STR: 0, GOLD_STR: 0}
 # based on average times from parsing the data
 SEARCH_TIME_INC = 5
 
+# how triage durations can be projected in the agents' lookahead
+TRIAGE_LOOKAHEAD_MODES = [None, 'expected', 'likely']
+
 
 class Victims(object):
     """ Methods for modeling victims within a PsychSim world. """
@@ -55,16 +58,28 @@ class Victims(object):
         # A map from a player to triage actions
         self.triageActs = {}
 
-        # Create location-centric counters for victims of each of the 2 victims_colors
-        self.victimClrCounts = {loc: {clr: 0 for clr in self.color_expiry} for loc in world_map.all_locations}
+        # A map from a player to its prior beliefs over each unobserved victim variable
+        self.unobsPriors = {}
+
+        # Create location-centric counters for victims of each of the 2 victims_colors, only for the locations that
+        # hold victims, the counters of the other locations being always zero
+        self.victimClrCounts = {}
         for loc, vics in victims_color_locs.items():
             if loc.startswith('2'):
                 loc = 'R' + loc
+            if loc not in self.victimClrCounts:
+                self.victimClrCounts[loc] = {clr: 0 for clr in self.color_expiry}
             for clr in vics:
                 self.victimClrCounts[loc][clr] += 1
+        self.victimLocations = [loc for loc in world_map.all_locations if loc in self.victimClrCounts]
+
+        # The locations initially holding victims of each color, the only ones where triaging that color can be legal
+        # since counters are never incremented
+        self.colorLocations = {clr: [loc for loc in self.victimLocations if self.victimClrCounts[loc][clr] > 0]
+                               for clr in self.color_expiry}
 
         # Create the psychsim version of these counters, including WHITE and RED
-        for loc in world_map.all_locations:
+        for loc in self.victimLocations:
             for clr in self.color_names:
                 ctr = self.world.defineState(WORLD, 'ctr_' + loc + '_' + clr, int)
                 self.world.setFeature(ctr, self.victimClrCounts[loc][clr] if clr in self.victimClrCounts[loc] else 0)
@@ -87,22 +102,24 @@ class Victims(object):
 
         loc_key = stateKey(agent.name, 'loc')
 
-        # legal only if any "active" victim of given color is in the same loc
-        tree = {'if': equalRow(loc_key, self.world_map.all_locations),
+        # legal only if any "active" victim of given color is in the same loc, all other locations being folded into
+        # a single default branch
+        color_locs = self.colorLocations[color]
+        tree = {'if': equalRow(loc_key, color_locs),
                 None: False}
-        for i, loc in enumerate(self.world_map.all_locations):
+        for i, loc in enumerate(color_locs):
             vicsInLocOfClrKey = stateKey(WORLD, 'ctr_' + loc + '_' + color)
             tree[i] = {'if': thresholdRow(vicsInLocOfClrKey, 0),
                        True: True,
                        False: False}
-        action = agent.addAction({'verb': 'triage_' + color}, makeTree(tree))
+        action = agent.addAction({'verb': 'triage_' + color}, makeTree(tree if len(color_locs) > 0 else False))
 
         # different triage time thresholds according to victim type
         threshold = 7 if color == GREEN_STR else 14
         long_enough = differenceRow(makeFuture(self.world.time), self.world.time, threshold)
 
-        # make triage dynamics for counters of each loc
-        for loc in self.world_map.all_locations:
+        # make triage dynamics for counters of each loc where the action can be legal
+        for loc in color_locs:
             # successful triage conditions
             conds = [equalRow(loc_key, loc), long_enough]
 
@@ -148,32 +165,53 @@ class Victims(object):
         room_color=T means player knows this color victim is in room.
         room_color=F means player knows this color victim is not in room.
         Use a prior over P(room_color=T)
+        Both the world and the player's beliefs (see `setObsVarsBeliefs`) hold the prior, as one independent marginal
+        per variable. No agent observes these variables, since observing them would join them into a distribution over
+        all their combinations.
         """
-        ks = []
-        ds = []
+        self.unobsPriors[agent.name] = {}
         for loc in self.world_map.all_locations:
             for color in self.color_prior_p.keys():
-                ks.append(self.world.defineState(agent.name, self.getUnObsName(loc, color), bool))
-                ds.append(Distribution({True: self.color_prior_p[color], False: 1 - self.color_prior_p[color]}))
-
-        if self.full_obs:
-            for key in ks:
-                self.world.setFeature(key, False)
-        else:
-            for i, (key, dist) in enumerate(zip(ks, ds)):
-                agent.setBelief(key, dist)
-                self.world.setFeature(key, dist)
+                key = self.world.defineState(agent.name, self.getUnObsName(loc, color), bool)
+                if self.full_obs:
+                    self.world.setFeature(key, False)
+                else:
+                    prior = Distribution({True: self.color_prior_p[color], False: 1 - self.color_prior_p[color]})
+                    self.world.setFeature(key, prior)
+                    self.unobsPriors[agent.name][key] = prior
+
+    def setObsVarsBeliefs(self, agent, model=None):
+        """
+        Sets the player's prior beliefs over the unobserved victim variables. Has to be called whenever the player's
+        beliefs are reset from the world state.
+        :param Agent agent: the player agent.
+        :param str model: the name of the player's model whose beliefs are set, `None` for all its current models.
+        """
+        for key, dist in self.unobsPriors.get(agent.name, {}).items():
+            agent.setBelief(key, dist, model)
 
-    def makeExpiryDynamics(self):
+    def makeExpiryDynamics(self, scheduled=False):
+        """
+        Makes victims of each color die once their expiry time is passed.
+        :param bool scheduled: whether expiry is a transition scheduled in the world, applied once after the real step
+        in which the clock passes the expiry time (see `SearchAndRescueWorld.scheduleEffects`), rather than dynamics
+        tested on every step. Scheduled expiry is not projected in the agents' lookahead.
+        """
         vic_colors = [color for color in self.color_names if color not in {WHITE_STR, RED_STR}]
 
         # update victim loc counters
-        for loc in self.world_map.all_locations:
+        for loc in self.victimLocations:
             red_ctr = stateKey(WORLD, 'ctr_' + loc + '_' + 'Red')
             for color in vic_colors:
                 ctr = stateKey(WORLD, 'ctr_' + loc + '_' + color)
                 expire = self.color_expiry[color]
 
+                if scheduled:
+                    # RED: add alive victims, then GREEN and GOLD: zero-out alive victims of that color
+                    self.world.scheduleEffects(expire, [(red_ctr, addFeatureMatrix(red_ctr, ctr)),
+                                                        (ctr, setToConstantMatrix(ctr, 0))])
+                    continue
+
                 # RED: if death time is reached, copy amount of alive victims to counter
                 deathTree = {'if': thresholdRow(self.world.time, expire),
                              True: addFeatureMatrix(red_ctr, ctr),
@@ -186,14 +224,29 @@ class Victims(object):
                              False: noChangeMatrix(ctr)}
                 self.world.setDynamics(ctr, True, makeTree(deathTree))
 
-    def stochasticTriageDur(self):
+    def stochasticTriageDur(self, lookahead=None):
+        """
+        Makes the duration of triaging a victim of each color follow the distribution of required triage times.
+        :param str lookahead: how the duration is projected in the agents' lookahead, one of `TRIAGE_LOOKAHEAD_MODES`:
+        `None` for the full distribution, `'expected'` for the expected duration (rounded), or `'likely'` for the most
+        likely duration. Real steps always follow the full distribution.
+        """
+        assert lookahead in TRIAGE_LOOKAHEAD_MODES, 'Unknown triage lookahead mode: {}'.format(lookahead)
         vic_colors = [color for color in self.color_names if color not in {WHITE_STR, RED_STR}]
         for color in vic_colors:
+            reqd_times = self.color_reqd_times[color]
             stochTree = {'distribution': [
-                (incrementMatrix(self.world.time, c), p) for c, p in self.color_reqd_times[color].items()]}
+                (incrementMatrix(self.world.time, c), p) for c, p in reqd_times.items()]}
+            if lookahead == 'expected':
+                duration = int(round(sum(c * p for c, p in reqd_times.items()) / sum(reqd_times.values())))
+            elif lookahead == 'likely':
+                duration = max(reqd_times, key=reqd_times.get)
             for actions in self.triageActs.values():
                 triageActColor = actions[color]
                 self.world.setDynamics(self.world.time, triageActColor, makeTree(stochTree))
+                if lookahead is not None:
+                    self.world.setLookaheadDynamics(self.world.time, triageActColor,
+                                                    makeTree(incrementMatrix(self.world.time, duration)))
 
     def makeVictimReward(self, agent, model=None, rwd_dict=None):
         """ Human gets reward if flag is set
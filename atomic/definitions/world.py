@@ -1,4 +1,8 @@
-from psychsim.pwl import WORLD, VectorDistributionSet, makeTree, thresholdRow, setToConstantMatrix, incrementMatrix
+import bisect
+from collections import Counter
+from psychsim.action import ActionSet
+from psychsim.agent import Agent
+from psychsim.pwl import WORLD, CONSTANT, VectorDistributionSet, setToConstantMatrix, incrementMatrix, modelKey
 from psychsim.world import World
 
 # mission phases
@@ -13,6 +17,39 @@ MISSION_PHASES = [START_STR, NEAR_MIDDLE_STR, MIDDLE_STR, NEAR_END_STR, END_STR]
 MISSION_PHASE_END_TIMES = [150, 300, 420, 540]
 
 
+def get_mission_phase(seconds):
+    """
+    Gets the mission phase at the given mission time, i.e., the first phase whose end time was not passed.
+    :param float seconds: the mission time.
+    :rtype: str
+    """
+    return MISSION_PHASES[bisect.bisect_left(MISSION_PHASE_END_TIMES, seconds)]
+
+
+def get_num_outcomes(tree):
+    """
+    Gets the number of outcomes of the root of the given decision tree, i.e., its branches if it is probabilistic.
+    :param KeyedTree tree: the decision tree.
+    :rtype: int
+    """
+    return len(tree.children) if tree.isProbabilistic() else 1
+
+
+class SearchAndRescueAgent(Agent):
+    """
+    An agent whose decisions, i.e., its planning over a horizon, are projected with the world's lookahead dynamics
+    (see `SearchAndRescueWorld.setLookaheadDynamics`).
+    """
+
+    def decide(self, *args, **kwargs):
+        lookahead = self.world.lookahead
+        self.world.lookahead = True
+        try:
+            return super().decide(*args, **kwargs)
+        finally:
+            self.world.lookahead = lookahead
+
+
 class SearchAndRescueWorld(World):
 
     def __init__(self, xml=None, stateType=VectorDistributionSet):
@@ -29,13 +66,172 @@ class SearchAndRescueWorld(World):
         self.phase = self.defineState(WORLD, PHASE_FEATURE, list, MISSION_PHASES, description='The mission phase')
         self.setFeature(self.phase, START_STR)
 
+        # transitions applied once, after the real step in which the clock passes their time, sorted by time
+        self.scheduled = []
+        self.nextScheduled = 0
+
+        # dynamics used instead of the regular ones in the agents' lookahead, i.e., while they are deciding
+        self.lookaheadDynamics = {}
+        self.lookahead = False
+
+        # number of outcomes of the stochastic dynamics applied in real steps and in lookahead, and of those removed by
+        # the lookahead dynamics replacing them
+        self.branchCounts = Counter()
+
         self.set_phase_dynamics()
 
     def set_phase_dynamics(self):
-
-        # updates mission phase
-        tree = {'if': thresholdRow(self.time, MISSION_PHASE_END_TIMES),
-                len(MISSION_PHASE_END_TIMES): setToConstantMatrix(self.phase, MISSION_PHASES[-1])}
+        """
+        Makes the mission phase change once, after the real step in which the clock passes each phase's end time,
+        rather than via dynamics tested on every step (see `scheduleEffects`). The phase is therefore not projected in
+        the agents' lookahead, where `get_mission_phase` gives the phase at any (projected) clock time. Hence, rewards,
+        legality and dynamics should not depend on the phase feature, but on the clock, as the rewards, legality and
+        dynamics of the single-player and team worlds do.
+        """
         for i, phase_time in enumerate(MISSION_PHASE_END_TIMES):
-            tree[i] = setToConstantMatrix(self.phase, MISSION_PHASES[i])
-        self.setDynamics(self.phase, True, makeTree(tree))
+            self.scheduleEffects(phase_time, [(self.phase, setToConstantMatrix(self.phase, MISSION_PHASES[i + 1]))])
+
+    def setLookaheadDynamics(self, key, action, tree):
+        """
+        Defines the effect of an action on a state feature in the agents' lookahead, i.e., while a
+        `SearchAndRescueAgent` is deciding, replacing the one defined via `setDynamics`, e.g., to collapse stochastic
+        effects whose outcomes would otherwise multiply over the horizon. Real steps and the belief updates following
+        them keep the regular dynamics.
+        :param str key: the key of the affected state feature.
+        :param ActionSet action: the action affecting the state feature.
+        :param KeyedTree tree: the decision tree defining the effect.
+        """
+        if action not in self.lookaheadDynamics:
+            self.lookaheadDynamics[action] = {}
+        self.lookaheadDynamics[action][key] = tree.desymbolize(self.symbols)
+
+    def addAgent(self, agent, setModel=True):
+        if isinstance(agent, str):
+            agent = SearchAndRescueAgent(agent)
+        return super().addAgent(agent, setModel)
+
+    def step(self, actions=None, state=None, real=True, *args, **kwargs):
+        # outside lookahead, the beliefs stepped along with this state, i.e., those of its possible models, first get its
+        # clock, such that they agree with the state when deciding and observing, the beliefs nested in them getting it
+        # in turn when stepped by the belief updates
+        if not self.lookahead:
+            self.syncBeliefsClock(state)
+
+        result = super().step(actions, state, real, *args, **kwargs)
+
+        # scheduled transitions only happen in real steps of the world, not in lookahead or belief updates
+        if real and not self.lookahead and (state is None or state is self.state) and \
+                self.nextScheduled < len(self.scheduled):
+            self.applyScheduled(self.getFeature(self.time).expectation())
+        return result
+
+    def getActionEffects(self, joint, keySet, dynamics=None):
+        # in lookahead, the effects of an action are replaced by those defined for it via setLookaheadDynamics, also
+        # when they are merged with those of other actions, e.g., for uncertain or joint actions
+        substitutes = self.lookaheadDynamics.get(joint) if self.lookahead and isinstance(joint, ActionSet) else None
+        if not substitutes:
+            return super().getActionEffects(joint, keySet, dynamics)
+        if dynamics is None:
+            dynamics = {}
+        for key, tree in self.dynamics[joint].items():
+            if key in keySet:
+                if key in substitutes:
+                    self.branchCounts['collapsed'] += get_num_outcomes(tree) - get_num_outcomes(substitutes[key])
+                    tree = substitutes[key]
+                dynamics.setdefault(key, []).append(tree)
+        if len(joint) > 1:
+            for action in joint:
+                self.getActionEffects(ActionSet(action), keySet, dynamics)
+        return dynamics
+
+    def deltaState(self, actions, state, uncertain=False):
+        effects = super().deltaState(actions, state, uncertain)
+        for stage in effects:
+            for trees in stage.values():
+                for tree in trees or []:
+                    if tree.isProbabilistic():
+                        self.branchCounts['lookahead' if self.lookahead else 'real'] += len(tree.children)
+        return effects
+
+    def scheduleEffects(self, time, effects):
+        """
+        Schedules a transition to be applied once, via `applyScheduled`, when the mission clock passes the given time,
+        instead of being tested by the dynamics on every step. Transitions are applied after each real step of the
+        world (given the expected clock time, if uncertain) and may be applied beforehand, e.g., by the replay loop when
+        syncing the clock, but they are not projected in the agents' lookahead.
+        :param int time: the mission time after which the transition occurs.
+        :param list[tuple[str,KeyedMatrix]] effects: the key and the effect on each changed feature, applied in order.
+        """
+        self.scheduled.append((time, [(key, effect.desymbolize(self.symbols)) for key, effect in effects]))
+        self.scheduled.sort(key=lambda event: event[0])
+
+    def getActiveBeliefs(self, state=None):
+        """
+        Gets the beliefs of the agents' models that are possible in the given state and, recursively, those of the models
+        possible in these beliefs, each listed once even if shared by several models. Unlike iterating over all the
+        agents' models, this excludes the models left behind by past belief updates.
+        :param VectorDistributionSet state: the state from which to search for beliefs, `None` for the world state.
+        :rtype: list[VectorDistributionSet]
+        """
+        beliefs = {}
+        pending = [self.state if state is None else state]
+        while len(pending) > 0:
+            current = pending.pop()
+            for name, agent in self.agents.items():
+                key = modelKey(name)
+                if key not in current:
+                    continue
+                for model in self.getFeature(key, current).domain():
+                    belief = agent.getAttribute('beliefs', model)
+                    if isinstance(belief, VectorDistributionSet) and id(belief) not in beliefs:
+                        beliefs[id(belief)] = belief
+                        pending.append(belief)
+        return list(beliefs.values())
+
+    def syncClock(self, time):
+        """
+        Sets the mission clock to the given time in the world state. The agents' beliefs get it when they are next
+        stepped (see `syncBeliefsClock`), such that the cost of syncing does not depend on the number of models.
+        :param int time: the current mission time.
+        """
+        self.setFeature(self.time, time)
+
+    def syncBeliefsClock(self, state=None):
+        """
+        Sets the mission clock of the beliefs of the agents' models possible in the given state to the clock of that
+        state, if certain, leaving out the beliefs already holding that time. Unlike `getActiveBeliefs`, this does not
+        recurse into the beliefs, as the beliefs nested in them are synced when they are stepped in turn.
+        :param VectorDistributionSet state: the state whose clock is set in the beliefs, `None` for the world state.
+        """
+        state = self.state if state is None else state
+        if self.time not in state:
+            return
+        time = self.getFeature(self.time, state)
+        if len(time) != 1:
+            return
+        time = time.first()
+        for name, agent in self.agents.items():
+            key = modelKey(name)
+            if key not in state:
+                continue
+            for model in self.getFeature(key, state).domain():
+                beliefs = agent.getAttribute('beliefs', model)
+                if isinstance(beliefs, VectorDistributionSet) and self.time in beliefs and \
+                        self.getFeature(self.time, beliefs).domain() != [time]:
+                    self.setFeature(self.time, time, beliefs)
+
+    def applyScheduled(self, time):
+        """
+        Applies the scheduled transitions whose time the mission clock has passed and that were not yet applied, both
+        to the world state and to the active beliefs including the changed features (see `getActiveBeliefs`), leaving
+        out the beliefs of the models left behind by past belief updates, which are not reactivated by real steps.
+        :param int time: the current mission time.
+        """
+        while self.nextScheduled < len(self.scheduled) and time > self.scheduled[self.nextScheduled][0]:
+            _, effects = self.scheduled[self.nextScheduled]
+            self.nextScheduled += 1
+            for state in [self.state] + self.getActiveBeliefs():
+                for key, effect in effects:
+                    if key in state and all(k in state for k in effect.getKeysIn() if k != CONSTANT):
+                        state *= effect
+                        state.rollback()
@@ -6,22 +6,43 @@ from atomic.definitions.world import SearchAndRescueWorld
 # based on average times from parsing the data
 MOVE_TIME_INC = 3
 
+VISIT_WORD_BITS = 8  # number of locations whose visited flag is packed in each feature in the compact encoding
+
+
+def get_visited_values(bit):
+    """
+    Gets the values of a packed visited-locations feature for which the flag at the given position is set.
+    :param int bit: the position of the location's flag within the feature.
+    :rtype: set[int]
+    """
+    return {value for value in range(1 << VISIT_WORD_BITS) if value >> bit & 1}
+
 
 class WorldMap(object):
     """
     Represents a search and rescue world map with cardinal direction transitions (grid-world representation).
     """
 
-    def __init__(self, world, loc_neighbors):
+    def __init__(self, world, loc_neighbors, location_map=None, compact_visits=False):
         """
         Creates a new map with the given locations.
         :param SearchAndRescueWorld world: the PsychSim world.
         :param dict[str, dict[int, str]] loc_neighbors: a dictionary where each key is a room, and the values are
         another dictionary with keys being `Directions.directions`, and the values are rooms in that direction.
+        :param dict[str, str] location_map: a dictionary mapping the (fine-grained) locations reported in game logs to
+        the locations of this map, e.g., room parts to regions. Locations not in the dictionary are kept as is.
+        :param bool compact_visits: whether to pack the players' visited-location flags into a few features of
+        `VISIT_WORD_BITS` flags each, set when a location is left, rather than keeping a visit counter per location.
+        This is lossy: only whether a location was left before is known, not how many times it was visited, so
+        frequency-based reward features (`LocationFrequencyReward`) reject it and location frequency statistics become
+        the probability of having left each location. Each move still updates one feature per group of locations.
         """
         self.world = world
+        self.location_map = location_map if location_map is not None else {}
+        self.compactVisits = compact_visits
         self.neighbors = []
         self.all_locations = []
+        self.nextHops = {}
         self.moveActions = {}
         self.makeMapDict(loc_neighbors)
 
@@ -36,18 +57,59 @@ class WorldMap(object):
                 self.neighbors[d][room] = n
                 locations.add(n)
         self.all_locations = list(locations)
+        self._makeNextHops()
+
+    def _makeNextHops(self):
+        """
+        Creates the routing table, where `nextHops[src][dest]` is the direction of the first move in a shortest path
+        from `src` to `dest`, via a breadth-first search from each location.
+        """
+        self.nextHops = {}
+        sources = set(self.all_locations)
+        for d in Directions:
+            sources.update(self.neighbors[d.value].keys())
+        for src in sources:
+            hops = {}
+            frontier = [src]
+            while len(frontier) > 0:
+                nextFrontier = []
+                for loc in frontier:
+                    for d in Directions:
+                        n = self.neighbors[d.value].get(loc)
+                        if n is not None and n != src and n not in hops:
+                            # first move of the path to n is the one already taken to reach loc, if any
+                            hops[n] = d.value if loc == src else hops[loc]
+                            nextFrontier.append(n)
+                frontier = nextFrontier
+            self.nextHops[src] = hops
+
+    def getMapLocation(self, loc):
+        """
+        Gets the location of this map corresponding to the given location reported in a game log.
+        :param str loc: the reported location.
+        :rtype: str
+        """
+        return self.location_map.get(loc, loc)
 
     def makePlayerLocation(self, agent, initLoc=None):
         self.world.defineState(agent, 'loc', list, list(self.all_locations))
         if initLoc is not None:
             self.world.setState(agent.name, 'loc', initLoc)
 
-        # Add a seen flag per location
-        for i in self.all_locations:
-            self.world.defineState(agent, 'locvisits_' + str(i), int, description='Location seen or not')
-            self.world.setState(agent.name, 'locvisits_' + str(i), 0)
-        if initLoc:
-            self.world.setState(agent.name, 'locvisits_' + str(initLoc), 1)
+        if self.compactVisits:
+            # Add a packed set of flags per group of locations, in the same order as the location's domain
+            for w in range(0, len(self.all_locations), VISIT_WORD_BITS):
+                feat = 'locsvisited_{}'.format(w // VISIT_WORD_BITS)
+                self.world.defineState(agent, feat, int, 0, (1 << VISIT_WORD_BITS) - 1,
+                                       description='Locations left at least once, one bit per location')
+                self.world.setState(agent.name, feat, 0)
+        else:
+            # Add a seen flag per location
+            for i in self.all_locations:
+                self.world.defineState(agent, 'locvisits_' + str(i), int, description='Location seen or not')
+                self.world.setState(agent.name, 'locvisits_' + str(i), 0)
+            if initLoc:
+                self.world.setState(agent.name, 'locvisits_' + str(initLoc), 1)
 
         # Make move actions
         self._makeMoveActions(agent)
@@ -56,7 +118,8 @@ class WorldMap(object):
         """
         N/E/S/W actions
         Legality: if current location has a neighbor in the given direction
-        Dynamics: 1) change human's location; 2) set the seen flag for new location to True
+        Dynamics: 1) change human's location; 2) set the seen flag for new location to True (for the location left, if
+        visits are compact)
         3) Set the observable victim variables to the first victim at the new location, if any
         4) Reset the crosshair/approached vars to none
         """
@@ -79,13 +142,29 @@ class WorldMap(object):
                 tree[il] = setToConstantMatrix(locKey, self.neighbors[direction.value][loc])
             self.world.setDynamics(locKey, action, makeTree(tree))
 
-            # move increments the counter of the location we moved to
-            for dest in self.all_locations:
-                destKey = stateKey(agent.name, 'locvisits_' + str(dest))
-                tree = makeTree({'if': equalRow(makeFuture(locKey), dest),
-                                 True: incrementMatrix(destKey, 1),
-                                 False: noChangeMatrix(destKey)})
-                self.world.setDynamics(destKey, action, tree)
+            if self.compactVisits:
+                # move sets the flag of the location we left, changing a single feature for each group of locations
+                for w in range(0, len(self.all_locations), VISIT_WORD_BITS):
+                    srcs = [loc for loc in self.all_locations[w:w + VISIT_WORD_BITS] if loc in locsWithNbrs]
+                    if len(srcs) == 0:
+                        continue
+                    wordKey = stateKey(agent.name, 'locsvisited_{}'.format(w // VISIT_WORD_BITS))
+                    tree = {'if': equalRow(locKey, srcs),
+                            None: noChangeMatrix(wordKey)}
+                    for il, loc in enumerate(srcs):
+                        bit = self.all_locations.index(loc) - w
+                        tree[il] = {'if': equalRow(wordKey, get_visited_values(bit)),
+                                    True: noChangeMatrix(wordKey),
+                                    False: incrementMatrix(wordKey, 1 << bit)}
+                    self.world.setDynamics(wordKey, action, makeTree(tree))
+            else:
+                # move increments the counter of the location we moved to
+                for dest in self.all_locations:
+                    destKey = stateKey(agent.name, 'locvisits_' + str(dest))
+                    tree = makeTree({'if': equalRow(makeFuture(locKey), dest),
+                                     True: incrementMatrix(destKey, 1),
+                                     False: noChangeMatrix(destKey)})
+                    self.world.setDynamics(destKey, action, tree)
 
             # increment time
             self.world.setDynamics(self.world.time, action, makeTree(incrementMatrix(self.world.time, MOVE_TIME_INC)))
@@ -93,23 +172,22 @@ class WorldMap(object):
     def move(self, agent, direction):
         self.world.step(self.moveActions[agent.name][direction])
 
-    def getDirection(self, src, dest, isSecond=False):
-        for d in Directions:
-            if (src in self.neighbors[d.value].keys()) and (self.neighbors[d.value][src] == dest):
-                return [d.value]
-        if isSecond:
+    def getDirection(self, src, dest):
+        """
+        Gets the directions of the moves in a shortest path from one location to another.
+        :param str src: the origin location.
+        :param str dest: the destination location.
+        :rtype: list[int]
+        :return: a list with the direction of each move, or `[-1]` if `dest` is not reachable from `src`.
+        """
+        if src not in self.nextHops or dest not in self.nextHops[src]:
             return [-1]
-
-        # If src and dest are 1 step removed, find a common nbr, if any and return
-        # 2 move actions. Do NOT recurse indefinitely.
-        for mid in self.all_locations:
-            d1 = self.getDirection(src, mid, True)
-            if d1[0] >= 0:
-                d2 = self.getDirection(mid, dest, True)
-                if d2[0] >= 0:
-                    return [d1[0], d2[0]]
-
-        return [-1]
+        ds = []
+        while src != dest:
+            d = self.nextHops[src][dest]
+            ds.append(d)
+            src = self.neighbors[d][src]
+        return ds
 
     def moveToLocation(self, agent, src, dest):
         self.world.step(self.getMoveAction(agent, src, dest))
@@ -138,3 +216,4 @@ class WorldMap(object):
         self.moveActions.clear()
         self.neighbors = []
         self.all_locations = []
+        self.nextHops = {}
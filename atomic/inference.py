@@ -62,12 +62,16 @@ def set_player_models(world, observer_name, player_name, victims, param_list):
             for feature, weight in param_dict['reward'].items():
                 feature.set_reward(player, weight, model_name)
         beliefs = player.resetBelief(model=model_name, ignore={modelKey(observer.name)})
+        victims.setObsVarsBeliefs(player, model_name)
 
     # observer has uniform prior distribution over possible player models
     if len(player.models) > 1:
         world.setMentalModel(observer.name, player.name,
                              Distribution({param_dict['name']: 1. / (len(player.models) - 1) for param_dict in param_list}))
 
-    # observer sees everything except true models
+    # observer sees everything except true models and the player's unobserved victim variables, which would otherwise
+    # be joined into a distribution over all their combinations whenever the observer's beliefs are updated
+    unobserved = victims.unobsPriors.get(player.name, {})
     observer.omega = [key for key in world.state.keys()
-                      if key not in {modelKey(player.name), modelKey(observer.name)}]  # rewardKey(player.name),
+                      if key not in {modelKey(player.name), modelKey(observer.name)}  # rewardKey(player.name),
+                      and key not in unobserved]
@@ -52,7 +52,7 @@ class RewardModelAnalyzer(Replayer):
                  num_trajectories=NUM_TRAJECTORIES, length=TRAJ_LENGTH,
                  normalize=NORM_THETA, learn_rate=LEARNING_RATE, epochs=MAX_EPOCHS,
                  diff=DIFF_THRESHOLD, prune=PRUNE_THRESHOLD, horizon=HORIZON,
-                 seed=0, verbosity=0, processes=PROCESSES, img_format=IMG_FORMAT):
+                 seed=0, verbosity=0, processes=PROCESSES, img_format=IMG_FORMAT, cache_dir=None):
         """
         Creates a new reward model learning replayer.
         :param list[str] replays: list of replay log files to process containing the player data.
@@ -71,10 +71,13 @@ class RewardModelAnalyzer(Replayer):
         :param int verbosity: verbosity level.
         :param int processes: the number of processes/cores to use. If `None`, all available cores will be used.
         :param str img_format: the format/extension of result images to be saved.
+        :param str cache_dir: the directory in which to store compiled maps, parsed logs and built worlds for later
+        runs.
         """
         if maps is None:
-            maps = get_default_maps()
-        super().__init__(replays, maps, {}, create_observer=False, processor=TrajectoryParseProcessor())
+            maps = get_default_maps(cache_dir=cache_dir)
+        super().__init__(replays, maps, {}, create_observer=False, processor=TrajectoryParseProcessor(),
+                         cache_dir=cache_dir)
 
         self._all_replays = replays
         self.output = output
@@ -214,7 +217,7 @@ class RewardModelAnalyzer(Replayer):
 
         # print trajectories and player data
         logging.info('Parsed data file {} for player "{}" and got {} state-action pairs from {} events.'.format(
-            self.parser.filename, self.parser.player_name(), len(trajectory), self.parser.data.shape[0]))
+            self.parser.filename, self.parser.player_name(), len(trajectory), len(self.parser.actions)))
         plot_trajectories(
             self.triage_agent, [trajectory], locations, neighbors,
             os.path.join(self._output_dir, 'trajectory.{}'.format(self.img_format)), coordinates,
@@ -6,8 +6,9 @@ from psychsim.pwl import equalRow, rewardKey, makeTree, setToFeatureMatrix, dyna
 from model_learning.features.linear import ValueComparisonLinearRewardFeature, LinearRewardVector, \
     NumericLinearRewardFeature, LinearRewardFeature, ActionLinearRewardFeature
 from atomic.definitions.features import get_triaged_key, get_mission_seconds_key, get_num_visits_location_key, \
-    get_location_key, get_num_victims_location_key
+    get_location_key, get_num_victims_location_key, has_compact_visits, get_location_visited_bit, get_feature_keys
 from atomic.definitions.world import MISSION_PHASES, MISSION_PHASE_END_TIMES, MIDDLE_STR
+from atomic.definitions.world_map import get_visited_values
 
 __author__ = 'Pedro Sequeira'
 __email__ = 'pedrodbs@gmail.com'
@@ -47,6 +48,25 @@ def create_reward_vector(agent, locations, move_actions):
     return LinearRewardVector(features)
 
 
+def _get_visits_feature(agent, location):
+    """
+    Gets the feature holding the agent's visits to a location.
+    :param Agent agent: the PsychSim agent.
+    :param str location: the location.
+    :rtype: tuple[str, int]
+    :return: a tuple (key, bit) with the feature's key and, if visits are compact, the position of the location's
+    flag within the feature, otherwise `None`.
+    """
+    if has_compact_visits(agent):
+        return get_location_visited_bit(agent, location)
+    return get_num_visits_location_key(agent, location), None
+
+
+def _get_num_visits(value, bit):
+    # compact visits only tell whether the location was left before, i.e., whether this is not the first visit
+    return value if bit is None else 1 + (int(value) >> bit & 1)
+
+
 class LocationVictimColorReward(LinearRewardFeature):
     """
     A binary reward feature that is True (1) if the agent is currently in a location where there is a victim of
@@ -72,10 +92,16 @@ class LocationVictimColorReward(LinearRewardFeature):
         # collects feature value distribution
         values = []
         probs = []
+        keys = get_feature_keys(self.agent)
+        loc_color_feats = keys.victims.get(self.color, [None] * len(keys.locations))
         for loc_kv, loc_p in state.distributions[state.keyMap[self.location_feat]].items():
             # gets current location and victim color counter
-            loc = self.world.float2value(self.location_feat, loc_kv[self.location_feat])
-            loc_color_feat = get_num_victims_location_key(loc, self.color)
+            loc_color_feat = loc_color_feats[keys.symbol_index[loc_kv[self.location_feat]]]
+            if loc_color_feat is None:
+                # location that never holds victims
+                values.append(0)
+                probs.append(loc_p)
+                continue
 
             for loc_color_kv, loc_color_p in state.distributions[state.keyMap[loc_color_feat]].items():
                 # gets amount of color victims at location
@@ -89,12 +115,14 @@ class LocationVictimColorReward(LinearRewardFeature):
     def set_reward(self, agent, weight, model=None):
         rwd_feat = rewardKey(agent.name)
 
-        # compares agent's current location
-        rwd_tree = {'if': equalRow(self.location_feat, self.all_locations),
-                    None: noChangeMatrix(rwd_feat)}
+        # compares agent's current location, only for the locations that can hold victims
+        locations = [loc for loc in self.all_locations
+                     if get_num_victims_location_key(loc, self.color) in self.world.variables]
+        rwd_tree = {'if': equalRow(self.location_feat, locations),
+                    None: setToConstantMatrix(rwd_feat, 0)}
 
         # get binary value according to color victims at location
-        for i, loc in enumerate(self.all_locations):
+        for i, loc in enumerate(locations):
             loc_color_feat = get_num_victims_location_key(loc, self.color)
             rwd_tree[i] = {'if': thresholdRow(loc_color_feat, 0),
                            True: setToConstantMatrix(rwd_feat, 1),
@@ -125,14 +153,14 @@ class LocationVisitedReward(LinearRewardFeature):
         # collects feature value distribution
         values = []
         probs = []
+        keys = get_feature_keys(self.agent)
         for loc_kv, loc_p in state.distributions[state.keyMap[self.location_feat]].items():
             # gets current location
-            loc = self.world.float2value(self.location_feat, loc_kv[self.location_feat])
-            loc_freq_feat = get_num_visits_location_key(self.agent, loc)
+            loc_freq_feat, bit = keys.visits[keys.symbol_index[loc_kv[self.location_feat]]]
 
             for loc_freq_kv, loc_freq_p in state.distributions[state.keyMap[loc_freq_feat]].items():
                 # gets visitation frequency at current location
-                freq = loc_freq_kv[loc_freq_feat]
+                freq = _get_num_visits(loc_freq_kv[loc_freq_feat], bit)
 
                 values.append(int(freq > 1))
                 probs.append(loc_p * loc_freq_p)
@@ -149,8 +177,9 @@ class LocationVisitedReward(LinearRewardFeature):
 
         # get binary value according to visitation of location
         for i, loc in enumerate(self.all_locations):
-            loc_freq_feat = get_num_visits_location_key(agent, loc)
-            rwd_tree[i] = {'if': thresholdRow(loc_freq_feat, 1),
+            loc_freq_feat, bit = _get_visits_feature(agent, loc)
+            rwd_tree[i] = {'if': thresholdRow(loc_freq_feat, 1) if bit is None else
+                           equalRow(loc_freq_feat, get_visited_values(bit)),
                            True: setToConstantMatrix(rwd_feat, 1),
                            False: setToConstantMatrix(rwd_feat, 0)}
 
@@ -171,6 +200,9 @@ class LocationFrequencyReward(LinearRewardFeature):
         :param bool inverse: whether to take the inverse frequency, i.e., `time - freq`.
         :param int max_frequency: the maximum frequency that the agent can achieve (either for any or all locations).
         """
+        if has_compact_visits(agent):
+            raise ValueError('Location frequency requires visit counters, but the visits of {} are compact, which '
+                             'only tells whether each location was left before'.format(agent.name))
         super().__init__(name, 1. / max_frequency)  # use max frequency as normalization factor to keep var in [0,1]
         self.agent = agent
         self.world = agent.world
@@ -183,10 +215,10 @@ class LocationFrequencyReward(LinearRewardFeature):
         # collects feature value distribution
         values = []
         probs = []
+        keys = get_feature_keys(self.agent)
         for loc_kv, loc_p in state.distributions[state.keyMap[self.location_feat]].items():
             # gets current location
-            loc = self.world.float2value(self.location_feat, loc_kv[self.location_feat])
-            loc_freq_feat = get_num_visits_location_key(self.agent, loc)
+            loc_freq_feat, _ = keys.visits[keys.symbol_index[loc_kv[self.location_feat]]]
 
             for loc_freq_kv, loc_freq_p in state.distributions[state.keyMap[loc_freq_feat]].items():
                 # gets visitation frequency at current location
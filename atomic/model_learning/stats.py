@@ -3,7 +3,7 @@ from collections import OrderedDict
 from psychsim.agent import Agent
 from psychsim.probability import Distribution
 from psychsim.world import World
-from atomic.definitions.features import get_num_visits_location_key, get_mission_seconds_key
+from atomic.definitions.features import get_mission_seconds_key, get_feature_keys
 
 __author__ = 'Pedro Sequeira'
 __email__ = 'pedrodbs@gmail.com'
@@ -16,7 +16,8 @@ def get_locations_frequencies(trajectories, agents, locations):
     :param Agent or list[Agent] agents: a list with the agent for each trajectory set whose location frequencies we want to retrieve.
     :param list[str] locations: the list of possible world locations.
     :rtype: dict[str,float]
-    :return: the visitation frequencies for each location.
+    :return: the visitation frequencies for each location. If the agents' visits are compact, these are the
+    probabilities of having left each location at least once instead, since visits are not counted.
     """
     if isinstance(agents, Agent):
         agents = [agents] * len(trajectories)
@@ -25,10 +26,16 @@ def get_locations_frequencies(trajectories, agents, locations):
     data = np.zeros(len(locations))
     for i in range(len(trajectories)):
         world = trajectories[i][-1][0]
+        keys = get_feature_keys(agents[i])
         traj_data = []
         for loc in locations:
-            loc_freq_feat = get_num_visits_location_key(agents[i], loc)
-            traj_data.append(world.getFeature(loc_freq_feat).expectation())
+            loc_freq_feat, bit = keys.visits[keys.location_index[loc]]
+            if keys.compact_visits:
+                # compact visits only tell whether the location was left at least once
+                dist = world.getFeature(loc_freq_feat)
+                traj_data.append(sum(p for value, p in dist.items() if int(value) >> bit & 1))
+            else:
+                traj_data.append(world.getFeature(loc_freq_feat).expectation())
         data += traj_data
     return dict(zip(locations, data))
 
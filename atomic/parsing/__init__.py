@@ -1,6 +1,11 @@
 import logging
-from atomic.definitions.victims import Victims
+import math
+from psychsim.pwl import stateKey
+from atomic.definitions.features import get_feature_keys
+from atomic.definitions.victims import Victims, COLORS, GREEN_STR, GOLD_STR
+from atomic.definitions.world import get_mission_phase
 from atomic.definitions.world_map import WorldMap
+from atomic.parsing.events import EventSequence, LOCATION, TRIAGE, FEATURE
 
 
 class GameLogParser(object):
@@ -18,6 +23,16 @@ class GameLogParser(object):
         self.filename = filename
         self.processor = processor
         self.logger = logger
+        self.human = None
+        self.locations = []
+        self.actions = EventSequence()
+
+    def player_name(self):
+        """
+        :return: the name of the human player in the log file
+        :rtype: str
+        """
+        return self.human
 
     def getActionsAndEvents(self, victims, world_map, maxEvents=-1):
         """
@@ -29,11 +44,154 @@ class GameLogParser(object):
         """
         pass
 
-    def runTimeless(self, world, start, end, ffwdTo=0, prune_threshold=None, permissive=False):
+    def runTimeless(self, world, start, end, ffwdTo=0, prune_threshold=None, permissive=False, fast_legality=False):
         """
         Run actions and flag resetting events in the order they're given. No notion of timestamps
+        :param int ffwdTo: ignored, kept for compatibility with callers that used to step interactively from it.
+        :param bool fast_legality: whether to check the legality of each action via `isLegal`, rather than by
+        evaluating the legality of all of the player's actions, in the world and under each of its models.
         """
-        pass
+        agent = world.agents[self.human]
+        clock = get_feature_keys(agent).seconds
+        end = min(end, len(self.actions))
+        self.logger.debug(self.actions[start])
+        for t in range(start, end):
+            event = self.actions[t]
+
+            if t == 0:
+                # First event sets the initial state (location or feature), or is an actual action
+                if event.type == LOCATION:
+                    self.setLocation(world, event.payload, False)
+                elif event.type == FEATURE:
+                    var, val = event.payload
+                    world.setState(self.human, var, val)
+                    agent.setBelief(stateKey(self.human, var), val)
+                else:
+                    world.step(event.payload)
+                continue
+
+            # manually sync the time feature with the game's time, and apply the transitions scheduled until then
+            if not math.isnan(event.seconds):
+                world.syncClock(event.seconds)
+                world.applyScheduled(event.seconds)
+
+            if self.processor is not None:
+                self.processor.pre_step(world)
+
+            act = None
+            self.logger.info('%d) Running msg %d: %s' % (t, event.index, event))
+            if event.type == LOCATION:
+                self.setLocation(world, event.payload)
+
+            elif event.type == FEATURE:
+                var, val = event.payload
+                key = stateKey(self.human, var)
+                world.state[key] = world.value2float(key, val)
+                for model in world.getModel(self.human).domain():
+                    if val not in world.getFeature(key, agent.models[model]['beliefs']).domain():
+                        raise ValueError('Unbelievable data point at time %s: %s=%s' % (event.seconds, var, val))
+                    agent.models[model]['beliefs'][key] = world.value2float(key, val)
+                self.logger.info('Set: {}'.format(key))
+
+            else:
+                act = event.payload
+                for model in world.getModel(self.human).domain():
+                    beliefs = agent.models[model]['beliefs']
+                    if not (self.isLegal(world, act, beliefs) if fast_legality
+                            else act in agent.getLegalActions(beliefs)):
+                        self.logger.warning('Action {} not believed to be legal under model {}'.format(act, model))
+                if not (self.isLegal(world, act) if fast_legality else act in agent.getLegalActions()):
+                    legal_choices = agent.getLegalActions()
+                    raise ValueError('Illegal action ({}) at time {}. Legal choices: {}'.format(
+                        act, t, ', '.join(sorted(map(str, legal_choices)))))
+                selDict = {}
+                if event.type == TRIAGE:
+                    # This is a triage action with an associated duration
+                    curTime = world.getFeature(clock, unique=True)
+                    newTime = curTime + event.duration
+                    selDict[clock] = newTime
+                    self.logger.debug('Time now %d triage until %d' % (curTime, newTime))
+                self.logger.info('Injecting %s' % (selDict))
+                world.step(act, select=selDict, threshold=prune_threshold)
+                world.modelGC()
+
+            self.summarizeState(world)
+            self.logger.info('True Time: %s' % (event.seconds))
+            if self.processor is not None:
+                self.processor.post_step(world, None if act is None else world.getAction(self.human))
+
+        if len(world.branchCounts) > 0:
+            self.logger.info('Stochastic outcomes: %d in real steps, %d in lookahead (%d more collapsed)' % (
+                world.branchCounts['real'], world.branchCounts['lookahead'], world.branchCounts['collapsed']))
+
+    def isLegal(self, world, act, state=None):
+        """
+        Checks whether an action of the player is legal. Triage actions are checked by reading the player's location and
+        the victim counters there directly, while other actions are checked via their own legality tree only.
+        :param World world: the PsychSim world.
+        :param ActionSet act: the player's action.
+        :param state: the state in which to check legality, e.g., a model's beliefs. `None` for the world state.
+        :rtype: bool
+        :return: `True` if the action is (possibly) legal in the given state, `False` otherwise.
+        """
+        agent = world.agents[self.human]
+        verb = act['verb']
+        if not verb.startswith('triage_'):
+            return act in agent.getLegalActions(state, {act})
+        keys = get_feature_keys(agent)
+        victims = keys.victims.get(verb[len('triage_'):])
+        if victims is None:
+            return False
+        state = world.state if state is None else state
+        for loc_kv in state.distributions[state.keyMap[keys.location]].domain():
+            key = victims[keys.symbol_index[loc_kv[keys.location]]]
+            if key is not None and any(kv[key] > 0 for kv in state.distributions[state.keyMap[key]].domain()):
+                return True
+        return False
+
+    def setLocation(self, world, loc, leave=True):
+        """
+        Sets the player's location (and its visit count), both in the world state and in the player's beliefs.
+        :param World world: the PsychSim world.
+        :param str loc: the player's new location.
+        :param bool leave: whether the player left its previous location, which is then marked as visited if visits
+        are compact. Should be `False` when setting the player's initial location.
+        """
+        agent = world.agents[self.human]
+        keys = get_feature_keys(agent)
+        if keys.compact_visits:
+            prev = world.getFeature(keys.location, unique=True)
+            if leave and prev != loc:
+                key, bit = keys.visits[keys.location_index[prev]]
+                value = int(world.getFeature(key, unique=True)) | 1 << bit
+                world.setFeature(key, value)
+                agent.setBelief(key, value)
+        else:
+            key, _ = keys.visits[keys.location_index[loc]]
+            world.setFeature(key, 1)
+            agent.setBelief(key, 1)
+        world.setFeature(keys.location, loc)
+        agent.setBelief(keys.location, loc)
+
+    def summarizeState(self, world):
+        self.logger.info('_____________________________________')
+        keys = get_feature_keys(world.agents[self.human])
+        loc = world.getFeature(keys.location, unique=True)
+        i = keys.location_index[loc]
+        time = world.getFeature(keys.seconds, unique=True)
+        self.logger.info('Time: %d (%s)' % (time, get_mission_phase(time)))
+
+        self.logger.info('Player location: %s' % (loc))
+        for clr in COLORS:
+            if keys.victims[clr][i] is not None:
+                self.logger.debug('%s count: %s' % (clr, world.getFeature(keys.victims[clr][i], unique=True)))
+        key, bit = keys.visits[i]
+        if keys.compact_visits:
+            self.logger.info('Visited: %s' % (int(world.getFeature(key, unique=True)) >> bit & 1 == 1))
+        else:
+            self.logger.info('Visits: %d' % (world.getFeature(key, unique=True)))
+        self.logger.info('JustSavedGr: %s' % (world.getFeature(keys.num_triaged[GREEN_STR], unique=True)))
+        self.logger.info('JustSavedGd: %s' % (world.getFeature(keys.num_triaged[GOLD_STR], unique=True)))
 
 
 class ParsingProcessor(object):
@@ -6,35 +6,112 @@ Created on Thu Apr  2 20:35:23 2020
 @author: mostafh
 """
 import logging
+import re
 import pandas as pd
 import numpy as np
 import os.path
-from psychsim.action import ActionSet
-from psychsim.pwl import stateKey
-from psychsim.world import WORLD
 from atomic.parsing import GameLogParser
+from atomic.parsing.events import EventSequence, LOCATION, MOVE, TRIAGE, MAX_MISSION_TIMER
 from atomic.definitions.victims import Victims
 from atomic.definitions.world_map import WorldMap
 
-ACTION = 0
-SET_FLG = 1
-SEARCH = 3
-
-MAX_MISSION_TIMER = 10 * 60  # max num seconds in game's timer
+# schema of the processed log files: only these columns are loaded, with the given types
+TIMESTAMP_FORMATS = ['%Y-%m-%dT%H:%M:%S.%f%z', '%Y-%m-%dT%H:%M:%S%z']
+CSV_COLUMN_TYPES = {
+    '@timestamp': str,
+    'player_ID': 'category',
+    'Room_in': 'category',
+    'num_victims': 'int16',
+    'victim_in_crosshair_id': str,
+    'event_triage_victim_id': str,
+    'triage_in_progress': bool,
+    'triage_result': 'category',
+    'mission_timer': float}
+CSV_VICTIM_COLUMN_TYPES = {'id': str, 'color': 'category', 'in_FOV': bool}
+CSV_VICTIM_COLUMN_RE = re.compile(r'^victim_(\d+)_(id|color|in_FOV)$')
+
+
+def get_csv_schema(columns):
+    """
+    Gets the columns of a processed log file that are needed for parsing, along with their types.
+    :param list[str] columns: the columns present in the log file.
+    :rtype: dict[str, type or str]
+    :return: a dictionary with the type of each column to be loaded.
+    """
+    schema = {}
+    for col in columns:
+        if col in CSV_COLUMN_TYPES:
+            schema[col] = CSV_COLUMN_TYPES[col]
+        else:
+            match = CSV_VICTIM_COLUMN_RE.match(col)
+            if match is not None:
+                schema[col] = CSV_VICTIM_COLUMN_TYPES[match.group(2)]
+    return schema
+
+
+def parse_timestamps(stamps):
+    """
+    Parses the log's timestamps using the (fixed) formats in `TIMESTAMP_FORMATS`, in order.
+    :param pd.Series stamps: the timestamp strings.
+    :rtype: pd.Series
+    :return: the UTC datetimes corresponding to the given timestamps.
+    """
+    dtime = pd.to_datetime(stamps, format=TIMESTAMP_FORMATS[0], errors='coerce', utc=True)
+    for fmt in TIMESTAMP_FORMATS[1:]:
+        missing = dtime.isna() & stamps.notna()
+        if not missing.any():
+            break
+        dtime[missing] = pd.to_datetime(stamps[missing], format=fmt, errors='coerce', utc=True)
+    return dtime
+
+
+def normalize_room_name(room):
+    """
+    Rooms with numeric names get an 'R' prepended, and any 'd' or 'x' suffix is removed.
+    """
+    if room.startswith('2'):
+        room = 'R' + room
+    if room.endswith('x') or room.endswith('d'):
+        room = room[:-1]
+    return room
 
 
 class ProcessCSV(GameLogParser):
 
-    def __init__(self, filename, processor=None, logger=logging):
+    def __init__(self, filename, processor=None, logger=logging, chunksize=None):
+        """
+        Creates a new parser for a processed log file.
+        :param str filename: the name of the file to be parsed.
+        :param ParsingProcessor processor: the parsing processor, for pre- and post-step processing.
+        :param logger: the logger handler.
+        :param int chunksize: if not `None`, the (CSV) file is streamed in chunks of this number of rows while
+        extracting actions, instead of being loaded as a whole. Rows are then sorted within each chunk only, so the
+        file has to be time-ordered across chunks, otherwise a `ValueError` is raised while extracting actions.
+        """
         super().__init__(filename, processor, logger)
-        self.actions = []
-        if os.path.splitext(filename)[1] == '.xlsx':
-            self.data = pd.read_excel(filename)
-        elif os.path.splitext(filename)[1] == '.csv':
-            self.data = pd.read_csv(filename)
+        self.chunksize = chunksize
+        self.pData = None
+        ext = os.path.splitext(filename)[1]
+        if ext == '.xlsx' and chunksize is not None:
+            raise ValueError('Chunked reading (chunksize={}) is only supported for CSV files, not "{}"'.format(
+                chunksize, ext))
+        if ext == '.xlsx':
+            self.schema = get_csv_schema(pd.read_excel(filename, nrows=0).columns)
+            self.data = pd.read_excel(filename, usecols=list(self.schema), dtype=self.schema)
+        elif ext == '.csv':
+            self.schema = get_csv_schema(pd.read_csv(filename, nrows=0).columns)
+            self.data = None if chunksize is not None else \
+                pd.read_csv(filename, usecols=list(self.schema), dtype=self.schema)
+        else:
+            raise NameError('Unable to process data file with "{}" extension'.format(ext))
+
+        if self.data is not None:
+            self.maxVicsInLoc = int(self.data['num_victims'].max())
         else:
-            raise NameError('Unable to process data file with "{}" extension'.format(os.path.splitext(filename)[1]))
-        self.maxVicsInLoc = self.data['num_victims'].max()
+            # same victim slots as when loading the whole file, so that both modes keep the same rows
+            chunks = pd.read_csv(filename, usecols=['num_victims'], dtype=CSV_COLUMN_TYPES['num_victims'],
+                                 chunksize=chunksize)
+            self.maxVicsInLoc = int(max(chunk['num_victims'].max() for chunk in chunks))
 
         self.cols = [
             'Room_in',
@@ -51,99 +128,121 @@ class ProcessCSV(GameLogParser):
                 'victim_' + str(iv) + '_color',
                 'victim_' + str(iv) + '_in_FOV']
 
+        self.locations = []
+        if self.data is not None:
+            self.data = self.cleanData(self.data)
+
+            # Collect names of locations
+            self.locations = [str(loc) for loc in self.data['Room_in'].unique()]
+
+    def readChunks(self):
+        """
+        Streams the log file in chunks of `chunksize` rows, each cleaned with `cleanData`.
+        :rtype: Iterator[pd.DataFrame]
+        """
+        for chunk in pd.read_csv(self.filename, usecols=list(self.schema), dtype=self.schema,
+                                 chunksize=self.chunksize):
+            yield self.cleanData(chunk)
+
+    def cleanData(self, data):
+        """
+        Removes invalid rows from the given log data, and normalizes locations, timestamps and victims in FOV.
+        :param pd.DataFrame data: the log data.
+        :rtype: pd.DataFrame
+        :return: the cleaned log data.
+        """
         # Remove rows w/o locations
-        self.logger.info('Number of rows %d' % (len(self.data)))
-        self.data.dropna(axis=0, subset=['Room_in'], inplace=True)
-        self.data = self.data.loc[self.data['Room_in'] != 'None', :]
-        self.logger.info('Number of rows after empty room removal %d' % (len(self.data)))
+        self.logger.info('Number of rows %d' % (len(data)))
+        data = data.loc[data['Room_in'].notna() & (data['Room_in'] != 'None'), :]
+        self.logger.info('Number of rows after empty room removal %d' % (len(data)))
 
         # Remove in_progress rows that were never back-filled
-        self.data = self.data.loc[self.data['triage_result'] != 'IN_PROGRESS', :]
-        self.logger.info('Number of rows after triage in progress removal %d' % (len(self.data)))
+        data = data.loc[data['triage_result'] != 'IN_PROGRESS', :]
+        self.logger.info('Number of rows after triage in progress removal %d' % (len(data)))
 
         # Remove triage_in_progress rows where victim being triaged different from victim in CH
-        triageOn = self.data['triage_in_progress'] == True
-        sameVic = self.data['event_triage_victim_id'] == self.data['victim_in_crosshair_id']
-        self.data = self.data.loc[~triageOn | sameVic, :]
-        self.logger.info('Number of rows after inconsistent triage vic and CH removal %d' % (len(self.data)))
-
-        # Rooms with numeric names: Prepend 'R'
-        mask = self.data['Room_in'].str.startswith('2')
-        newRoom = 'R' + self.data['Room_in']
-        self.data.loc[mask, 'Room_in'] = newRoom.loc[mask]
-        self.data['Room_in'] = self.data['Room_in'].astype(str)
-
-        # Remove 'd' or 'x' at the end of room names
-        rooms = [str(loc) for loc in self.data['Room_in'].unique()]
-        newRooms = {r: r for r in rooms if not (r.endswith('x') or r.endswith('d'))}
-        newRooms.update({r: r[:-1] for r in rooms if r.endswith('x') or r.endswith('d')})
-        self.data['Room_in'].replace(newRooms, inplace=True)
+        triageOn = data['triage_in_progress'] == True
+        sameVic = data['event_triage_victim_id'] == data['victim_in_crosshair_id']
+        data = data.loc[~triageOn | sameVic, :].copy()
+        self.logger.info('Number of rows after inconsistent triage vic and CH removal %d' % (len(data)))
+
+        # Normalize room names, once per distinct room rather than per row
+        rooms = data['Room_in'].cat.remove_unused_categories().cat.categories
+        data['Room_in'] = data['Room_in'].map(
+            {room: normalize_room_name(str(room)) for room in rooms}).astype('category')
 
         ## Create flag for whether any victim is in FOV
-        self.data['isAVicInFOV'] = self.data['victim_0_in_FOV']
-        for iv in range(1, self.maxVicsInLoc):
-            self.data['isAVicInFOV'] = self.data['isAVicInFOV'] | self.data['victim_' + str(iv) + '_in_FOV']
+        data['isAVicInFOV'] = data[['victim_' + str(iv) + '_in_FOV' for iv in range(self.maxVicsInLoc)]].any(axis=1)
 
-        # Collect names of locations
-        self.locations = [str(loc) for loc in self.data['Room_in'].unique()]
+        data['dtime'] = parse_timestamps(data['@timestamp'])
 
-        #        fstr1 = '%Y-%m-%dT%H:%M:%S.%fZ'
-        #        fstr2 = '%Y-%m-%dT%H:%M:%SZ'
-        #            self.data['dtime'] = pd.to_datetime(self.data['@timestamp'], format=fstr1, exact=False)
-        self.data['dtime'] = pd.to_datetime(self.data['@timestamp'], infer_datetime_format=True, exact=False)
+        self.chkCHAndFOV(data)
+        return data
 
-        self.chkCHAndFOV()
+    def chkCHAndFOV(self, data):
+        fovCols = ['victim_' + str(vi) + '_in_FOV' for vi in range(self.maxVicsInLoc)]
+        idCols = ['victim_' + str(vi) + '_id' for vi in range(self.maxVicsInLoc)]
+        inFov = data[fovCols].to_numpy(dtype=bool)
 
-    def chkCHAndFOV(self):
         ## Warn if multiple vics in FOV
-        numInFov = self.data.loc[:, 'victim_0_in_FOV']
-        for iv in range(1, self.maxVicsInLoc):
-            numInFov = numInFov + self.data['victim_' + str(iv) + '_in_FOV'].astype(int)
-        numManyFOV = np.count_nonzero(numInFov > 1)
+        manyFOV = inFov.sum(axis=1) > 1
+        numManyFOV = np.count_nonzero(manyFOV)
         if numManyFOV > 0:
             self.logger.warning('%d rows with multiple victims in FOV' % (numManyFOV))
 
         ## Can't have vic in CH but none in FOV
-        chNotFOV = self.data.loc[self.data['triage_in_progress'] & \
-                                 (self.data['victim_in_crosshair_id'] != 'None') & \
-                                 (self.data['isAVicInFOV'] == False)]
+        chNotFOV = data.loc[data['triage_in_progress'] & \
+                            (data['victim_in_crosshair_id'] != 'None') & \
+                            (data['isAVicInFOV'] == False)]
         if len(chNotFOV) > 0:
             self.logger.warn('Triage and victim in CH but none in FOV ' + str(len(chNotFOV)))
 
         ## If multiple in FOV, set FOV flag of all but the CH victim to False
-        manyFOV = numInFov[numInFov > 1]
-        for idx in manyFOV.index:
-            vicInCH = self.data.loc[idx, 'victim_in_crosshair_id']
-            for vi in range(self.maxVicsInLoc):
-                thisID = self.data.loc[idx, 'victim_' + str(vi) + '_id']
-                if thisID == 'None':
-                    break
-                self.data.loc[idx, 'victim_' + str(vi) + '_in_FOV'] = (vicInCH == thisID)
-
-    def getFOVColor(self, row):
-        for vi in range(self.maxVicsInLoc):
-            if row['victim_' + str(vi) + '_in_FOV']:
-                return row['victim_' + str(vi) + '_color']
-
-    def getDurationIfTriaging(self, row, originalDuration):
-        # Quantize duration to 5, 8 or 15
-        if not row['triage_in_progress']:
-            return originalDuration
-
-        fovColor = self.getFOVColor(row)
-        if originalDuration <= 7:
-            duration = 5
-        elif (originalDuration > 7) and (originalDuration < 15):
-            if fovColor == 'Green':
-                duration = 8
-            else:
-                duration = 5
-        elif originalDuration >= 15:
-            if fovColor == 'Green':
-                duration = 8
-            else:
-                duration = 15
-        return duration
+        ## (only victim slots before the first 'None' id are considered)
+        if numManyFOV == 0:
+            return
+        ids = data[idCols].to_numpy(dtype=object)
+        inCH = ids == data['victim_in_crosshair_id'].to_numpy(dtype=object)[:, np.newaxis]
+        beforeNone = np.cumprod(ids != 'None', axis=1).astype(bool)
+        data[fovCols] = np.where(manyFOV[:, np.newaxis] & beforeNone, inCH, inFov)
+
+    def getFOVColors(self, data):
+        """
+        Gets the color of the first victim in the player's FOV for each row of the given data (`None` if no victim).
+        :param pd.DataFrame data: the log data.
+        :rtype: np.ndarray
+        """
+        inFov = data[['victim_' + str(vi) + '_in_FOV' for vi in range(self.maxVicsInLoc)]].to_numpy(dtype=bool)
+        colors = data[['victim_' + str(vi) + '_color' for vi in range(self.maxVicsInLoc)]].to_numpy(dtype=object)
+        fovColors = colors[np.arange(len(data)), inFov.argmax(axis=1)]
+        fovColors[~inFov.any(axis=1)] = None
+        return fovColors
+
+    @staticmethod
+    def getDurationsIfTriaging(durations, triaging, fovColors):
+        # Quantize duration of triage rows to 5, 8 or 15
+        isGreen = fovColors == 'Green'
+        return np.select([~triaging, durations <= 7, isGreen, durations < 15],
+                         [durations, 5, 8, 5], 15)
+
+    def getPlayerData(self, data):
+        """
+        Gets the player's rows from the given log data, sorted by time, without consecutive duplicates and with the
+        duration of each row.
+        :param pd.DataFrame data: the (cleaned) log data.
+        :rtype: pd.DataFrame
+        """
+        ## Sort by time
+        pData = data.loc[data['player_ID'] == self.human, ['dtime'] + self.cols].sort_values('dtime', axis=0)
+
+        ## Drop consecutive duplicate entries (ignoring the timestamp)
+        pData = pData.loc[(pData[self.cols].shift() != pData[self.cols]).any(axis=1)]
+        self.logger.info('Dropped duplicates. Down to %d' % (len(pData)))
+
+        pData['duration'] = np.ceil(-pData['dtime'].diff(periods=-1) / np.timedelta64(1, 's'))
+        if len(pData) > 0:
+            pData.iloc[-1, pData.columns.get_loc('duration')] = 0
+        return pData
 
     def getActionsAndEvents(self, victims, world_map, maxEvents=-1):
         """
@@ -154,210 +253,178 @@ class ProcessCSV(GameLogParser):
         :return:
         """
         ## Assume we're only interested in the player appearing on the first row
+        if self.chunksize is None:
+            self.warnUnknownLocations(self.locations, world_map)
+            self.extractPlayerActions(self.player_name(), self.data, victims, world_map, maxEvents)
+            return
+
         self.human = self.player_name()
-        self.pData = self.data.loc[self.data['player_ID'] == self.human]
+        self.resetActionState()
+
+        ## Stream the file, holding back the last row of each chunk until its duration is known from the next one
+        locations = set()
+        pending = None
+        offset = 0
+        lastTime = None
+        for data in self.readChunks():
+            locations.update(str(loc) for loc in data['Room_in'].unique())
+
+            ## Rows are only sorted within each chunk, so the log has to be time-ordered across chunks
+            times = data.loc[data['player_ID'] == self.human, 'dtime']
+            if times.notna().any():
+                if lastTime is not None and times.min() < lastTime:
+                    raise ValueError('Log {} is not time-ordered across chunks (row at {} after row at {}), '
+                                     'it has to be parsed as a whole (chunksize=None)'.format(
+                                         self.filename, times.min(), lastTime))
+                lastTime = times.max()
+
+            pData = self.getPlayerData(data)
+            if pending is not None and len(pData) > 0:
+                ## Drop a first row repeating the one held back, whose duration is then given by the next row
+                if not (pData[self.cols].iloc[0] != pending[self.cols].iloc[0]).any():
+                    pData = pData.iloc[1:]
+                if len(pData) == 0:
+                    continue
+                pending = pending.assign(duration=np.ceil(
+                    (pData['dtime'].iloc[0] - pending['dtime'].iloc[0]) / np.timedelta64(1, 's')))
+                if not self.extractActions(pending, victims, world_map, maxEvents, offset):
+                    pending = None
+                    break
+                offset += 1
+            if len(pData) == 0:
+                continue
+            pending = pData.iloc[-1:]
+            if not self.extractActions(pData.iloc[:-1], victims, world_map, maxEvents, offset):
+                pending = None
+                break
+            offset += len(pData) - 1
+        if pending is not None:
+            self.extractActions(pending, victims, world_map, maxEvents, offset)
+        self.locations = list(locations)
+        self.warnUnknownLocations(self.locations, world_map)
 
-        locs = sorted([l for l in self.data['Room_in'].unique() if not l in world_map.all_locations])
+    def extractPlayerActions(self, player, data, victims, world_map, maxEvents=-1):
+        """
+        Replaces this parser's actions with those of the given player in the given log data.
+        :param str player: the name of the player whose actions are to be extracted.
+        :param pd.DataFrame data: the (cleaned) log data.
+        :param Victims victims: the distribution of victims over the world.
+        :param WorldMap world_map: the world map with all locations.
+        :param int maxEvents: the maximum number of events to be parsed.
+        :rtype: EventSequence
+        :return: the sequence of events of the given player.
+        """
+        self.human = player
+        self.actions = EventSequence()
+        self.resetActionState()
+        self.pData = self.getPlayerData(data)
+        self.extractActions(self.pData, victims, world_map, maxEvents)
+        return self.actions
+
+    def resetActionState(self):
+        ## State carried between consecutive rows (and chunks)
+        self.lastLoc = None
+        self.prevTip = None
+        self.prevResult = None
+        self.attemptID = 0
+
+    def warnUnknownLocations(self, locations, world_map):
+        locs = sorted([l for l in locations if not world_map.getMapLocation(l) in world_map.all_locations])
         if len(locs) > 0:
             self.logger.warning('Locations in player data but not map %s' % (','.join(locs)))
 
-        ## Sort by time
-        self.pData = self.pData.loc[:, ['dtime'] + self.cols].sort_values('dtime', axis=0)
-
-        self.pData.to_csv('debug.csv')
-
-        ## Drop consecutive duplicate entries (ignoring the timestamp)
-        self.pData = self.pData.loc[(self.pData[self.cols].shift() != self.pData[self.cols]).any(axis=1)]
-        self.logger.info('Dropped duplicates. Down to %d' % (len(self.pData)))
-
-        self.pData['duration'] = np.ceil(-self.pData['dtime'].diff(periods=-1) / np.timedelta64(1, 's'))
-        self.pData['duration'].values[-1] = 0
-
-        prev = pd.Series()
-        lastLoc = None
-        attemptID = 0
-        start_stamp = None
-        for ir, row in self.pData.iterrows():
+    def extractActions(self, pData, victims, world_map, maxEvents=-1, offset=0):
+        """
+        Adds the move and triage actions corresponding to the given player data, continuing from the state left by
+        previously processed rows.
+        :param pd.DataFrame pData: the player data, as given by `getPlayerData`.
+        :param Victims victims: the distribution of victims over the world.
+        :param WorldMap world_map: the world map with all locations.
+        :param int maxEvents: the maximum number of events to be parsed.
+        :param int offset: the number of player rows processed before the given data.
+        :rtype: bool
+        :return: `False` if the maximum number of events was reached, `True` otherwise.
+        """
+        ## Column-wise quantities needed to create the actions
+        rooms = pData['Room_in'].map(world_map.getMapLocation).to_numpy(dtype=object)
+        tips = pData['triage_in_progress'].to_numpy(dtype=bool)
+        results = pData['triage_result'].to_numpy(dtype=object)
+        fovColors = self.getFOVColors(pData)
+        durations = self.getDurationsIfTriaging(pData['duration'].to_numpy(), tips, fovColors)
+        seconds = MAX_MISSION_TIMER - pData['mission_timer'].to_numpy(dtype=float)
+        stamps = pData['dtime'].array
+
+        ## Only rows where the room, triage flag or triage result changed can generate actions
+        changed = (rooms[1:] != rooms[:-1]) | (tips[1:] != tips[:-1]) | (results[1:] != results[:-1])
+        edges = np.concatenate(([0], np.flatnonzero(changed) + 1, [len(rooms)]))
+
+        ir = 0
+        while ir < len(rooms):
             if (maxEvents > 0) and (len(self.actions) > maxEvents):
-                break
+                return False
             triageActs = []
-            events = []
             moveActs = []
-            searchActs = []
-            stamp = row['dtime']
-            mission_timer = row['mission_timer']
-            duration = row['duration']
-            duration = self.getDurationIfTriaging(row, duration)
+            stamp = stamps[ir]
+            duration = durations[ir]
+            fovColor = fovColors[ir]
+            room = rooms[ir]
 
             # Entered a new room.
-            if row['Room_in'] != lastLoc:
-                if lastLoc == None:
+            if room != self.lastLoc:
+                if self.lastLoc == None:
                     # First elements in actions is the intial location
-                    moveActs = [row['Room_in']]
+                    self.actions.append(LOCATION, room, duration, seconds[ir], offset + ir, self.attemptID)
                 else:
                     # Add a move action
-                    mv = world_map.getMoveAction(self.human, lastLoc, row['Room_in'])
+                    mv = world_map.getMoveAction(self.human, self.lastLoc, room)
                     if mv == []:
-                        self.logger.warning('unreachable %s %s %s' % (lastLoc, row['Room_in'], row['dtime']))
-                        #                        ## Transport player to new location by force
-                        #                        events.append(['loc', row['Room_in']])
+                        self.logger.warning('unreachable %s %s %s' % (self.lastLoc, room, stamp))
+                        # Player stays in last room, so visit every row until it is reachable again
+                        ir += 1
                         continue
-                    for m in mv:
-                        moveActs.append(m)
+                    moveActs.extend(mv)
 
-                lastLoc = row['Room_in']
-                self.logger.debug('moved to %s %s' % (lastLoc, stamp))
+                self.lastLoc = room
+                self.logger.debug('moved to %s %s' % (self.lastLoc, stamp))
 
                 # Is a TIP in this new room?
-                if row['triage_in_progress']:
-                    ## event_triage_victim_id
-                    fovColor = self.getFOVColor(row)
-                    triageAct = victims.getTriageAction(self.human, fovColor)
-                    triageActs.append([triageAct, duration])
+                if tips[ir]:
+                    triageActs.append(victims.getTriageAction(self.human, fovColor))
                     self.logger.debug('triage started in new room')
 
             # same room. Compare flag values to know what changed!
-            else:
-
-                # If TIP changed
-                tip = 'triage_in_progress'
-                tstatus = 'triage_result'
-                if (row[tip] != prev[tip]) or (row[tstatus] != prev[tstatus]):
-                    if row[tip]:
-                        fovColor = self.getFOVColor(row)
-                        triageAct = victims.getTriageAction(self.human, fovColor)
-                        triageActs.append([triageAct, duration])
-                        self.logger.debug('triage started')
-                    if prev[tip]:
-                        attemptID = attemptID + 1
-
-            ## Inject move action(s), then events, then crosshair/approach actions
+            elif (tips[ir] != self.prevTip) or (results[ir] != self.prevResult):
+                if tips[ir]:
+                    triageActs.append(victims.getTriageAction(self.human, fovColor))
+                    self.logger.debug('triage started')
+                if self.prevTip:
+                    self.attemptID = self.attemptID + 1
+
+            ## Inject move action(s), then triage actions
             ## If we have move act(s), the first one take all duration and the rest 0
             for i, mact in enumerate(moveActs):
-                dur = 0
-                if i == 0:
-                    dur = duration
-                    duration = 0
-                self.actions.append([ACTION, [mact], stamp, dur, attemptID, mission_timer])
-            for i, sact in enumerate(searchActs):
-                dur = 0
-                if i == 0:
-                    dur = duration
-                    duration = 0
-                ## Enforce the value in the data on actions that don't otherwise affect approached victim                
-                self.actions.append([SEARCH, sact, stamp, dur, attemptID, mission_timer])
-            # acts = triage 
-            for i, act in enumerate(triageActs):
-                ## Enforce the value in the data on actions that don't otherwise affect approached victim                
-                self.actions.append([ACTION, act, stamp, duration, attemptID, mission_timer])
-                duration = 0
-
-            for ev in events:
-                dur = 0
-                if i == 0:
-                    dur = duration
-                    duration = 0
-                self.actions.append([SET_FLG, ev, stamp, dur, attemptID, mission_timer])
-
-            prev = row
-
-    def runTimeless(self, world, start, end, ffwdTo=0, prune_threshold=None, permissive=False):
-        """
-        Run actions and flag resetting events in the order they're given. No notion of timestamps
-        """
-        self.logger.debug(self.actions[start])
-        for t in range(start, end):
-            actOrEvFlag, actEv, stamp, duration, attempt, mission_timer = self.actions[t]
-
-            if t == 0:
-                if actOrEvFlag == SET_FLG:
-                    varName = actEv[0]
-                    varValue = actEv[1]
-                    world.setState(self.human, varName, varValue)
-                    world.agents[self.human].setBelief(stateKey(self.human, varName), varValue)
-                else:
-                    # This first action can be an actual action or an initial location
-                    if type(actEv) == ActionSet:
-                        world.step(actEv)
-                    else:
-                        # TODO put this back
-                        # world.setState(self.human, 'loc', actEv[0], recurse=True)
-                        # world.setState(self.human, 'locvisits_' + actEv[0], 1, recurse=True)
-                        world.setState(self.human, 'loc', actEv[0])
-                        world.agents[self.human].setBelief(stateKey(self.human, 'loc'), actEv[0])
-                        world.setState(self.human, 'locvisits_' + actEv[0], 1)
-                        world.agents[self.human].setBelief(stateKey(self.human, 'locvisits_' + actEv[0]), 1)
-                continue
+                self.actions.append(MOVE, mact, duration if i == 0 else 0, seconds[ir], offset + ir, self.attemptID)
+            for act in triageActs:
+                self.actions.append(TRIAGE, act, duration, seconds[ir], offset + ir, self.attemptID)
 
-            # manually sync the time feature with the game's time (invert timer)
-            world.setFeature(stateKey(WORLD, 'seconds'), MAX_MISSION_TIMER - mission_timer, recurse=True)
-
-            if self.processor is not None:
-                self.processor.pre_step(world)
-
-            act = None
-            self.logger.info('%d) Running: %s' % (t, ','.join(map(str, actEv))))
-            if t >= ffwdTo:
-                input('press any key.. ')
-            if actOrEvFlag == ACTION:
-                act = actEv[0]
-                for model in world.getModel(self.human).domain():
-                    if act not in world.agents[self.human].getLegalActions(
-                            world.agents[self.human].models[model]['beliefs']):
-                        logging.warning('Action {} not believed to be legal under model {}'.format(act, model))
-                legal_choices = world.agents[self.human].getLegalActions()
-                if act not in legal_choices:
-                    raise ValueError('Illegal action ({}) at time {}. Legal choices: {}'.format(
-                        act, t, ', '.join(sorted(map(str, legal_choices)))))
-                selDict = {}
-                if len(actEv) > 1:
-                    dur = actEv[1]
-                    # This is a triage action with an associated duration
-                    clock = stateKey(WORLD, 'seconds')
-                    curTime = world.getState(WORLD, 'seconds', unique=True)
-                    newTime = curTime + dur
-                    selDict[clock] = newTime
-                    self.logger.debug('Time now %d triage until %d' % (curTime, newTime))
-                self.logger.info('Action: {}'.format(','.join(map(str, sorted(selDict.keys())))))
-                world.step(act, select=selDict, threshold=prune_threshold)
-                world.modelGC()
-
-            elif actOrEvFlag == SET_FLG:
-                [var, val] = actEv
-                key = stateKey(self.human, var)
-                world.state[key] = world.value2float(key, val)
-                for model in world.getModel(self.human).domain():
-                    if val not in world.getFeature(key, world.agents[self.human].models[model]['beliefs']).domain():
-                        raise ValueError('Unbelievable data point at time %s: %s=%s' % (stamp, var, val))
-                    world.agents[self.human].models[model]['beliefs'][key] = world.value2float(key, val)
-                self.logger.info('Set: {}'.format(key))
-
-            self.summarizeState(world)
-            if self.processor is not None:
-                self.processor.post_step(world, None if act is None else world.getAction(self.human))
-
-    def summarizeState(self, world):
-        self.logger.info('_____________________________________')
-        loc = world.getState(self.human, 'loc', unique=True)
-        time = world.getState(WORLD, 'seconds', unique=True)
-        self.logger.info('Time: %d (%s)' % (time, world.getState(WORLD, 'phase', unique=True)))
-
-        self.logger.info('Player location: %s' % (loc))
-        clrs = ['Green', 'Gold', 'Red', 'White']
-        for clr in clrs:
-            self.logger.debug('%s count: %s' % (clr, world.getState(WORLD, 'ctr_' + loc + '_' + clr, unique=True)))
-        self.logger.info('Visits: %d' % (world.getState(self.human, 'locvisits_' + loc, unique=True)))
-        self.logger.info('JustSavedGr: %s' % (world.getState(self.human, 'numsaved_Green', unique=True)))
-        self.logger.info('JustSavedGd: %s' % (world.getState(self.human, 'numsaved_Gold', unique=True)))
+            # Rows in between edges repeat the current one, so skip to the next edge
+            self.prevTip = tips[ir]
+            self.prevResult = results[ir]
+            ir = edges[np.searchsorted(edges, ir, side='right')]
+        return True
 
     def player_name(self):
         """
         :return: the name of the human player in this log file
         :rtype: str
         """
+        if self.data is None:
+            if self.human is None:
+                self.human = next(str(data['player_ID'].iloc[0]) for data in self.readChunks() if len(data) > 0)
+            return self.human
         return self.data['player_ID'].iloc[0]
 
 
 def printAEs(aes, logger=logging):
     for ae in aes:
-        logger.info('%s %s' % (ae[2], ae[1]))
+        logger.info('%s %s' % (ae.seconds, ae.payload))
@@ -0,0 +1,152 @@
+"""
+Contains the (typed) representation of the events extracted from game logs, shared by all the log parsers.
+"""
+import array
+import numpy as np
+
+# event types
+LOCATION = 0  # sets the player's location, payload is the location's name
+MOVE = 1  # move action, payload is the action
+TRIAGE = 2  # triage action, payload is the action and duration is injected into the mission clock
+FEATURE = 3  # sets a feature of the player, payload is a (feature, value) tuple
+EVENT_TYPES = ['location', 'move', 'triage', 'feature']
+
+MAX_MISSION_TIMER = 10 * 60  # max num seconds in game's timer
+
+
+def timer_to_seconds(minutes, seconds):
+    """
+    Converts the game's (countdown) mission timer into the number of seconds since the start of the mission.
+    :param int minutes: the minutes left in the mission timer.
+    :param int seconds: the seconds left in the mission timer.
+    :rtype: int
+    :return: the mission time in seconds.
+    """
+    return MAX_MISSION_TIMER - minutes * 60 - seconds
+
+
+class Event(object):
+    """
+    A single event of an event sequence.
+    """
+    __slots__ = ['type', 'payload', 'duration', 'seconds', 'index', 'attempt']
+
+    def __init__(self, event_type, payload, duration=0., seconds=np.nan, index=-1, attempt=0):
+        """
+        Creates a new event.
+        :param int event_type: the type of event, one of `LOCATION`, `MOVE`, `TRIAGE` or `FEATURE`.
+        :param payload: the event's data, dependent on the type of event.
+        :param float duration: the duration of the event in seconds.
+        :param float seconds: the mission time at which the event occurred (`nan` if unknown).
+        :param int index: the index of the entry in the game log that originated this event.
+        :param int attempt: the index of the triage attempt during which the event occurred.
+        """
+        self.type = event_type
+        self.payload = payload
+        self.duration = duration
+        self.seconds = seconds
+        self.index = index
+        self.attempt = attempt
+
+    def __repr__(self):
+        return '{}: {} ({}s at {}s)'.format(EVENT_TYPES[self.type], self.payload, self.duration, self.seconds)
+
+
+class EventSequence(object):
+    """
+    An array-backed sequence of events, where each event attribute is stored in its own typed array.
+    """
+    __slots__ = ['types', 'payloads', 'durations', 'seconds', 'indices', 'attempts']
+
+    def __init__(self):
+        self.types = array.array('b')
+        self.payloads = []
+        self.durations = array.array('d')
+        self.seconds = array.array('d')
+        self.indices = array.array('q')
+        self.attempts = array.array('q')
+
+    def append(self, event_type, payload, duration=0., seconds=np.nan, index=-1, attempt=0):
+        """
+        Adds a new event to the end of this sequence. See `Event` for a description of the parameters.
+        """
+        self.types.append(event_type)
+        self.payloads.append(payload)
+        self.durations.append(duration)
+        self.seconds.append(seconds)
+        self.indices.append(index)
+        self.attempts.append(attempt)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            events = EventSequence()
+            for attr in EventSequence.__slots__:
+                setattr(events, attr, getattr(self, attr)[item])
+            return events
+        return Event(self.types[item], self.payloads[item], self.durations[item], self.seconds[item],
+                     self.indices[item], self.attempts[item])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, indices):
+        """
+        Gets the events at the given indices.
+        :param list[int] indices: the indices of the events to be retrieved.
+        :rtype: EventSequence
+        :return: a new sequence with the selected events.
+        """
+        events = EventSequence()
+        for attr in EventSequence.__slots__:
+            values = getattr(self, attr)
+            selected = [values[i] for i in indices]
+            setattr(events, attr, selected if isinstance(values, list) else array.array(values.typecode, selected))
+        return events
+
+    def time_slice(self, start=None, end=None):
+        """
+        Gets the events that occurred in the given mission time interval.
+        :param float start: the mission time (seconds) from which to select events, inclusive.
+        :param float end: the mission time (seconds) until which to select events, exclusive.
+        :rtype: EventSequence
+        :return: a new sequence with the selected events.
+        """
+        seconds = np.frombuffer(self.seconds, dtype=np.float64)
+        mask = np.ones(len(seconds), dtype=bool)
+        if start is not None:
+            mask &= seconds >= start
+        if end is not None:
+            mask &= seconds < end
+        return self.take(np.flatnonzero(mask))
+
+    def serialize(self):
+        """
+        Gets a compact representation of this sequence, where actions are replaced by their labels.
+        :rtype: dict
+        :return: a dictionary containing the raw arrays and payloads of the events.
+        """
+        data = {attr: getattr(self, attr).tobytes() for attr in EventSequence.__slots__ if attr != 'payloads'}
+        data['payloads'] = [str(payload) if event_type in {MOVE, TRIAGE} else payload
+                            for event_type, payload in zip(self.types, self.payloads)]
+        return data
+
+    @staticmethod
+    def deserialize(data, actions):
+        """
+        Creates an event sequence from its serialized representation.
+        :param dict data: the dictionary produced by `serialize`.
+        :param dict[str, ActionSet] actions: the actions, indexed by label, used to resolve action events.
+        :rtype: EventSequence
+        :return: the event sequence.
+        """
+        events = EventSequence()
+        for attr in EventSequence.__slots__:
+            if attr != 'payloads':
+                getattr(events, attr).frombytes(data[attr])
+        events.payloads = [actions[payload] if event_type in {MOVE, TRIAGE} else payload
+                           for event_type, payload in zip(events.types, data['payloads'])]
+        return events
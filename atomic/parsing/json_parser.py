@@ -7,23 +7,19 @@ Created on Thu Apr  2 20:35:23 2020
 """
 import logging
 import json
-from psychsim.pwl import stateKey
-from psychsim.world import WORLD
 from atomic.parsing import GameLogParser
+from atomic.parsing.events import LOCATION, MOVE, TRIAGE, timer_to_seconds
 from atomic.parsing.pilot2_message_reader import getMessages
 
-MOVE = 0
-TRIAGE = 1
-
 
 class ProcessParsedJson(GameLogParser):
 
     def __init__(self, filename, map_data, processor=None, logger=logging):
         super().__init__(filename, processor, logger)
         self.lastParsedLoc = None
-        self.actions = []
         self.locations = set()
         self.triageStartTime = 0
+        self.triageAttempt = 0
         if len(filename) > 0:
             inputFiles = {
                 '--msgfile': filename,
@@ -60,7 +56,7 @@ class ProcessParsedJson(GameLogParser):
 
     def parseTriageStart(self, vicColor, ts):
         self.logger.debug('triage started of %s at %s' % (vicColor, ts))
-        self.triageStartTime = ts
+        self.triageStartTime = timer_to_seconds(*ts)
 
     def parseTriageEnd(self, vicColor, isSuccessful, msgIdx, ts):
         self.logger.debug('triage ended of %s at %s' % (vicColor, ts))
@@ -81,12 +77,17 @@ class ProcessParsedJson(GameLogParser):
 
         triageAct = self.victimsObj.getTriageAction(self.human, vicColor)
         ## Record it as happening at self.triageStartTime
-        self.actions.append([TRIAGE, [triageAct, duration], msgIdx, self.triageStartTime])
+        self.actions.append(TRIAGE, triageAct, duration, self.triageStartTime, msgIdx, self.triageAttempt)
+        self.triageAttempt = self.triageAttempt + 1
 
     def parseMove(self, newRoom, msgIdx, ts):
+        newRoom = self.world_map.getMapLocation(newRoom)
         self.locations.add(newRoom)
+        if newRoom == self.lastParsedLoc:
+            # moved within the same region of the map
+            return 0
         if self.lastParsedLoc == None:
-            self.actions.append(newRoom)
+            self.actions.append(LOCATION, newRoom, 0, timer_to_seconds(*ts), msgIdx, self.triageAttempt)
             self.lastParsedLoc = newRoom
             self.logger.debug('moved to %s at %s' % (self.lastParsedLoc, ts))
             return 0
@@ -99,9 +100,9 @@ class ProcessParsedJson(GameLogParser):
             return 1
 
         if len(mv) > 1:
-            self.logger.error('multiple steps from %s to %s at %s' % (self.lastParsedLoc, newRoom, ts))
+            self.logger.debug('multiple steps from %s to %s at %s' % (self.lastParsedLoc, newRoom, ts))
         for mAct in mv:
-            self.actions.append([MOVE, [mAct], msgIdx, ts])
+            self.actions.append(MOVE, mAct, 0, timer_to_seconds(*ts), msgIdx, self.triageAttempt)
         self.logger.debug('moved to %s at %s' % (newRoom, ts))
         self.lastParsedLoc = newRoom
         return 0
@@ -141,7 +142,7 @@ class ProcessParsedJson(GameLogParser):
                 vicColor = m['color']
                 if vicColor == 'Yellow':
                     vicColor = 'Gold'
-                if m['room_name'] != self.lastParsedLoc:
+                if self.world_map.getMapLocation(m['room_name']) != self.lastParsedLoc:
                     self.logger.error(
                         'Msg %d Triaging in %s but I am in %s' % (numMsgs, m['room_name'], self.lastParsedLoc))
 
@@ -166,82 +167,6 @@ class ProcessParsedJson(GameLogParser):
             numMsgs = numMsgs + 1
         self.locations = list(self.locations)
 
-    ###############################################
-    #######  Running the actions we collected
-    ###############################################
-
-    def runTimeless(self, world, start, end, ffwdTo=0, prune_threshold=None, permissive=False):
-        self.logger.debug(self.actions[start])
-        if start == 0:
-            loc = self.actions[0]
-            world.setState(self.human, 'loc', loc)
-            world.agents[self.human].setBelief(stateKey(self.human, 'loc'), loc)
-            world.setState(self.human, 'locvisits_' + loc, 1)
-            world.agents[self.human].setBelief(stateKey(self.human, 'locvisits_' + loc), 1)
-            start = 1
-
-        t = start
-        while True:
-            if (t >= end) or (t >= len(self.actions)):
-                break
-
-            actStruct = self.actions[t]
-            actType = actStruct[0]
-            act = actStruct[1][0]
-            testbedMsgId = actStruct[-2]
-            trueTime = actStruct[-1]
-            timeInSec = 600 - (trueTime[0] * 60) - trueTime[1]
-
-            self.logger.info('%d) Running msg %d: %s' % (t + start, testbedMsgId, ','.join(map(str, actStruct[1]))))
-
-            # before any action, manually sync the time feature with the game's time (invert timer)
-            world.setFeature(stateKey(WORLD, 'seconds'), timeInSec, recurse=True)
-
-            if self.processor is not None:
-                self.processor.pre_step(world)
-            selDict = dict()
-            if act not in world.agents[self.human].getLegalActions():
-                self.logger.error('Illegal %s' % (act))
-                raise ValueError('Illegal action!')
-
-            if actType == MOVE:
-                pass
-
-            if actType == TRIAGE:
-                dur = actStruct[1][1]
-                clock = stateKey(WORLD, 'seconds')
-                curTime = world.getState(WORLD, 'seconds', unique=True)
-                newTime = curTime + dur
-                selDict[clock] = newTime
-                self.logger.debug('Time now %d triage until %d' % (curTime, newTime))
-
-            t = t + 1
-            self.logger.info('Injecting %s' % (selDict))
-            # selDict = {k: world.value2float(k, v) for k, v in selDict.items()}
-            world.step(act, select=selDict, threshold=prune_threshold)
-            world.modelGC()
-
-            self.summarizeState(world, trueTime)
-            if self.processor is not None:
-                self.processor.post_step(world, None if act is None else world.getAction(self.human))
-
-            if t + start - 1 > ffwdTo:
-                input('press any key.. ')
-
-    def summarizeState(self, world, ttime):
-        loc = world.getState(self.human, 'loc', unique=True)
-        time = 600 - world.getState(WORLD, 'seconds', unique=True)
-        self.logger.info('psim Time: %s' % ([int(time / 60), time % 60]))
-        self.logger.info('True Time: %s' % (ttime))
-        self.logger.info('Phase: %s' % (world.getState(WORLD, 'phase', unique=True)))
-
-        self.logger.info('Player location: %s' % (loc))
-        clrs = ['Green', 'Gold', 'White']
-        for clr in clrs:
-            self.logger.debug('%s count: %s' % (clr, world.getState(WORLD, 'ctr_' + loc + '_' + clr, unique=True)))
-        self.logger.info('Visits: %d' % (world.getState(self.human, 'locvisits_' + loc, unique=True)))
-        self.logger.info('JustSavedGr: %s' % (world.getState(self.human, 'numsaved_Green', unique=True)))
-        self.logger.info('JustSavedGd: %s' % (world.getState(self.human, 'numsaved_Gold', unique=True)))
 
 # f = open('/home/mostafh/Documents/psim/new_atomic/atomic/data/tryj', 'rt')
 # lines = f.readlines()
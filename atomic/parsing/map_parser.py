@@ -1,13 +1,23 @@
 import argparse
 import csv
-
-from psychsim.action import ActionSet
+import json
+import logging
+import re
+from collections import Counter, OrderedDict
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from atomic.definitions import Directions
 from atomic.definitions.map_utils import getSandRMap
-from atomic.parsing.replayer import accumulate_files, Replayer
-from atomic.parsing.parser import ACTION
+from atomic.parsing.replayer import accumulate_files
+
+ROOM_PART_RE = re.compile(r'^(.+)_\d+$')  # room parts in the rooms file are named <room>_<index>
+ROOM_PART_TYPES = {'hallway', 'hallway_part', 'bathroom_part', 'room_part'}
+DOOR_TOLERANCE = 1  # max gap, in blocks, between a door and the room parts it connects
+
 
 def verify_adjacency(fname, adjacency_matrix):
-    errors = set()
+    errors = Counter()
     with open(fname, 'r') as csvfile:
         reader = csv.DictReader(csvfile)
         last_room = None
@@ -18,11 +28,37 @@ def verify_adjacency(fname, adjacency_matrix):
                     last_room = row['Room_in']
                 elif row['Room_in'] != last_room:
                     # Player has moved
-                    if row['Room_in'] not in adjacency_matrix[last_room].values():
-                        errors.add((last_room, row['Room_in']))
+                    if last_room not in adjacency_matrix or \
+                            row['Room_in'] not in adjacency_matrix[last_room].values():
+                        errors[(last_room, row['Room_in'])] += 1
                     last_room = row['Room_in']
     return errors
 
+
+def _verify_log(args):
+    fname, adjacency_matrix = args
+    return fname, verify_adjacency(fname, adjacency_matrix)
+
+
+def verify_logs(files, adjacency_matrix, processes=None):
+    """
+    Verifies the given adjacency against the room transitions of the players in the given log files, in parallel.
+    :param list[str] files: the (processed CSV) log files.
+    :param dict[str, dict[Directions, str]] adjacency_matrix: the adjacency to be verified.
+    :param int processes: number of processes to use. `None` indicates all cores available.
+    :rtype: tuple[Counter, Counter]
+    :return: a tuple with the number of times each transition not in the adjacency was observed, and the number of
+    log files in which it was observed.
+    """
+    transitions = Counter()
+    logs = Counter()
+    with Pool(processes) as pool:
+        for fname, errors in pool.imap_unordered(_verify_log, [(fname, adjacency_matrix) for fname in files]):
+            transitions.update(errors)
+            logs.update(errors.keys())
+    return transitions, logs
+
+
 def extract_adjacency(fname, adjacency=None):
     if adjacency is None:
         adjacency = {}
@@ -60,11 +96,181 @@ def extract_adjacency(fname, adjacency=None):
                     last_room['x'] = row['x']
                     last_room['z'] = row['z']
 
+def load_map_geometry(rooms_file=None, doors_file=None, semantic_map=None):
+    """
+    Loads the rectangles of the room parts and doors of a map, either from the rooms and doors CSV files, or from the
+    semantic map (JSON) file.
+    :param str rooms_file: the CSV file with the room parts, as `RoomID,x0,z0,x1,z1`.
+    :param str doors_file: the CSV file with the doors, as `Index,x0,z0,x1,z1,Room0,Room1`.
+    :param str semantic_map: the semantic map JSON file, used instead of the CSV files if given.
+    :rtype: tuple[pd.DataFrame, pd.DataFrame]
+    :return: a tuple with the room parts, with the room of each part, and the doors, with the room parts each door
+    connects, as tables with the rectangle coordinates. Rooms that are not divided are their own single part.
+    """
+    if semantic_map is not None:
+        with open(semantic_map, 'r') as jsonfile:
+            data = json.load(jsonfile)
+        parents = {child: loc['id'] for loc in data['locations'] for child in loc.get('child_locations', [])}
+        parts = [[loc['id'], parents.get(loc['id'], loc['id'])] +
+                 [c[axis] for c in loc['bounds']['coordinates'][:2] for axis in ['x', 'z']]
+                 for loc in data['locations'] if 'bounds' in loc and
+                 (loc['type'] in ROOM_PART_TYPES or (loc['type'] == 'room' and 'child_locations' not in loc))]
+        doors = [[door['id']] + [c[axis] for c in door['bounds']['coordinates'][:2] for axis in ['x', 'z']] +
+                 [door['connected_locations']] for door in data['connections']]
+        parts = pd.DataFrame(parts, columns=['part', 'room', 'x0', 'z0', 'x1', 'z1'])
+        doors = pd.DataFrame(doors, columns=['door', 'x0', 'z0', 'x1', 'z1', 'parts'])
+    else:
+        parts = pd.read_csv(rooms_file, skipinitialspace=True).rename(columns={'RoomID': 'part'})
+        parts['room'] = [ROOM_PART_RE.sub(r'\1', part) for part in parts['part']]
+        doors = pd.read_csv(doors_file, skipinitialspace=True).rename(columns={'Index': 'door'})
+        doors['parts'] = [[room0, room1] for room0, room1 in zip(doors['Room0'], doors['Room1'])]
+
+    # connected locations may be room parts or whole rooms, the latter standing for any of their parts
+    roomParts = {}
+    for part, room in zip(parts['part'], parts['room']):
+        roomParts.setdefault(room, set()).add(part)
+    doors['parts'] = [sorted(set().union(*[{loc} if loc not in roomParts or loc in roomParts[loc] else roomParts[loc]
+                                           for loc in locs])) for locs in doors['parts']]
+    return parts, doors
+
+
+def load_location_map(fname):
+    """
+    Loads the mapping from the room parts of a map's geometry to the locations of its adjacency, log and victim files.
+    :param str fname: the CSV file with the mapping, as `Part,Location`.
+    :rtype: dict[str, str]
+    :return: the location of each room part. Parts not in the dictionary are locations of their own.
+    """
+    with open(fname, 'r') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)
+        return {row[0].strip(): row[1].strip() for row in reader if len(row) >= 2}
+
+
+def derive_adjacency(parts, doors, location_map=None, logger=logging):
+    """
+    Derives a direction-labelled adjacency between locations by spatially joining the room parts and the doors of a
+    map. Two locations are neighbors if a door connecting them touches a part of each, and the direction from one
+    location to the other is given by the side of the room part on which the door lies (north is towards negative z,
+    as in Minecraft).
+    This is a diagnostic, to be compared against a map's hand-maintained adjacency with `compare_adjacency`, rather than
+    a replacement for it: a room part is never split, so a corridor that is a single part in the geometry but several
+    segments in the adjacency file, with several doors on the same side, cannot be reproduced (the clashing doors are
+    logged as warnings). For the Saturn map, the derived and hand-maintained adjacencies share almost no locations.
+    :param pd.DataFrame parts: the room parts, as given by `load_map_geometry`.
+    :param pd.DataFrame doors: the doors, as given by `load_map_geometry`.
+    :param dict[str, str] location_map: the location of each room part, i.e., the units of the map's adjacency, log
+    and victim files, e.g., as given by `load_location_map`. Parts not in the dictionary are locations of their own,
+    and parts mapped to the same location are merged.
+    :param logger: the logger handler.
+    :rtype: OrderedDict[str, dict[Directions, str]]
+    :return: a dictionary with the neighbor in each direction of each location, in the format of `getSandRMap`.
+    """
+    partRects = parts[['x0', 'z0', 'x1', 'z1']].to_numpy(dtype=float)
+    partRects = np.concatenate([np.minimum(partRects[:, :2], partRects[:, 2:]),
+                                np.maximum(partRects[:, :2], partRects[:, 2:])], axis=1)
+    doorRects = doors[['x0', 'z0', 'x1', 'z1']].to_numpy(dtype=float)
+    doorRects = np.concatenate([np.minimum(doorRects[:, :2], doorRects[:, 2:]),
+                                np.maximum(doorRects[:, :2], doorRects[:, 2:])], axis=1)
+
+    # spatial join: which parts each door touches (doors x parts)
+    touches = np.all(doorRects[:, np.newaxis, :2] <= partRects[np.newaxis, :, 2:] + DOOR_TOLERANCE, axis=2) & \
+              np.all(doorRects[:, np.newaxis, 2:] >= partRects[np.newaxis, :, :2] - DOOR_TOLERANCE, axis=2)
+
+    # side of each part on which each door lies, from the door center relative to the part center and size
+    doorCenters = (doorRects[:, :2] + doorRects[:, 2:]) / 2
+    partCenters = (partRects[:, :2] + partRects[:, 2:]) / 2
+    partSizes = (partRects[:, 2:] - partRects[:, :2]) / 2 + DOOR_TOLERANCE
+    offsets = (doorCenters[:, np.newaxis] - partCenters[np.newaxis]) / partSizes[np.newaxis]
+
+    if location_map is None:
+        location_map = {}
+    partNames = parts['part'].to_numpy(dtype=object)
+    locations = np.array([location_map.get(part, part) for part in partNames], dtype=object)
+    adjacency = OrderedDict((loc, {}) for loc in dict.fromkeys(locations))
+    for d, door in enumerate(doors['door']):
+        doorParts = set(doors['parts'].iloc[d])
+        doorLocs = {location_map.get(part, part) for part in doorParts}
+        if len(doorLocs) < 2:
+            continue  # connects parts of the same location
+        touched = [p for p in np.flatnonzero(touches[d]) if partNames[p] in doorParts]
+        if {locations[p] for p in touched} != doorLocs:
+            logger.warning('Door {} does not touch all the locations it connects: {}'.format(door, sorted(doorLocs)))
+        for p in touched:
+            dx, dz = offsets[d, p]
+            if abs(dx) >= abs(dz):
+                direction = Directions.E if dx > 0 else Directions.W
+            else:
+                direction = Directions.S if dz > 0 else Directions.N
+            loc = locations[p]
+            for neighbor in sorted(doorLocs - {loc}):
+                if direction not in adjacency[loc]:
+                    adjacency[loc][direction] = neighbor
+                elif adjacency[loc][direction] != neighbor:
+                    logger.warning('Door {} leads {} from {} to {}, but {} is already in that direction'.format(
+                        door, direction.name, loc, neighbor, adjacency[loc][direction]))
+    return adjacency
+
+
+def compare_adjacency(adjacency, reference):
+    """
+    Compares a (derived) adjacency against a reference one, e.g., the hand-maintained adjacency file of the map.
+    :param dict[str, dict[Directions, str]] adjacency: the adjacency to be checked.
+    :param dict[str, dict[Directions, str]] reference: the reference adjacency.
+    :rtype: tuple[list[str], list[str], list[tuple[str, Directions, str, str]]]
+    :return: a tuple with the locations only in the adjacency, the locations only in the reference, and the
+    `(location, direction, neighbor, reference_neighbor)` connections of the locations in both that differ, with `None`
+    for a missing neighbor.
+    """
+    extra = sorted(set(adjacency) - set(reference))
+    missing = sorted(set(reference) - set(adjacency))
+    differences = []
+    for loc in adjacency:
+        if loc not in reference:
+            continue
+        for direction in Directions:
+            neighbor = adjacency[loc].get(direction)
+            ref_neighbor = reference[loc].get(direction)
+            if neighbor != ref_neighbor:
+                differences.append((loc, direction, neighbor, ref_neighbor))
+    return extra, missing, differences
+
+
+def write_adjacency(adjacency, fname):
+    """
+    Writes the given adjacency to a CSV file, in the format read by `getSandRMap`.
+    :param dict[str, dict[Directions, str]] adjacency: the neighbor in each direction of each location.
+    :param str fname: the path to the CSV file.
+    """
+    directions = [Directions.N, Directions.S, Directions.E, Directions.W]
+    with open(fname, 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Room'] + [d.name for d in directions])
+        for loc, neighbors in adjacency.items():
+            writer.writerow([loc] + [neighbors.get(d, '') for d in directions])
+
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument('adjacency_file', nargs=1, help='Adjacency file to use')
-    parser.add_argument('fname', nargs='+', help='Log file(s) (or directory of CSV files) to process')
+    parser = argparse.ArgumentParser(
+        description='Creates or verifies a map\'s adjacency from log files. With -g or -j, derives an adjacency from '
+                    'the map\'s geometry and reports how it differs from the given adjacency file, as a diagnostic: '
+                    'the derived adjacency does not split room parts, e.g., corridors, into segments, so it does not '
+                    'replace the hand-maintained adjacency file.')
+    parser.add_argument('adjacency_file', nargs=1,
+                        help='Adjacency file to use (with -g or -j, the reference against which to compare)')
+    parser.add_argument('fname', nargs='*', help='Log file(s) (or directory of CSV files) to process')
     parser.add_argument('-c', '--create', action='store_true', help='Create adjacency matrix from scratch')
+    parser.add_argument('-g', '--geometry', nargs=2, metavar=('ROOMS', 'DOORS'),
+                        help='Derive adjacency matrix from the rooms and doors CSV files and compare it to the '
+                             'adjacency file')
+    parser.add_argument('-j', '--json',
+                        help='Derive adjacency matrix from the semantic map JSON file and compare it to the adjacency '
+                             'file')
+    parser.add_argument('-m', '--location-map',
+                        help='CSV file mapping the room parts of the geometry to the locations of the adjacency matrix')
+    parser.add_argument('-o', '--output', help='CSV file to which to write the derived adjacency, for inspection')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='Number of processes to use when verifying. If unspecified, all cores are used')
     args = vars(parser.parse_args())
 
     if args['create']:
@@ -74,8 +280,30 @@ if __name__ == '__main__':
         for start, end_set in adjacency.items():
             print(start, sorted(end_set))
     else:
-        adjacency_matrix = getSandRMap(fname=args['adjacency_file'][0])
-        errors = set()
-        for fname in accumulate_files(args['fname']):
-            errors |= verify_adjacency(fname, adjacency_matrix)
-        print(sorted(errors))
+        if args['geometry'] is not None or args['json'] is not None:
+            rooms_file, doors_file = args['geometry'] if args['geometry'] is not None else (None, None)
+            location_map = load_location_map(args['location_map']) if args['location_map'] is not None else None
+            adjacency_matrix = derive_adjacency(*load_map_geometry(rooms_file, doors_file, args['json']), location_map)
+            if args['output'] is not None:
+                write_adjacency(adjacency_matrix, args['output'])
+                print('Wrote adjacency of {} locations to {}'.format(len(adjacency_matrix), args['output']))
+            reference_file = args['adjacency_file'][0]
+            reference = getSandRMap(fname=reference_file)
+            extra, missing, differences = compare_adjacency(adjacency_matrix, reference)
+            print('{} of {} locations in {}, {} not in it, {} of its locations missing'.format(
+                len(adjacency_matrix) - len(extra), len(adjacency_matrix), reference_file, len(extra),
+                len(missing)))
+            if len(extra) > 0:
+                print('Not in reference: {}'.format(', '.join(extra)))
+            if len(missing) > 0:
+                print('Missing: {}'.format(', '.join(missing)))
+            for loc, direction, neighbor, ref_neighbor in differences:
+                print('{} {}: {} (reference: {})'.format(loc, direction.name, neighbor, ref_neighbor))
+        else:
+            adjacency_matrix = getSandRMap(fname=args['adjacency_file'][0])
+        files = accumulate_files(args['fname'])
+        if len(files) > 0:
+            transitions, logs = verify_logs(files, adjacency_matrix, args['processes'])
+            for (start, end), count in transitions.most_common():
+                print('{} -> {}: {} transitions in {} of {} logs'.format(start, end, count, logs[(start, end)],
+                                                                         len(files)))
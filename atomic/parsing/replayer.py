@@ -1,19 +1,38 @@
+import hashlib
 import itertools
 import logging
 import os.path
+import pickle
 import traceback
-from atomic.definitions.map_utils import get_default_maps
+import atomic.definitions.victims
+import atomic.definitions.world_map
+import atomic.parsing
+import atomic.parsing.csv_parser
+import atomic.parsing.events
+import atomic.parsing.json_parser
+import atomic.parsing.message_reader
+import atomic.parsing.pilot2_message_reader
+from atomic.definitions.map_utils import get_default_maps, get_file_hash
 from atomic.inference import set_player_models, DEFAULT_MODELS, DEFAULT_IGNORE
-from atomic.parsing import ParsingProcessor
+from atomic.parsing import GameLogParser, ParsingProcessor
+from atomic.parsing.events import EventSequence
 from atomic.parsing.csv_parser import ProcessCSV
 from atomic.parsing.json_parser import ProcessParsedJson
-from atomic.scenarios.single_player import make_single_player_world
+from atomic.scenarios.single_player import get_single_player_world
 
 COND_MAP_TAG = 'CondWin'
 COND_TRAIN_TAG = 'CondBtwn'
 SUBJECT_ID_TAG = 'Member'
 TRIAL_TAG = 'Trial'
 
+BUNDLE_FORMAT = 1  # to be incremented whenever the format of the stored bundles changes
+
+# modules whose code extracts the events, such that stored bundles are recreated whenever it changes
+BUNDLE_SOURCE_FILES = [atomic.parsing.__file__, atomic.parsing.events.__file__, atomic.parsing.csv_parser.__file__,
+                       atomic.parsing.json_parser.__file__, atomic.parsing.message_reader.__file__,
+                       atomic.parsing.pilot2_message_reader.__file__, atomic.definitions.world_map.__file__,
+                       atomic.definitions.victims.__file__]
+
 
 def accumulate_files(files):
     """
@@ -41,11 +60,20 @@ class Replayer(object):
     """
 
     def __init__(self, files=[], maps=None, models=None, ignore_models=None, create_observer=True,
-                 processor=None, logger=logging):
+                 processor=None, logger=logging, chunksize=None, cache_dir=None, use_regions=False,
+                 compact_visits=False, scheduled_expiry=False, triage_lookahead=None, fast_legality=False):
         # Extract files to process
         self.files = accumulate_files(files)
         self.create_observer = create_observer
         self.processor = processor
+        self.chunksize = chunksize  # if not None, processed CSV logs are streamed in chunks of this many rows
+        self.cache_dir = cache_dir  # if not None, compiled maps, parsed logs and built worlds are stored here
+        self.use_regions = use_regions  # whether to model the map's regions rather than its locations
+        self.compact_visits = compact_visits  # whether to pack the player's visited locations in a few features
+        # (lossy: visits are not counted, only whether each location was left before, see `WorldMap`)
+        self.scheduled_expiry = scheduled_expiry  # whether victims expire once rather than via per-step dynamics
+        self.triage_lookahead = triage_lookahead  # how triage durations are projected in the player models' lookahead
+        self.fast_legality = fast_legality  # whether to check the legality of each logged action only
         self.logger = logger
 
         # information for each log file # TODO maybe encapsulate in an object and send as arg in post_replay()?
@@ -60,7 +88,7 @@ class Replayer(object):
         self.file_name = None
 
         # Extract maps
-        self.maps = get_default_maps(logger) if maps is None else maps
+        self.maps = get_default_maps(logger, cache_dir) if maps is None else maps
 
         # Set player models for observer agent
         if models is None:
@@ -116,12 +144,18 @@ class Replayer(object):
                 # could not determine map
                 continue
 
-            # Parse events from log file
+            # Parse events from log file, or get them from a previously stored bundle
             logger_name = type(self.processor).__name__ if self.processor is not None else ''
+            bundle_file = self.get_bundle_file(fname)
+            bundle = self.load_bundle(bundle_file, logger)
             _, ext = os.path.splitext(fname)
             ext = ext.lower()
-            if ext == '.csv' or ext == '.xlsx':
-                self.parser = ProcessCSV(fname, self.processor, logger.getChild(logger_name))
+            if bundle is not None:
+                self.parser = GameLogParser(fname, self.processor, logger.getChild(logger_name))
+                self.parser.human = bundle['player']
+                self.parser.locations = bundle['locations']
+            elif ext == '.csv' or ext == '.xlsx':
+                self.parser = ProcessCSV(fname, self.processor, logger.getChild(logger_name), self.chunksize)
             elif ext == '.metadata':
                 self.parser = ProcessParsedJson(
                     fname, self.map_table, self.processor, logger.getChild(logger_name))
@@ -138,7 +172,13 @@ class Replayer(object):
 
             # Replay actions from log file
             try:
-                self.parser.getActionsAndEvents(self.victims, self.world_map)
+                if bundle is not None:
+                    actions = {str(action): action
+                               for agent in self.world.agents.values() for action in agent.actions}
+                    self.parser.actions = EventSequence.deserialize(bundle['events'], actions)
+                else:
+                    self.parser.getActionsAndEvents(self.victims, self.world_map)
+                    self.save_bundle(bundle_file, logger)
             except:
                 logger.error(traceback.format_exc())
                 logger.error('Unable to extract actions/events')
@@ -151,14 +191,72 @@ class Replayer(object):
             self.post_replay()
             self.world_map.clear()
 
+    def get_bundle_file(self, fname):
+        """
+        Gets the path to the replay-ready bundle of the given log file, which is keyed by a digest of the contents of
+        the file, the version of the current map, and the code extracting and serializing the events.
+        :param str fname: the name of the log file.
+        :rtype: str
+        :return: the path to the bundle file, or `None` if bundles are not being cached.
+        """
+        if self.cache_dir is None:
+            return None
+        key = repr((BUNDLE_FORMAT, get_file_hash(fname), self.map_table.version, self.use_regions,
+                    get_file_hash(*BUNDLE_SOURCE_FILES)))
+        return os.path.join(self.cache_dir, '{}-{}.pkl'.format(os.path.splitext(os.path.basename(fname))[0],
+                                                               hashlib.sha1(key.encode('utf-8')).hexdigest()))
+
+    def load_bundle(self, bundle_file, logger=logging):
+        """
+        Loads the replay-ready bundle from the given file, if it exists and can be read.
+        :param str bundle_file: the path to the bundle file.
+        :rtype: dict
+        :return: a dictionary with the player's name, the locations visited and the serialized events, or `None` if
+        there is no (readable) bundle, in which case the log has to be parsed.
+        """
+        if bundle_file is None or not os.path.isfile(bundle_file):
+            return None
+        try:
+            with open(bundle_file, 'rb') as file:
+                bundle = pickle.load(file)
+            if bundle.get('format') != BUNDLE_FORMAT:
+                raise ValueError('Unknown bundle format: {}'.format(bundle.get('format')))
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError, ImportError):
+            logger.warning('Unable to load events from {}, parsing the log instead'.format(bundle_file))
+            return None
+        logger.info('Loaded {} events from {}'.format(len(bundle['events']['types']), bundle_file))
+        return bundle
+
+    def save_bundle(self, bundle_file, logger=logging):
+        """
+        Saves the events extracted by the current parser to the given replay-ready bundle file.
+        :param str bundle_file: the path to the bundle file.
+        """
+        if bundle_file is None:
+            return
+        os.makedirs(os.path.dirname(bundle_file), exist_ok=True)
+        bundle = {'format': BUNDLE_FORMAT,
+                  'player': self.parser.player_name(),
+                  'locations': list(self.parser.locations),
+                  'events': self.parser.actions.serialize()}
+        with open(bundle_file, 'wb') as file:
+            pickle.dump(bundle, file)
+        logger.info('Saved {} events to {}'.format(len(self.parser.actions), bundle_file))
+
     def pre_replay(self, logger=logging):
         # Create PsychSim model
         logger.info('Creating world with "{}" map'.format(self.map_table.name))
         try:
             self.world, self.triage_agent, self.observer, self.victims, self.world_map = \
-                make_single_player_world(self.parser.player_name(), self.map_table.init_loc,
-                                         self.map_table.adjacency, self.map_table.victims, False, True,
-                                         self.create_observer, logger.getChild('make_single_player_world'))
+                get_single_player_world(self.parser.player_name(), self.map_table.init_loc,
+                                        self.map_table.adjacency, self.map_table.victims,
+                                        use_unobserved=False, full_obs=True, create_observer=self.create_observer,
+                                        logger=logger.getChild('make_single_player_world'),
+                                        regions=self.map_table.regions if self.use_regions else None,
+                                        template_key=(self.map_table.name, self.map_table.version),
+                                        cache_dir=self.cache_dir, compact_visits=self.compact_visits,
+                                        scheduled_expiry=self.scheduled_expiry,
+                                        triage_lookahead=self.triage_lookahead)
         except:
             logger.error(traceback.format_exc())
             logger.error('Unable to create world')
@@ -188,7 +286,8 @@ class Replayer(object):
 
     def replay(self, duration, logger):
         try:
-            self.parser.runTimeless(self.world, 0, duration, duration, permissive=True)
+            self.parser.runTimeless(self.world, 0, duration, duration, permissive=True,
+                                    fast_legality=self.fast_legality)
         except:
             logger.error(traceback.format_exc())
             logger.error('Unable to complete re-simulation')
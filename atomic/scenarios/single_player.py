@@ -1,5 +1,16 @@
+import glob
+import hashlib
+import io
 import logging
+import os
+import pickle
+import psychsim
 from psychsim.pwl import modelKey, rewardKey, setToConstantMatrix, makeTree
+import atomic.definitions.victims
+import atomic.definitions.world
+import atomic.definitions.world_map
+import atomic.inference
+from atomic.definitions.map_utils import make_region_map, get_file_hash
 from atomic.definitions.world_map import WorldMap
 from atomic.definitions.victims import Victims
 from atomic.definitions.world import SearchAndRescueWorld
@@ -12,22 +23,89 @@ GOLD_STR = 'Yellow'
 COLOR_PRIOR_P = {GREEN_STR: 0.3, GOLD_STR: 0.4}
 COLOR_REQD_TIMES = {GREEN_STR: {5: 0.2, 8: 0.4}, GOLD_STR: {5: 0.2, 15: 0.4}}
 
+TEMPLATE_PLAYER_NAME = '__player__'  # name of the player in world templates, replaced when cloning
+TEMPLATE_PROBE_NAME = 'A0'  # sorts before the other agents' names, unlike the placeholder, to verify name orderings
+TEMPLATE_NAME_ENCODINGS = ['utf-8', 'utf-16-le', 'utf-16-be', 'utf-32-le', 'utf-32-be']  # e.g., of bytes or numpy arrays
+WORLD_CACHE_FORMAT = 2  # to be incremented whenever the format of the stored world templates changes
+
+# modules whose code defines the worlds, such that stored worlds are rebuilt whenever it changes
+WORLD_SOURCE_FILES = [__file__, atomic.definitions.world.__file__, atomic.definitions.world_map.__file__,
+                      atomic.definitions.victims.__file__, atomic.inference.__file__]
+
+# psychsim modules defining the classes stored in the worlds, such that stored worlds are rebuilt after an upgrade
+PSYCHSIM_DIR = os.path.dirname(psychsim.__file__)
+PSYCHSIM_SOURCE_FILES = sorted(glob.glob(os.path.join(PSYCHSIM_DIR, '*.py')) +
+                               glob.glob(os.path.join(PSYCHSIM_DIR, 'pwl', '*.py')))
+
+_world_templates = {}
+_map_templates = {}
+
 
 def make_single_player_world(
         player_name, init_loc, loc_neighbors, victims_color_locs, use_unobserved=True, full_obs=False,
-        create_observer=True, logger=logging):
-    # create world and map
-    world = SearchAndRescueWorld()
-    world_map = WorldMap(world, loc_neighbors)
+        create_observer=True, logger=logging, regions=None, cache_dir=None, compact_visits=False,
+        scheduled_expiry=False, triage_lookahead=None, share_map=False):
+    # compact_visits: whether to pack the visited-location flags in a few features (see `WorldMap`), which only tells
+    # whether each location was left before rather than counting visits, so it cannot be used with frequency rewards
+    # scheduled_expiry: whether victims expire via a transition applied once, after the real step in which the clock
+    # passes their expiry time, rather than via dynamics tested on every step (see `Victims.makeExpiryDynamics`)
+    # share_map: whether to clone the map and player's moves from a template kept in memory for all maps with the same
+    # locations and adjacency, e.g., variants differing only in their victims, rather than creating them
+
+    # load the world from disk if it was previously built for the same map and configuration
+    if cache_dir is not None:
+        return _get_world_template(init_loc, loc_neighbors, victims_color_locs, use_unobserved=use_unobserved,
+                                   full_obs=full_obs, create_observer=create_observer, logger=logger, regions=regions,
+                                   cache_dir=cache_dir, compact_visits=compact_visits,
+                                   scheduled_expiry=scheduled_expiry,
+                                   triage_lookahead=triage_lookahead).clone(player_name)
+
+    # plan over regions instead of locations, if given, with moves within a region being ignored
+    init_locs, loc_neighbors, victims_color_locs = _map_regions(
+        {player_name: init_loc}, loc_neighbors, victims_color_locs, regions, logger)
+    init_loc = init_locs[player_name]
+
+    # create world, map and (single) triage agent with its location and moves, which do not depend on the victims
+    if share_map:
+        world, triage_agent, world_map = _get_map_template(init_loc, loc_neighbors, regions=regions,
+                                                           compact_visits=compact_visits).clone(player_name)
+    else:
+        world, triage_agent, world_map = _make_map_world(player_name, init_loc, loc_neighbors, regions=regions,
+                                                         compact_visits=compact_visits)
 
     # create victims info
-    victims = Victims(world, victims_color_locs, world_map, full_obs=full_obs,
-                      color_prior_p=COLOR_PRIOR_P, color_reqd_times=COLOR_REQD_TIMES)
+    victims = _make_victims(world, victims_color_locs, world_map, full_obs)
+    _make_triage_agent(victims, triage_agent, use_unobserved, full_obs, logger)
 
-    # create (single) triage agent
-    triage_agent = world.addAgent(player_name)
+    # after all agents are created
+    _make_victims_dynamics(victims, scheduled_expiry, triage_lookahead)
 
-    world_map.makePlayerLocation(triage_agent, init_loc)
+    world.setOrder([{triage_agent.name}])
+
+    # observer agent
+    observer = make_observer(world, [triage_agent.name], OBSERVER_NAME) if create_observer else None
+
+    # adjust agent's beliefs and observations
+    _set_player_observations(world, victims, triage_agent, observer)
+
+    return world, triage_agent, observer, victims, world_map
+
+
+def _map_regions(init_locs, loc_neighbors, victims_color_locs, regions, logger):
+    # replaces locations with their regions, if given, in the players' initial locations, the map and the victims
+    if regions is None:
+        return init_locs, loc_neighbors, victims_color_locs
+    loc_neighbors, victims_color_locs = make_region_map(loc_neighbors, victims_color_locs, regions, logger)
+    return {name: regions.get(loc, loc) for name, loc in init_locs.items()}, loc_neighbors, victims_color_locs
+
+
+def _make_victims(world, victims_color_locs, world_map, full_obs):
+    return Victims(world, victims_color_locs, world_map, full_obs=full_obs,
+                   color_prior_p=COLOR_PRIOR_P, color_reqd_times=COLOR_REQD_TIMES)
+
+
+def _make_triage_agent(victims, triage_agent, use_unobserved, full_obs, logger):
+    # adds the player's victim-related features, triage actions, observable victim variables and (dummy) reward
     victims.setupTriager(triage_agent)
     victims.createTriageActions(triage_agent)
     if not full_obs:
@@ -38,23 +116,237 @@ def make_single_player_world(
     logger.debug('Made actions for triage agent: {}'.format(triage_agent.name))
     triage_agent.setReward(makeTree(setToConstantMatrix(rewardKey(triage_agent.name), 0)))  # dummy reward
 
-    # after all agents are created
-    victims.makeExpiryDynamics()
-    victims.stochasticTriageDur()
 
-    world.setOrder([{triage_agent.name}])
+def _make_victims_dynamics(victims, scheduled_expiry, triage_lookahead):
+    # has to be called after all agents are created
+    victims.makeExpiryDynamics(scheduled_expiry)
+    victims.stochasticTriageDur(triage_lookahead)
 
-    # observer agent
-    observer = make_observer(world, [triage_agent.name], OBSERVER_NAME) if create_observer else None
 
-    # adjust agent's beliefs and observations
-    triage_agent.resetBelief()
-    triage_agent.omega = [key for key in world.state.keys()
-                          if not ((key in {modelKey(observer.name if observer is not None else ''),
-                                           rewardKey(triage_agent.name)})
-                                  or (key.find('unobs') > -1))]
+def _set_player_observations(world, victims, triage_agent, observer, teammates=(), model=None):
+    # resets the player's beliefs (of the given model, `None` for all) from the world state, and makes it observe all
+    # but the observer's model, the players' rewards, the teammates' models and the unobserved victim variables
+    triage_agent.resetBelief(model=model)
+    victims.setObsVarsBeliefs(triage_agent, model)
+    hidden = {modelKey(observer.name if observer is not None else ''), rewardKey(triage_agent.name)}
+    hidden.update(rewardKey(name) for name in teammates)
+    hidden.update(modelKey(name) for name in teammates)
+    triage_agent.omega = [key for key in world.state.keys() if not (key in hidden or key.find('unobs') > -1)]
 
-    return world, triage_agent, observer, victims, world_map
+
+def _make_map_world(player_name, init_loc, loc_neighbors, regions, compact_visits):
+    world = SearchAndRescueWorld()
+    world_map = WorldMap(world, loc_neighbors, regions, compact_visits)
+    triage_agent = world.addAgent(player_name)
+    world_map.makePlayerLocation(triage_agent, init_loc)
+    return world, triage_agent, world_map
+
+
+def _get_map_template(init_loc, loc_neighbors, regions, compact_visits):
+    # maps differing only in their victims, e.g., difficulty variants of the same map, share the same template
+    key = (init_loc, tuple(sorted((loc, tuple(sorted((int(d), n) for d, n in neighbors.items())))
+                                  for loc, neighbors in loc_neighbors.items())),
+           None if regions is None else tuple(sorted(regions.items())), compact_visits)
+    if key not in _map_templates:
+        template = WorldTemplate(WorldTemplate.serialize(
+            _make_map_world(TEMPLATE_PLAYER_NAME, init_loc, loc_neighbors, regions=regions,
+                            compact_visits=compact_visits)))
+        template.verify(_make_map_world(TEMPLATE_PROBE_NAME, init_loc, loc_neighbors, regions=regions,
+                                        compact_visits=compact_visits)[0])
+        _map_templates[key] = template
+    return _map_templates[key]
+
+
+def _get_world_order(world):
+    # the order of the agents, models, variables, state keys and symbols of a world, which depends on the player's name
+    # if any of them is sorted by name
+    return (list(world.agents), [list(agent.models) for agent in world.agents.values()], list(world.variables),
+            list(world.state.keys()), list(world.symbolList))
+
+
+class _TemplatePickler(pickle.Pickler):
+    # pickles the strings mentioning the placeholder player as persistent ids, i.e., split around the placeholder
+    def persistent_id(self, obj):
+        if isinstance(obj, str) and TEMPLATE_PLAYER_NAME in obj:
+            return tuple(obj.split(TEMPLATE_PLAYER_NAME))
+        return None
+
+
+class _TemplateUnpickler(pickle.Unpickler):
+    # joins the strings mentioning the placeholder player around the actual player's name
+    def __init__(self, file, player_name):
+        super().__init__(file)
+        self.player_name = player_name
+
+    def persistent_load(self, pid):
+        return self.player_name.join(pid)
+
+
+class WorldTemplate(object):
+    """
+    A world created by `make_single_player_world` for a placeholder player, stored in serialized form such that it can
+    be cloned for any player.
+    """
+
+    def __init__(self, data):
+        """
+        Creates a new world template.
+        :param bytes data: the world created for `TEMPLATE_PLAYER_NAME`, as given by `WorldTemplate.serialize`.
+        """
+        self.data = data
+
+    @staticmethod
+    def serialize(obj):
+        """
+        Serializes the given world (or any object) created for `TEMPLATE_PLAYER_NAME`, where every string mentioning
+        the player is stored apart from the rest of the data, such that it can be renamed when cloning.
+        :param obj: the object to be serialized.
+        :rtype: bytes
+        :return: the serialized object. A `ValueError` is raised if the player is also mentioned in some other form,
+        e.g., in bytes or numpy string arrays, which cannot be renamed when cloning.
+        """
+        file = io.BytesIO()
+        _TemplatePickler(file, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+        data = file.getvalue()
+        if any(TEMPLATE_PLAYER_NAME.encode(encoding) in data for encoding in TEMPLATE_NAME_ENCODINGS):
+            raise ValueError('Template world mentions {} in a form other than str, so it cannot be cloned'.format(
+                TEMPLATE_PLAYER_NAME))
+        return data
+
+    @staticmethod
+    def create(init_loc, loc_neighbors, victims_color_locs, use_unobserved=True, full_obs=False,
+               create_observer=True, logger=logging, regions=None, compact_visits=False, scheduled_expiry=False,
+               triage_lookahead=None):
+        """
+        Creates a new world template. See `make_single_player_world` for a description of the parameters.
+        :rtype: WorldTemplate
+        """
+        worlds = [make_single_player_world(name, init_loc, loc_neighbors, victims_color_locs,
+                                           use_unobserved=use_unobserved, full_obs=full_obs,
+                                           create_observer=create_observer, logger=logger, regions=regions,
+                                           compact_visits=compact_visits, scheduled_expiry=scheduled_expiry,
+                                           triage_lookahead=triage_lookahead, share_map=True)
+                  for name in [TEMPLATE_PLAYER_NAME, TEMPLATE_PROBE_NAME]]
+        template = WorldTemplate(WorldTemplate.serialize(worlds[0]))
+        template.verify(worlds[1][0])
+        return template
+
+    def verify(self, world):
+        """
+        Verifies that a clone of this template for `TEMPLATE_PROBE_NAME` has its agents, models, variables, state keys
+        and symbols in the same order as the given world, built anew for that player. Otherwise, the world depends on
+        the order of the player's name with respect to other names, so clones would differ from freshly built worlds.
+        :param World world: the world built for `TEMPLATE_PROBE_NAME`.
+        """
+        if _get_world_order(self.clone(TEMPLATE_PROBE_NAME)[0]) != _get_world_order(world):
+            raise ValueError('Template world depends on the order of the player\'s name, so it cannot be cloned')
+
+    def save(self, fname):
+        """
+        Saves this template to the given file.
+        :param str fname: the path to the file.
+        """
+        with open(fname, 'wb') as file:
+            pickle.dump(self.data, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(fname):
+        """
+        Loads a template from the given file.
+        :param str fname: the path to the file.
+        :rtype: WorldTemplate
+        """
+        with open(fname, 'rb') as file:
+            data = pickle.load(file)
+        if not isinstance(data, bytes):
+            raise ValueError('Unknown world template format in {}'.format(fname))
+        return WorldTemplate(data)
+
+    def clone(self, player_name):
+        """
+        Creates a new copy of the template's world, in its initial state, for the given player.
+        :param str player_name: the name of the player.
+        :rtype: tuple
+        :return: a tuple (world, triage_agent, observer, victims, world_map), as returned by `make_single_player_world`,
+        or (world, triage_agent, world_map) for the templates of maps without victims.
+        """
+        return _TemplateUnpickler(io.BytesIO(self.data), player_name).load()
+
+
+def get_world_cache_file(cache_dir, init_loc, loc_neighbors, victims_color_locs, use_unobserved=True,
+                         full_obs=False, create_observer=True, regions=None, compact_visits=False,
+                         scheduled_expiry=False, triage_lookahead=None):
+    """
+    Gets the path to the stored world template for the given map and configuration, keyed by a digest of the map,
+    the configuration and the code defining the world, including psychsim's. See `make_single_player_world` for a
+    description of the parameters.
+    :param str cache_dir: the directory in which world templates are stored.
+    :rtype: str
+    """
+    key = repr((WORLD_CACHE_FORMAT, init_loc,
+                sorted((loc, sorted((int(d), n) for d, n in neighbors.items()))
+                       for loc, neighbors in loc_neighbors.items()),
+                sorted((loc, sorted(colors)) for loc, colors in victims_color_locs.items()),
+                use_unobserved, full_obs, create_observer, None if regions is None else sorted(regions.items()),
+                compact_visits, scheduled_expiry, triage_lookahead,
+                get_file_hash(*WORLD_SOURCE_FILES, *PSYCHSIM_SOURCE_FILES)))
+    return os.path.join(cache_dir, 'world-{}.pkl'.format(hashlib.sha1(key.encode('utf-8')).hexdigest()))
+
+
+def _get_world_template(init_loc, loc_neighbors, victims_color_locs, use_unobserved=True, full_obs=False,
+                        create_observer=True, logger=logging, regions=None, cache_dir=None, compact_visits=False,
+                        scheduled_expiry=False, triage_lookahead=None):
+    if cache_dir is not None:
+        fname = get_world_cache_file(cache_dir, init_loc, loc_neighbors, victims_color_locs,
+                                     use_unobserved=use_unobserved, full_obs=full_obs,
+                                     create_observer=create_observer, regions=regions, compact_visits=compact_visits,
+                                     scheduled_expiry=scheduled_expiry, triage_lookahead=triage_lookahead)
+        if os.path.isfile(fname):
+            logger.info('Loading world from {}'.format(fname))
+            try:
+                return WorldTemplate.load(fname)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError, ImportError):
+                logger.warning('Unable to load world from {}, rebuilding it'.format(fname))
+    template = WorldTemplate.create(init_loc, loc_neighbors, victims_color_locs, use_unobserved=use_unobserved,
+                                    full_obs=full_obs, create_observer=create_observer, logger=logger,
+                                    regions=regions, compact_visits=compact_visits,
+                                    scheduled_expiry=scheduled_expiry, triage_lookahead=triage_lookahead)
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        template.save(fname)
+        logger.info('Saved world to {}'.format(fname))
+    return template
+
+
+def get_single_player_world(
+        player_name, init_loc, loc_neighbors, victims_color_locs, use_unobserved=True, full_obs=False,
+        create_observer=True, logger=logging, regions=None, template_key=None, cache_dir=None,
+        compact_visits=False, scheduled_expiry=False, triage_lookahead=None):
+    """
+    Gets a world equivalent to the one created by `make_single_player_world`, but cloned from a template that is
+    created only once per map and configuration.
+    :param template_key: a hashable object identifying the map, e.g., its name and version. If `None`, the template is
+    not kept in memory.
+    :param str cache_dir: the directory in which world templates are stored, `None` to not store them.
+    :rtype: tuple
+    :return: a tuple (world, triage_agent, observer, victims, world_map), as returned by `make_single_player_world`.
+    """
+    if template_key is None:
+        return make_single_player_world(player_name, init_loc, loc_neighbors, victims_color_locs,
+                                        use_unobserved=use_unobserved, full_obs=full_obs,
+                                        create_observer=create_observer, logger=logger, regions=regions,
+                                        cache_dir=cache_dir, compact_visits=compact_visits,
+                                        scheduled_expiry=scheduled_expiry, triage_lookahead=triage_lookahead)
+    key = (template_key, init_loc, use_unobserved, full_obs, create_observer, regions is not None, compact_visits,
+           scheduled_expiry, triage_lookahead)
+    if key not in _world_templates:
+        _world_templates[key] = _get_world_template(init_loc, loc_neighbors, victims_color_locs,
+                                                    use_unobserved=use_unobserved, full_obs=full_obs,
+                                                    create_observer=create_observer, logger=logger, regions=regions,
+                                                    cache_dir=cache_dir, compact_visits=compact_visits,
+                                                    scheduled_expiry=scheduled_expiry,
+                                                    triage_lookahead=triage_lookahead)
+    return _world_templates[key].clone(player_name)
 
 
 if __name__ == '__main__':
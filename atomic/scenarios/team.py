@@ -0,0 +1,87 @@
+import logging
+from psychsim.probability import Distribution
+from atomic.definitions.world_map import WorldMap
+from atomic.definitions.world import SearchAndRescueWorld
+from atomic.inference import make_observer
+from atomic.scenarios.single_player import OBSERVER_NAME, _map_regions, _make_victims, _make_triage_agent, \
+    _make_victims_dynamics, _set_player_observations
+
+TEAMMATE_MODEL_SUFFIX = '_teammate'  # suffix of the name of the model by which players predict each teammate
+
+
+def get_teammate_model_name(player_name):
+    """
+    Gets the name of the model by which the other players of a team predict the given player's actions.
+    :param str player_name: the name of the player.
+    :rtype: str
+    """
+    return player_name + TEAMMATE_MODEL_SUFFIX
+
+
+def make_team_world(
+        player_names, init_loc, loc_neighbors, victims_color_locs, use_unobserved=True, full_obs=False,
+        create_observer=True, logger=logging, regions=None, compact_visits=False, scheduled_expiry=False,
+        triage_lookahead=None):
+    """
+    Creates a world with a team of triage agents taking turns. The map, the victim counters and the expiry and
+    triage duration dynamics are created once and shared by all players, each player only adding its own location,
+    visits, saved victims counters, triage actions and rewards. See `make_single_player_world` for a description of
+    the other parameters. Team worlds are always built anew, i.e., they are neither stored on disk nor cloned from
+    templates.
+    Every player's move and triage advances the shared mission clock, as triage success depends on the time elapsed
+    during the triage action, so in the agents' lookahead the clock runs N times as fast as in the game for a team of N
+    players. The replay loop syncs the clock with the game's time before each logged action.
+    :param list[str] player_names: the names of the players in the team.
+    :param init_loc: the initial location of all players, or a dictionary with the initial location of each player.
+    :type init_loc: str or dict[str, str]
+    :rtype: tuple
+    :return: a tuple (world, triage_agents, observer, victims, world_map), where `triage_agents` is the list of player
+    agents, in the order of `player_names`.
+    """
+    init_locs = init_loc if isinstance(init_loc, dict) else {name: init_loc for name in player_names}
+
+    # plan over regions instead of locations, if given, with moves within a region being ignored
+    init_locs, loc_neighbors, victims_color_locs = _map_regions(
+        init_locs, loc_neighbors, victims_color_locs, regions, logger)
+
+    # create world and map
+    world = SearchAndRescueWorld()
+    world_map = WorldMap(world, loc_neighbors, regions, compact_visits)
+
+    # create victims info, shared by all players
+    victims = _make_victims(world, victims_color_locs, world_map, full_obs)
+
+    # create triage agents, each with its own location, visits, counters and actions over the shared victims
+    triage_agents = []
+    for name in player_names:
+        triage_agent = world.addAgent(name)
+        world_map.makePlayerLocation(triage_agent, init_locs[name])
+        _make_triage_agent(victims, triage_agent, use_unobserved, full_obs, logger)
+        triage_agents.append(triage_agent)
+
+    # after all agents are created
+    _make_victims_dynamics(victims, scheduled_expiry, triage_lookahead)
+
+    # players take turns, such that the effects of concurrent actions on the shared clock and victims are not summed
+    world.setOrder([{name} for name in player_names])
+
+    # observer agent
+    observer = make_observer(world, list(player_names), OBSERVER_NAME) if create_observer else None
+
+    # players predict their teammates' actions via a model choosing among all of them, such that any action observed
+    # afterwards is deemed possible, and deciding over the state it is projected in rather than over beliefs of its own,
+    # which avoids nested belief updates per teammate
+    for triage_agent in triage_agents:
+        triage_agent.addModel(get_teammate_model_name(triage_agent.name), parent=triage_agent.get_true_model(),
+                              horizon=0, selection='distribution', beliefs=True, static=True)
+
+    # adjust agents' beliefs and observations, players not observing the others' models and rewards
+    for triage_agent in triage_agents:
+        true_model = triage_agent.get_true_model()
+        teammates = [name for name in player_names if name != triage_agent.name]
+        _set_player_observations(world, victims, triage_agent, observer, teammates, true_model)
+        for name in teammates:
+            world.setMentalModel(triage_agent.name, name, Distribution({get_teammate_model_name(name): 1.}),
+                                 true_model)
+
+    return world, triage_agents, observer, victims, world_map
@@ -78,7 +78,6 @@ if __name__ == '__main__':
     logging.info('Parsing data file {}...'.format(DATA_FILE))
     parser = TrajectoryParser(DATA_FILE)
     player_name = parser.player_name()
-    logging.info('Got {} events for player "{}"'.format(parser.data.shape[0], player_name))
 
     # create world, agent and observer
     world, agent, observer, victims, world_map = \
@@ -102,7 +101,7 @@ if __name__ == '__main__':
 
     # generates trajectory
     parser.getActionsAndEvents(victims, world_map, MAX_TRAJ_LENGTH)
-    logging.info('Getting trajectory out of {} actions/events...'.format(len(parser.actions)))
+    logging.info('Got {} events for player "{}"'.format(len(parser.actions), player_name))
 
     parser.runTimeless(world, 0, len(parser.actions), len(parser.actions), PRUNE_THRESHOLD, True)
     logging.info('Recorded {} state-action pairs'.format(len(parser.trajectory)))
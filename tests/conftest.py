@@ -0,0 +1,33 @@
+import pytest
+
+# a small map: a square of four rooms, with a one-way exit out of the last one
+MAP_ADJACENCY_CSV = '''Room,N,S,E,W
+a,b,,c,
+b,,a,e,
+c,e,,,a
+e,,c,exit,b
+'''
+MAP_VICTIMS_CSV = '''Index,Victim Location,Color,X,Y,Z
+0,b,Green,0,0,0
+1,e,Yellow,0,0,0
+2,e,Green,0,0,0
+'''
+MAP_COORDS_CSV = '''a,0,0
+b,0,1
+c,1,0
+e,1,1
+'''
+
+
+@pytest.fixture
+def map_files(tmp_path):
+    """
+    Writes the files of a small map, as (adjacency, rooms, victims, coordinates, portals).
+    """
+    files = []
+    for name, contents in [('adjacency', MAP_ADJACENCY_CSV), ('victims', MAP_VICTIMS_CSV),
+                           ('coords', MAP_COORDS_CSV)]:
+        fname = tmp_path / 'map_{}.csv'.format(name)
+        fname.write_text(contents)
+        files.append(str(fname))
+    return files[0], None, files[1], files[2], None
@@ -0,0 +1,147 @@
+import datetime
+import warnings
+import pandas as pd
+import pytest
+from atomic.definitions import Directions
+from atomic.definitions.victims import GREEN_STR, GOLD_STR
+from atomic.parsing.csv_parser import ProcessCSV
+from atomic.scenarios.single_player import make_single_player_world
+from atomic.scenarios.team import make_team_world
+
+N, E, S, W = Directions.N, Directions.E, Directions.S, Directions.W
+
+PLAYER = 'p1'
+ADJACENCY = {
+    'a': {N: 'b', E: 'c'},
+    'b': {S: 'a', E: 'e'},
+    'c': {W: 'a', N: 'e'},
+    'e': {W: 'b', S: 'c'},
+}
+VICTIMS = {'b': [GREEN_STR], 'e': [GOLD_STR, GREEN_STR]}
+NUM_SLOTS = 3  # victim columns in the log, more than the victims ever seen in one room
+START = datetime.datetime(2021, 2, 1, 10, 0, 0, tzinfo=datetime.timezone.utc)
+
+GREEN_B = ('vg', GREEN_STR, True)
+GOLD_E = ('vy', GOLD_STR, True)
+GREEN_E = ('vg2', GREEN_STR, True)
+
+# (room, victims in room as (id, color, in FOV), victim in crosshair, triage in progress, triage result) per second
+STEPS = [('a', [], None, False, 'None')] * 3 + \
+        [('b', [GREEN_B[:2] + (False,)], None, False, 'None')] + \
+        [('b', [GREEN_B], 'vg', False, 'None')] * 2 + \
+        [('b', [GREEN_B], 'vg', True, 'None')] * 8 + \
+        [('b', [GREEN_B], 'vg', False, 'SUCCESSFUL')] + \
+        [('e', [GOLD_E, GREEN_E], None, False, 'None')] * 2 + \
+        [('e', [GOLD_E, GREEN_E], 'vy', True, 'None')] * 4 + \
+        [('e', [GOLD_E, GREEN_E], 'vy', False, 'UNSUCCESSFUL')] + \
+        [('e', [GOLD_E, GREEN_E], 'vg2', True, 'None')] * 3 + \
+        [('e', [GOLD_E, GREEN_E], 'vg2', False, 'SUCCESSFUL')] + \
+        [('c', [], None, False, 'None')] * 3 + \
+        [('a', [], None, False, 'None')] * 2 + \
+        [('e', [GOLD_E[:2] + (False,), GREEN_E[:2] + (False,)], None, False, 'None')] * 2
+
+
+# a second player, moving around while the first one triages
+TEAMMATE = 'p2'
+TEAMMATE_STEPS = [('c', [], None, False, 'None')] * 5 + [('e', [GOLD_E, GREEN_E], None, False, 'None')] * 4 + \
+                 [('b', [GREEN_B], 'vg', True, 'None')] * 3 + [('b', [GREEN_B], 'vg', False, 'UNSUCCESSFUL')] + \
+                 [('a', [], None, False, 'None')] * 4
+
+
+def _write_log(fname, steps, order=None):
+    rows = []
+    for t, player, (room, victims, crosshair, triaging, result) in sorted(
+            (t, player, step) for player, player_steps in steps.items() for t, step in enumerate(player_steps)):
+        row = {
+            '@timestamp': (START + datetime.timedelta(seconds=t)).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'player_ID': player,
+            'Room_in': room,
+            'num_victims': len(victims),
+            'victim_in_crosshair_id': 'None' if crosshair is None else crosshair,
+            'event_triage_victim_id': crosshair if triaging else 'None',
+            'triage_in_progress': triaging,
+            'triage_result': result,
+            'mission_timer': 600 - t}
+        for i in range(NUM_SLOTS):
+            vic_id, color, in_fov = victims[i] if i < len(victims) else ('None', 'None', False)
+            row.update({'victim_{}_id'.format(i): vic_id,
+                        'victim_{}_color'.format(i): color,
+                        'victim_{}_in_FOV'.format(i): in_fov})
+        rows.append(row)
+    data = pd.DataFrame(rows)
+    if order is not None:
+        data = data.iloc[order]
+    data.to_csv(fname)
+
+
+def _get_events(parser):
+    return [(e.type, str(e.payload), e.duration, e.seconds, e.index, e.attempt) for e in parser.actions]
+
+
+@pytest.fixture
+def world():
+    world, agent, _, victims, world_map = make_single_player_world(
+        PLAYER, 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True, create_observer=False)
+    return victims, world_map
+
+
+@pytest.mark.parametrize('chunksize', [1, 2, 5, 7, len(STEPS)])
+def test_chunked_extraction_matches_whole_file(tmp_path, world, chunksize):
+    victims, world_map = world
+    fname = str(tmp_path / 'log.csv')
+    _write_log(fname, {PLAYER: STEPS})
+
+    whole = ProcessCSV(fname)
+    whole.getActionsAndEvents(victims, world_map)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', FutureWarning)
+        chunked = ProcessCSV(fname, chunksize=chunksize)
+        chunked.getActionsAndEvents(victims, world_map)
+
+    assert chunked.maxVicsInLoc == whole.maxVicsInLoc == 2
+    assert chunked.cols == whole.cols
+    assert len(whole.actions) > 0
+    assert _get_events(chunked) == _get_events(whole)
+    assert sorted(chunked.locations) == sorted(whole.locations)
+
+
+def test_chunked_extraction_rejects_unordered_log(tmp_path, world):
+    victims, world_map = world
+    fname = str(tmp_path / 'log.csv')
+    order = list(range(len(STEPS)))
+    order[2], order[-2] = order[-2], order[2]
+    _write_log(fname, {PLAYER: STEPS}, order)
+
+    ProcessCSV(fname).getActionsAndEvents(victims, world_map)  # sorted as a whole
+    with pytest.raises(ValueError):
+        ProcessCSV(fname, chunksize=5).getActionsAndEvents(victims, world_map)
+
+
+@pytest.mark.parametrize('chunksize', [None, 4])
+def test_extraction_per_player(tmp_path, chunksize):
+    _, _, _, victims, world_map = make_team_world(
+        [PLAYER, TEAMMATE], 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True, create_observer=False)
+    fname = str(tmp_path / 'team.csv')
+    _write_log(fname, {PLAYER: STEPS, TEAMMATE: TEAMMATE_STEPS})
+
+    # only the player on the first row is parsed, ignoring the teammate's rows
+    parser = ProcessCSV(fname, chunksize=chunksize)
+    parser.getActionsAndEvents(victims, world_map)
+    assert parser.player_name() == PLAYER
+    single_fname = str(tmp_path / 'single.csv')
+    _write_log(single_fname, {PLAYER: STEPS})
+    single = ProcessCSV(single_fname)
+    single.getActionsAndEvents(victims, world_map)
+    assert _get_events(parser) == _get_events(single)
+
+    # each player's events are extracted from the same data in turn
+    if chunksize is None:
+        for player, steps in [(PLAYER, STEPS), (TEAMMATE, TEAMMATE_STEPS)]:
+            single_fname = str(tmp_path / '{}.csv'.format(player))
+            _write_log(single_fname, {player: steps})
+            single = ProcessCSV(single_fname)
+            single.getActionsAndEvents(victims, world_map)
+            events = parser.extractPlayerActions(player, parser.data, victims, world_map)
+            assert len(events) > 1
+            assert [(e.type, str(e.payload), e.duration, e.seconds, e.index, e.attempt) for e in events] == \
+                   _get_events(single)
@@ -0,0 +1,44 @@
+import math
+from atomic.parsing.events import EventSequence, LOCATION, MOVE, TRIAGE, FEATURE
+
+
+def _make_events():
+    events = EventSequence()
+    events.append(LOCATION, 'a', 0, 0., 0, 0)
+    events.append(MOVE, 'p-move-N', 2, 3., 3, 0)
+    events.append(TRIAGE, 'p-triage_Green', 8, 5., 4, 0)
+    events.append(FEATURE, ('seconds', 20), 0, float('nan'), 9, 1)
+    events.append(MOVE, 'p-move-E', 0, 20., 10, 1)
+    return events
+
+
+def _as_tuples(events):
+    return [(e.type, e.payload, e.duration, None if math.isnan(e.seconds) else e.seconds, e.index, e.attempt)
+            for e in events]
+
+
+def test_serialize_round_trip():
+    events = _make_events()
+    data = events.serialize()
+    assert data['payloads'][1] == 'p-move-N'
+    actions = {'p-move-N': 'p-move-N', 'p-move-E': 'p-move-E', 'p-triage_Green': 'p-triage_Green'}
+    restored = EventSequence.deserialize(data, actions)
+    assert _as_tuples(restored) == _as_tuples(events)
+
+
+def test_slice_and_take():
+    events = _make_events()
+    assert len(events[1:3]) == 2
+    assert _as_tuples(events[1:3]) == _as_tuples(events)[1:3]
+    assert _as_tuples(events.take([4, 0])) == [_as_tuples(events)[4], _as_tuples(events)[0]]
+    assert len(events.take([])) == 0
+
+
+def test_time_slice():
+    events = _make_events()
+    assert [e.index for e in events.time_slice(3, 20)] == [3, 4]
+    assert [e.index for e in events.time_slice(start=5)] == [4, 10]
+    assert [e.index for e in events.time_slice(end=3)] == [0]
+    # events with an unknown time are only selected when no interval is given
+    assert 9 not in [e.index for e in events.time_slice(start=0)]
+    assert len(events.time_slice()) == len(events)
@@ -0,0 +1,45 @@
+from atomic.definitions import Directions
+from atomic.definitions.features import get_feature_keys, get_num_victims_location_key, get_triaged_key
+from atomic.definitions.victims import Victims, GREEN_STR, GOLD_STR
+from atomic.definitions.world import SearchAndRescueWorld
+from atomic.definitions.world_map import WorldMap
+
+N, E, S, W = Directions.N, Directions.E, Directions.S, Directions.W
+
+ADJACENCY = {
+    'a': {N: 'b', E: 'c'},
+    'b': {S: 'a', E: 'e'},
+    'c': {W: 'a', N: 'e'},
+    'e': {W: 'b', S: 'c'},
+}
+
+
+def test_feature_keys_are_kept():
+    world = SearchAndRescueWorld()
+    world_map = WorldMap(world, ADJACENCY)
+    agent = world.addAgent('p1')
+    world_map.makePlayerLocation(agent, 'a')
+    keys = get_feature_keys(agent)
+    assert get_feature_keys(agent) is keys
+    assert keys.locations == world_map.all_locations
+    assert [keys.location_index[loc] for loc in keys.locations] == list(range(len(keys.locations)))
+
+
+def test_feature_keys_include_features_defined_after_lookup():
+    world = SearchAndRescueWorld()
+    world_map = WorldMap(world, ADJACENCY)
+    agent = world.addAgent('p1')
+    world_map.makePlayerLocation(agent, 'a')
+    keys = get_feature_keys(agent)
+    assert all(key is None for key in keys.victims[GREEN_STR])
+
+    # victim counters defined after the first lookup
+    victims = Victims(world, {'b': [GREEN_STR], 'e': [GOLD_STR]}, world_map)
+    victims.setupTriager(agent)
+    keys = get_feature_keys(agent)
+    for loc in world_map.all_locations:
+        key = keys.victims[GREEN_STR][keys.location_index[loc]]
+        assert key == (get_num_victims_location_key(loc, GREEN_STR) if loc in ['b', 'e'] else None)
+    assert keys.triaged[GREEN_STR] == get_triaged_key(agent, GREEN_STR)
+    assert keys.triaged[GREEN_STR] in world.variables
+    assert get_feature_keys(agent) is keys
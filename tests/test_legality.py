@@ -0,0 +1,49 @@
+import pytest
+from atomic.definitions import Directions
+from atomic.definitions.victims import GREEN_STR, GOLD_STR
+from atomic.parsing import GameLogParser
+from atomic.scenarios.single_player import make_single_player_world
+
+N, E, S, W = Directions.N, Directions.E, Directions.S, Directions.W
+
+PLAYER = 'p1'
+ADJACENCY = {
+    'a': {N: 'b', E: 'c'},
+    'b': {S: 'a', E: 'd'},
+    'c': {W: 'a', N: 'd'},
+    'd': {W: 'b', S: 'c'},
+}
+VICTIMS = {'b': [GREEN_STR], 'c': [GOLD_STR], 'd': [GREEN_STR, GOLD_STR]}
+
+
+@pytest.fixture
+def world():
+    world, agent, _, victims, world_map = make_single_player_world(
+        PLAYER, 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True, create_observer=False)
+    parser = GameLogParser('')
+    parser.human = PLAYER
+    return world, agent, victims, parser
+
+
+def _check_legality(world, agent, parser, state=None):
+    legal = agent.getLegalActions(state)
+    for action in agent.actions:
+        assert parser.isLegal(world, action, state) == (action in legal), action
+
+
+def test_fast_legality_matches_legal_actions(world):
+    world, agent, victims, parser = world
+    for loc in ADJACENCY:
+        parser.setLocation(world, loc)
+        _check_legality(world, agent, parser)
+        _check_legality(world, agent, parser, agent.getBelief(model=agent.get_true_model()))
+
+
+def test_fast_legality_after_triage(world):
+    world, agent, victims, parser = world
+    parser.setLocation(world, 'b')
+    triage = victims.getTriageAction(PLAYER, GREEN_STR)
+    assert parser.isLegal(world, triage)
+    world.step(triage)
+    # the only green victim in the room was triaged (or is still being triaged)
+    _check_legality(world, agent, parser)
@@ -0,0 +1,92 @@
+import json
+import pandas as pd
+from atomic.definitions import Directions
+from atomic.definitions.map_utils import getSandRMap
+from atomic.parsing.map_parser import load_map_geometry, load_location_map, derive_adjacency, compare_adjacency, \
+    write_adjacency, verify_logs
+
+N, E, S, W = Directions.N, Directions.E, Directions.S, Directions.W
+
+# room a with room b to its east and a hallway of two parts to its south (south is towards positive z)
+ROOMS_CSV = '''RoomID,x0,z0,x1,z1
+a, 0,0,10,10
+b, 11,0,20,10
+hall_1, 0,11,10,15
+hall_2, 11,11,20,15
+'''
+DOORS_CSV = '''Index,x0,z0,x1,z1,Room0,Room1
+d1,10,4,11,5,a,b
+d2,4,10,5,11,a,hall
+d3,10,12,11,13,hall_1,hall_2
+'''
+EXPECTED = {'a': {E: 'b', S: 'hall_1'}, 'b': {W: 'a'}, 'hall_1': {N: 'a', E: 'hall_2'}, 'hall_2': {W: 'hall_1'}}
+
+
+def _write_geometry(tmp_path):
+    rooms_file, doors_file = tmp_path / 'rooms.csv', tmp_path / 'doors.csv'
+    rooms_file.write_text(ROOMS_CSV)
+    doors_file.write_text(DOORS_CSV)
+    return str(rooms_file), str(doors_file)
+
+
+def test_derive_adjacency_from_csv(tmp_path):
+    parts, doors = load_map_geometry(*_write_geometry(tmp_path))
+    assert parts.set_index('part')['room'].to_dict() == {'a': 'a', 'b': 'b', 'hall_1': 'hall', 'hall_2': 'hall'}
+    assert derive_adjacency(parts, doors) == EXPECTED
+
+
+def test_derive_adjacency_from_semantic_map(tmp_path):
+    locations = [{'id': 'a', 'type': 'room', 'bounds': {'coordinates': [{'x': 0, 'z': 0}, {'x': 10, 'z': 10}]}},
+                 {'id': 'b', 'type': 'room', 'bounds': {'coordinates': [{'x': 11, 'z': 0}, {'x': 20, 'z': 10}]}},
+                 {'id': 'hall', 'type': 'hallway', 'child_locations': ['hall_1', 'hall_2']},
+                 {'id': 'hall_1', 'type': 'hallway_part',
+                  'bounds': {'coordinates': [{'x': 0, 'z': 11}, {'x': 10, 'z': 15}]}},
+                 {'id': 'hall_2', 'type': 'hallway_part',
+                  'bounds': {'coordinates': [{'x': 11, 'z': 11}, {'x': 20, 'z': 15}]}}]
+    connections = [{'id': 'd1', 'bounds': {'coordinates': [{'x': 10, 'z': 4}, {'x': 11, 'z': 5}]},
+                    'connected_locations': ['a', 'b']},
+                   {'id': 'd2', 'bounds': {'coordinates': [{'x': 4, 'z': 10}, {'x': 5, 'z': 11}]},
+                    'connected_locations': ['a', 'hall']},
+                   {'id': 'd3', 'bounds': {'coordinates': [{'x': 10, 'z': 12}, {'x': 11, 'z': 13}]},
+                    'connected_locations': ['hall_1', 'hall_2']}]
+    semantic_map = tmp_path / 'map.json'
+    semantic_map.write_text(json.dumps({'locations': locations, 'connections': connections}))
+    assert derive_adjacency(*load_map_geometry(semantic_map=str(semantic_map))) == EXPECTED
+
+
+def test_derive_adjacency_merges_mapped_parts(tmp_path):
+    location_file = tmp_path / 'locations.csv'
+    location_file.write_text('Part,Location\nhall_1, hall\nhall_2, hall\n')
+    location_map = load_location_map(str(location_file))
+    assert location_map == {'hall_1': 'hall', 'hall_2': 'hall'}
+    adjacency = derive_adjacency(*load_map_geometry(*_write_geometry(tmp_path)), location_map)
+    assert adjacency == {'a': {E: 'b', S: 'hall'}, 'b': {W: 'a'}, 'hall': {N: 'a'}}
+
+
+def test_compare_and_write_adjacency(tmp_path):
+    adjacency = derive_adjacency(*load_map_geometry(*_write_geometry(tmp_path)))
+    fname = str(tmp_path / 'adjacency.csv')
+    write_adjacency(adjacency, fname)
+    reference = getSandRMap(fname=fname)
+    assert reference == adjacency
+    assert compare_adjacency(adjacency, reference) == ([], [], [])
+
+    reference['a'] = {E: 'b'}
+    reference['c'] = {N: 'b'}
+    del reference['hall_2']
+    assert compare_adjacency(adjacency, reference) == (['hall_2'], ['c'], [('a', S, 'hall_1', None)])
+
+
+def test_verify_logs(tmp_path):
+    files = []
+    for i, rooms in enumerate([['a', 'a', 'b', 'None', 'a', 'hall_1'], ['b', 'hall_2', 'hall_1', 'hall_2', 'b']]):
+        fname = str(tmp_path / 'log{}.csv'.format(i))
+        pd.DataFrame({'Room_in': rooms}).to_csv(fname)
+        files.append(fname)
+    transitions, logs = verify_logs(files, EXPECTED, processes=2)
+    assert transitions == {('b', 'hall_2'): 1, ('hall_2', 'b'): 1}
+    assert logs == {('b', 'hall_2'): 1, ('hall_2', 'b'): 1}
+
+    transitions, logs = verify_logs(files, {'a': {E: 'b'}, 'b': {W: 'a'}}, processes=2)
+    assert transitions[('a', 'hall_1')] == 1
+    assert logs[('b', 'hall_2')] == 1
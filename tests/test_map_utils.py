@@ -0,0 +1,109 @@
+import os
+import numpy as np
+import atomic.definitions.map_utils as map_utils
+from atomic.definitions import Directions
+from atomic.definitions.map_utils import MapData, MapRegistry, getSandRMap as get_map
+
+
+def test_map_matrices(map_files):
+    map_data = MapData('test', *map_files)
+    assert map_data.locations == ['a', 'b', 'c', 'e', 'exit']
+    index = map_data.location_index
+    assert [index[loc] for loc in map_data.locations] == list(range(5))
+
+    adjacency = map_data.adjacency_matrix
+    for loc in map_data.locations:
+        neighbors = set(map_data.adjacency.get(loc, {}).values())
+        assert {n for n in map_data.locations if adjacency[index[loc], index[n]]} == neighbors
+
+    distances = map_data.hop_distances
+    assert distances[index['a'], index['exit']] == 3
+    assert distances[index['a'], index['e']] == 2
+    assert distances[index['b'], index['c']] == 2
+    assert (np.diag(distances) == 0).all()
+    assert (distances[index['exit']] == [-1, -1, -1, -1, 0]).all()
+
+    euclidean = map_data.euclidean_distances
+    assert euclidean[index['a'], index['e']] == np.sqrt(2)
+    assert euclidean[index['b'], index['c']] == euclidean[index['c'], index['b']]
+    assert np.isnan(euclidean[index['a'], index['exit']])
+
+    counts = map_data.victim_counts
+    assert counts['Green'].tolist() == [0, 1, 0, 1, 0]
+    assert counts['Yellow'].tolist() == [0, 0, 0, 1, 0]
+
+
+def test_map_matrices_are_computed_once(map_files):
+    map_data = MapData('test', *map_files)
+    for attr in ['locations', 'location_index', 'adjacency_matrix', 'hop_distances', 'euclidean_distances',
+                 'victim_counts']:
+        assert getattr(map_data, attr) is getattr(map_data, attr), attr
+
+
+def _load_map(map_files, cache_dir, monkeypatch):
+    # whether the map is built from its files, rather than loaded compiled
+    built = []
+    monkeypatch.setattr(map_utils, 'getSandRMap', lambda *args, **kwargs: built.append(args) or get_map(*args, **kwargs))
+    map_data = MapRegistry({'test': map_files}, cache_dir)['test']
+    monkeypatch.undo()
+    return map_data, len(built) > 0
+
+
+def test_map_registry_loads_lazily(map_files):
+    registry = MapRegistry({'test': map_files, 'missing': ('missing.csv', None, None, None, None)})
+    assert list(registry) == ['test', 'missing']
+    assert 'missing' in registry
+    assert registry['test'] is registry['test']
+    assert registry['test'].adjacency['a'] == {Directions.N: 'b', Directions.E: 'c'}
+
+
+def test_map_registry_cache(tmp_path, map_files, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    map_data, built = _load_map(map_files, cache_dir, monkeypatch)
+    assert built
+    assert os.path.isfile(os.path.join(cache_dir, 'map-test.pkl'))
+
+    # compiled map is reused while the map files are not modified
+    cached, built = _load_map(map_files, cache_dir, monkeypatch)
+    assert not built
+    assert cached.version == map_data.version
+    assert cached.adjacency == map_data.adjacency
+    assert cached.victims == map_data.victims
+
+    # modified map file
+    with open(map_files[2], 'a') as file:
+        file.write('3,a,Green,0,0,0\n')
+    mtime = os.path.getmtime(map_files[2]) + 10
+    os.utime(map_files[2], (mtime, mtime))
+    modified, built = _load_map(map_files, cache_dir, monkeypatch)
+    assert built
+    assert modified.victims['a'] == ['Green']
+    assert not _load_map(map_files, cache_dir, monkeypatch)[1]
+
+    # new format of compiled maps
+    monkeypatch.setattr(map_utils, 'MAP_CACHE_FORMAT', map_utils.MAP_CACHE_FORMAT + 1)
+    built = []
+    monkeypatch.setattr(map_utils, 'getSandRMap', lambda *args, **kwargs: built.append(args) or get_map(*args, **kwargs))
+    MapRegistry({'test': map_files}, cache_dir)['test']
+    assert built
+
+
+def test_map_registry_unreadable_cache(tmp_path, map_files, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    _load_map(map_files, cache_dir, monkeypatch)
+    with open(os.path.join(cache_dir, 'map-test.pkl'), 'wb') as file:
+        file.write(b'not a pickle')
+    map_data, built = _load_map(map_files, cache_dir, monkeypatch)
+    assert built
+    assert map_data.adjacency['a'] == {Directions.N: 'b', Directions.E: 'c'}
+    assert not _load_map(map_files, cache_dir, monkeypatch)[1]
+
+
+def test_default_maps_are_shared_per_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_utils, '_default_maps', {})
+    maps = map_utils.get_default_maps()
+    assert 'saturn' in maps
+    assert len(map_utils._default_maps[None]) == 0  # not loaded until accessed
+    other_maps = map_utils.get_default_maps(cache_dir=str(tmp_path))
+    assert maps['saturn'] is map_utils.get_default_maps()['saturn']
+    assert other_maps['saturn'] is not maps['saturn']
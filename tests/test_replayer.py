@@ -0,0 +1,141 @@
+import datetime
+import logging
+import pickle
+import pandas as pd
+import pytest
+import atomic.parsing.replayer
+from atomic.definitions.map_utils import MapData
+from atomic.parsing.replayer import Replayer
+
+PLAYER = 'p1'
+START = datetime.datetime(2021, 2, 1, 10, 0, 0, tzinfo=datetime.timezone.utc)
+ROOMS = ['a', 'a', 'b', 'b', 'e', 'c', 'c', 'a']
+
+
+def _write_log(fname, rooms):
+    pd.DataFrame([{
+        '@timestamp': (START + datetime.timedelta(seconds=t)).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+        'player_ID': PLAYER,
+        'Room_in': room,
+        'num_victims': int(room == 'b'),
+        'victim_0_id': 'vg' if room == 'b' else 'None',
+        'victim_0_color': 'Green' if room == 'b' else 'None',
+        'victim_0_in_FOV': room == 'b',
+        'victim_in_crosshair_id': 'None',
+        'event_triage_victim_id': 'None',
+        'triage_in_progress': False,
+        'triage_result': 'None',
+        'mission_timer': 600 - t} for t, room in enumerate(rooms)]).to_csv(fname)
+
+
+def _get_events(actions):
+    return [(e.type, str(e.payload), e.duration, e.seconds, e.index) for e in actions]
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    fname = str(tmp_path / 'Trial-1_CondWin-test-StaticMap.csv')
+    _write_log(fname, ROOMS)
+    return fname
+
+
+class ParsingReplayer(Replayer):
+    """
+    Gets the events of each log, either by parsing it or from its bundle, without replaying them.
+    """
+
+    def replay(self, duration, logger):
+        pass
+
+
+def _replay(log_file, map_files, cache_dir, **kwargs):
+    replayer = ParsingReplayer([log_file], maps={'test': MapData('test', *map_files)}, models={},
+                               create_observer=False, cache_dir=cache_dir, **kwargs)
+    replayer.process_files()
+    return replayer
+
+
+def test_bundle_is_saved_and_loaded(tmp_path, log_file, map_files, caplog):
+    cache_dir = str(tmp_path / 'cache')
+    parsed = _replay(log_file, map_files, cache_dir)
+    bundle_file = parsed.get_bundle_file(log_file)
+    assert bundle_file.startswith(cache_dir)
+    assert len(parsed.parser.actions) == 5
+
+    # the second replay reads the events from the bundle rather than parsing the log
+    with caplog.at_level(logging.INFO):
+        loaded = _replay(log_file, map_files, cache_dir)
+    assert 'Loaded 5 events from {}'.format(bundle_file) in caplog.messages
+    assert type(loaded.parser) is not type(parsed.parser)
+    assert loaded.parser.player_name() == PLAYER
+    assert sorted(loaded.parser.locations) == sorted(parsed.parser.locations)
+    assert _get_events(loaded.parser.actions) == _get_events(parsed.parser.actions)
+    assert all(e.payload in loaded.triage_agent.actions for e in loaded.parser.actions if e.type != 0)
+
+
+def test_no_bundle_without_cache(log_file, map_files):
+    replayer = _replay(log_file, map_files, None)
+    assert replayer.get_bundle_file(log_file) is None
+
+
+def test_bundle_key(tmp_path, log_file, map_files, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    replayer = _replay(log_file, map_files, cache_dir)
+    bundle_file = replayer.get_bundle_file(log_file)
+    assert replayer.get_bundle_file(log_file) == bundle_file
+
+    # planning over regions
+    replayer.use_regions = True
+    assert replayer.get_bundle_file(log_file) != bundle_file
+    replayer.use_regions = False
+
+    # bundle format
+    monkeypatch.setattr(atomic.parsing.replayer, 'BUNDLE_FORMAT', atomic.parsing.replayer.BUNDLE_FORMAT + 1)
+    assert replayer.get_bundle_file(log_file) != bundle_file
+    monkeypatch.undo()
+
+    # parsing code
+    source_file = tmp_path / 'parser.py'
+    source_file.write_text('# version 1')
+    monkeypatch.setattr(atomic.parsing.replayer, 'BUNDLE_SOURCE_FILES',
+                        atomic.parsing.replayer.BUNDLE_SOURCE_FILES + [str(source_file)])
+    code_bundle_file = replayer.get_bundle_file(log_file)
+    assert code_bundle_file != bundle_file
+    source_file.write_text('# version 2')
+    assert replayer.get_bundle_file(log_file) != code_bundle_file
+    monkeypatch.undo()
+
+    # map
+    with open(map_files[2], 'a') as file:
+        file.write('3,a,Green,0,0,0\n')
+    replayer.map_table = MapData('test', *map_files)
+    assert replayer.get_bundle_file(log_file) != bundle_file
+
+    # log
+    _write_log(log_file, ROOMS[:-1])
+    assert replayer.get_bundle_file(log_file) != bundle_file
+
+
+def test_bundle_of_changed_log_is_not_used(tmp_path, log_file, map_files):
+    cache_dir = str(tmp_path / 'cache')
+    _replay(log_file, map_files, cache_dir)
+    _write_log(log_file, ROOMS[:-2])
+    replayer = _replay(log_file, map_files, cache_dir)
+    assert type(replayer.parser) is atomic.parsing.replayer.ProcessCSV
+    assert len(replayer.parser.actions) == 4
+
+
+@pytest.mark.parametrize('contents', [b'', b'not a pickle',
+                                      pickle.dumps({'format': atomic.parsing.replayer.BUNDLE_FORMAT - 1})])
+def test_unreadable_bundle_is_reparsed(tmp_path, log_file, map_files, contents):
+    cache_dir = str(tmp_path / 'cache')
+    replayer = _replay(log_file, map_files, cache_dir)
+    bundle_file = replayer.get_bundle_file(log_file)
+    with open(bundle_file, 'wb') as file:
+        file.write(contents)
+    assert replayer.load_bundle(bundle_file) is None
+
+    # the log is parsed again and the bundle rewritten
+    replayer = _replay(log_file, map_files, cache_dir)
+    assert type(replayer.parser) is atomic.parsing.replayer.ProcessCSV
+    assert replayer.load_bundle(bundle_file)['format'] == atomic.parsing.replayer.BUNDLE_FORMAT
@@ -0,0 +1,187 @@
+import pickle
+import pytest
+from psychsim.pwl import VectorDistributionSet
+from atomic.definitions import Directions
+from atomic.definitions.victims import GREEN_STR, GOLD_STR
+import atomic.scenarios.single_player as single_player
+from atomic.scenarios.single_player import make_single_player_world, get_single_player_world, WorldTemplate, \
+    get_world_cache_file, TEMPLATE_PLAYER_NAME
+
+N, E, S, W = Directions.N, Directions.E, Directions.S, Directions.W
+
+ADJACENCY = {
+    'a': {N: 'b', E: 'c'},
+    'b': {S: 'a', E: 'e'},
+    'c': {W: 'a', N: 'e'},
+    'e': {W: 'b', S: 'c'},
+}
+VICTIMS = {'b': [GREEN_STR], 'e': [GOLD_STR, GREEN_STR]}
+OPTIONS = [dict(use_unobserved=False, full_obs=True),
+           dict(use_unobserved=True, full_obs=False),
+           dict(use_unobserved=False, full_obs=True, create_observer=False, compact_visits=True,
+                scheduled_expiry=True, triage_lookahead='expected')]
+
+
+def _describe_state(state):
+    return {key: sorted((str(value), prob) for value, prob in state.marginal(key).items()) for key in state.keys()}
+
+
+def _describe_value(value):
+    if isinstance(value, VectorDistributionSet):
+        return _describe_state(value)
+    if isinstance(value, dict):
+        return sorted((str(_describe_value(key)), str(_describe_value(val))) for key, val in value.items())
+    if isinstance(value, (set, frozenset)):
+        return sorted(map(str, value))
+    return str(value)
+
+
+def _describe_model(model):
+    return {attr: _describe_value(value) for attr, value in model.items()}
+
+
+def _describe_world(world):
+    # everything that depends on the player's name: agents, models, variables, state, dynamics and legality
+    return {'agents': list(world.agents),
+            'order': [sorted(turn) for turn in world.turnOrder] if hasattr(world, 'turnOrder') else None,
+            'variables': {key: sorted((attr, str(_describe_value(value))) for attr, value in variable.items())
+                          for key, variable in world.variables.items()},
+            'symbols': dict(world.symbols),
+            'state': _describe_state(world.state),
+            'models': {name: {model: _describe_model(agent.models[model]) for model in agent.models}
+                       for name, agent in world.agents.items()},
+            'actions': {name: sorted(map(str, agent.actions)) for name, agent in world.agents.items()},
+            'legality': {name: {str(action): str(tree) for action, tree in agent.legal.items()}
+                         for name, agent in world.agents.items()},
+            'omega': {name: agent.omega if isinstance(agent.omega, bool) else sorted(agent.omega)
+                      for name, agent in world.agents.items()},
+            'dynamics': {str(key): {str(sub_key): str(tree) for sub_key, tree in dynamics.items()}
+                         for key, dynamics in world.dynamics.items()}}
+
+
+@pytest.mark.parametrize('options', OPTIONS)
+def test_clones_match_fresh_worlds(options):
+    template = WorldTemplate.create('a', ADJACENCY, VICTIMS, **options)
+    for name in ['p1', 'zed']:
+        clone = template.clone(name)
+        world = make_single_player_world(name, 'a', ADJACENCY, VICTIMS, **options)
+        assert clone[1].name == name
+        assert clone[1] is clone[0].agents[name]
+        assert _describe_world(clone[0]) == _describe_world(world[0])
+        assert TEMPLATE_PLAYER_NAME not in str(_describe_world(clone[0]))
+
+
+def test_clones_are_independent():
+    template = WorldTemplate.create('a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True)
+    world1, agent1 = template.clone('p1')[:2]
+    world2 = template.clone('p1')[0]
+    world1.setState(agent1.name, 'loc', 'b')
+    assert world1.getState(agent1.name, 'loc', unique=True) == 'b'
+    assert world2.getState(agent1.name, 'loc', unique=True) == 'a'
+
+
+def test_template_is_stored(tmp_path):
+    world = get_single_player_world('p1', 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True,
+                                    cache_dir=str(tmp_path))[0]
+    stored = list(tmp_path.iterdir())
+    assert len(stored) == 1
+    loaded = WorldTemplate.load(str(stored[0])).clone('p1')[0]
+    assert _describe_world(loaded) == _describe_world(world)
+
+
+def test_template_rejects_other_mentions_of_player():
+    with pytest.raises(ValueError):
+        WorldTemplate.serialize({'name': TEMPLATE_PLAYER_NAME.encode('utf-8')})
+    data = WorldTemplate.serialize({TEMPLATE_PLAYER_NAME: ['{}\'s loc'.format(TEMPLATE_PLAYER_NAME), 'b']})
+    assert WorldTemplate(data).clone('p1') == {'p1': ['p1\'s loc', 'b']}
+
+
+def _get_world(cache_dir, monkeypatch, victims=VICTIMS, **options):
+    # whether the world template is created, rather than loaded from the cache directory
+    created = []
+    create = WorldTemplate.create
+
+    def create_template(*args, **kwargs):
+        created.append(args)
+        return create(*args, **kwargs)
+    monkeypatch.setattr(WorldTemplate, 'create', staticmethod(create_template))
+    world = make_single_player_world('p1', 'a', ADJACENCY, victims, use_unobserved=False, full_obs=True,
+                                     cache_dir=cache_dir, **options)[0]
+    monkeypatch.undo()
+    return world, len(created) > 0
+
+
+def test_stored_world_is_reused(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    world, created = _get_world(cache_dir, monkeypatch)
+    assert created
+    loaded, created = _get_world(cache_dir, monkeypatch)
+    assert not created
+    assert _describe_world(loaded) == _describe_world(world)
+
+
+def test_stored_world_key(tmp_path, monkeypatch):
+    fname = get_world_cache_file(str(tmp_path), 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True)
+    assert get_world_cache_file(str(tmp_path), 'a', dict(reversed(ADJACENCY.items())), VICTIMS,
+                                use_unobserved=False, full_obs=True) == fname
+    assert get_world_cache_file(str(tmp_path), 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True,
+                                compact_visits=True) != fname
+    assert get_world_cache_file(str(tmp_path), 'b', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True) != fname
+    assert get_world_cache_file(str(tmp_path), 'a', ADJACENCY, {'b': [GREEN_STR]}, use_unobserved=False,
+                                full_obs=True) != fname
+
+    # format of the stored worlds
+    monkeypatch.setattr(single_player, 'WORLD_CACHE_FORMAT', single_player.WORLD_CACHE_FORMAT + 1)
+    assert get_world_cache_file(str(tmp_path), 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True) != fname
+    monkeypatch.undo()
+
+    # code defining the worlds
+    source_file = tmp_path / 'world.py'
+    source_file.write_text('# version 1')
+    monkeypatch.setattr(single_player, 'WORLD_SOURCE_FILES', single_player.WORLD_SOURCE_FILES + [str(source_file)])
+    code_fname = get_world_cache_file(str(tmp_path), 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True)
+    assert code_fname != fname
+    source_file.write_text('# version 2')
+    assert get_world_cache_file(str(tmp_path), 'a', ADJACENCY, VICTIMS, use_unobserved=False,
+                                full_obs=True) != code_fname
+
+
+def test_stored_world_of_other_victims_is_not_used(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    _get_world(cache_dir, monkeypatch)
+    world, created = _get_world(cache_dir, monkeypatch, victims={'b': [GREEN_STR]})
+    assert created
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.mark.parametrize('contents', [b'', b'not a pickle', pickle.dumps((b'data', []))])
+def test_unreadable_stored_world_is_rebuilt(tmp_path, monkeypatch, contents):
+    cache_dir = str(tmp_path)
+    world = _get_world(cache_dir, monkeypatch)[0]
+    fname = get_world_cache_file(cache_dir, 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True)
+    with open(fname, 'wb') as file:
+        file.write(contents)
+    rebuilt, created = _get_world(cache_dir, monkeypatch)
+    assert created
+    assert _describe_world(rebuilt) == _describe_world(world)
+    assert not _get_world(cache_dir, monkeypatch)[1]
+
+
+def test_map_template_is_shared_by_victim_variants(monkeypatch):
+    monkeypatch.setattr(single_player, '_map_templates', {})
+    for victims in [VICTIMS, {'c': [GREEN_STR]}, {}]:
+        world = make_single_player_world('p1', 'a', ADJACENCY, victims, use_unobserved=False, full_obs=True,
+                                         share_map=True)[0]
+        assert _describe_world(world) == _describe_world(make_single_player_world(
+            'p1', 'a', ADJACENCY, victims, use_unobserved=False, full_obs=True)[0])
+    assert len(single_player._map_templates) == 1
+    template = next(iter(single_player._map_templates.values()))
+
+    # other initial location, adjacency or map options
+    make_single_player_world('p1', 'b', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True, share_map=True)
+    make_single_player_world('p1', 'a', {**ADJACENCY, 'e': {W: 'b'}}, VICTIMS, use_unobserved=False, full_obs=True,
+                             share_map=True)
+    make_single_player_world('p1', 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True, compact_visits=True,
+                             share_map=True)
+    assert len(single_player._map_templates) == 4
+    assert template in single_player._map_templates.values()
@@ -0,0 +1,63 @@
+from psychsim.pwl import modelKey, turnKey
+from atomic.definitions import Directions
+from atomic.definitions.victims import GREEN_STR, GOLD_STR
+from atomic.scenarios.team import make_team_world, get_teammate_model_name
+
+N, E, S, W = Directions.N, Directions.E, Directions.S, Directions.W
+
+PLAYERS = ['p1', 'p2']
+ADJACENCY = {
+    'a': {N: 'b', E: 'c'},
+    'b': {S: 'a', E: 'e'},
+    'c': {W: 'a', N: 'e'},
+    'e': {W: 'b', S: 'c'},
+}
+VICTIMS = {'b': [GREEN_STR], 'e': [GOLD_STR, GREEN_STR]}
+
+
+def _make_world():
+    return make_team_world(PLAYERS, {'p1': 'a', 'p2': 'e'}, ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True,
+                           create_observer=False)
+
+
+def test_players_take_turns():
+    world, players, _, _, _ = _make_world()
+    assert [player.name for player in players] == PLAYERS
+    assert [world.getFeature(turnKey(name), unique=True) for name in PLAYERS] == [0, 1]
+    assert world.next() == {'p1'}
+
+
+def test_players_predict_teammates_via_teammate_model():
+    world, players, _, _, _ = _make_world()
+    for player in players:
+        teammate_model = get_teammate_model_name(player.name)
+        assert list(player.models) == [player.get_true_model(), teammate_model]
+        assert player.getAttribute('horizon', teammate_model) == 0
+        assert player.getAttribute('beliefs', teammate_model) is True
+
+        # each player believes its teammate follows the teammate model, and observes neither the teammate's model
+        # nor its own
+        beliefs = player.getBelief(model=player.get_true_model())
+        for teammate in players:
+            if teammate is not player:
+                assert world.getFeature(modelKey(teammate.name), beliefs, unique=True) == \
+                       get_teammate_model_name(teammate.name)
+                assert modelKey(teammate.name) not in player.omega
+
+
+def test_team_step():
+    world, players, _, victims, world_map = _make_world()
+    p1, p2 = players
+    move = world_map.getMoveAction(p1, 'a', 'b')[0]
+    assert move in p1.getLegalActions()
+    assert victims.getTriageAction(p2, GOLD_STR) in p2.getLegalActions()
+    world.step({p1.name: move})
+
+    assert world.getState(p1.name, 'loc', unique=True) == 'b'
+    assert world.getState(p2.name, 'loc', unique=True) == 'e'
+    assert world.next() == {'p2'}
+
+    # both players saw the move
+    for player in players:
+        model = world.getFeature(modelKey(player.name), unique=True)
+        assert world.getState(p1.name, 'loc', player.getBelief(model=model), unique=True) == 'b'
@@ -0,0 +1,70 @@
+from psychsim.pwl import WORLD
+from atomic.definitions import Directions
+from atomic.definitions.features import get_feature_keys, get_num_victims_location_key
+from atomic.definitions.victims import GREEN_STR, GOLD_STR, COLORS
+from atomic.inference import set_player_models
+from atomic.scenarios.single_player import make_single_player_world, COLOR_PRIOR_P
+
+N, E, S, W = Directions.N, Directions.E, Directions.S, Directions.W
+
+PLAYER = 'p1'
+ADJACENCY = {
+    'a': {N: 'b', E: 'c'},
+    'b': {S: 'a', E: 'e'},
+    'c': {W: 'a', N: 'e'},
+    'e': {W: 'b', S: 'c'},
+}
+VICTIMS = {'b': [GREEN_STR], 'e': [GOLD_STR, GREEN_STR, GREEN_STR]}
+
+
+def _make_world():
+    return make_single_player_world(PLAYER, 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True,
+                                    create_observer=False)
+
+
+def test_victim_counters_only_where_victims_are():
+    world, agent, _, victims, world_map = _make_world()
+    assert sorted(victims.victimLocations) == ['b', 'e']
+    counters = {key for key in world.state.keys() if key.startswith('{}\'s ctr_'.format(WORLD))}
+    assert counters == {get_num_victims_location_key(loc, color) for loc in ['b', 'e'] for color in COLORS}
+
+    counts = {(loc, color): world.getFeature(get_num_victims_location_key(loc, color), unique=True)
+              for loc in ['b', 'e'] for color in COLORS}
+    assert {key: count for key, count in counts.items() if count > 0} == \
+           {('b', GREEN_STR): 1, ('e', GREEN_STR): 2, ('e', GOLD_STR): 1}
+
+    # the locations without counters are registered as such
+    keys = get_feature_keys(agent)
+    for loc in world_map.all_locations:
+        for color in COLORS:
+            key = keys.victims[color][keys.location_index[loc]]
+            assert (key is None) == (loc not in VICTIMS)
+
+
+def test_triage_is_illegal_where_no_victims_are():
+    world, agent, _, victims, _ = _make_world()
+    green, gold = victims.getTriageAction(PLAYER, GREEN_STR), victims.getTriageAction(PLAYER, GOLD_STR)
+    for loc, legal in [('a', set()), ('c', set()), ('b', {green}), ('e', {green, gold})]:
+        world.setState(PLAYER, 'loc', loc)
+        assert agent.getLegalActions() & {green, gold} == legal, loc
+
+
+def test_unobserved_priors_stay_in_world_state():
+    world, agent, observer, victims, world_map = make_single_player_world(
+        PLAYER, 'a', ADJACENCY, VICTIMS, use_unobserved=True, full_obs=False)
+    set_player_models(world, observer.name, PLAYER, victims, [{'name': 'm0', 'reward': {GREEN_STR: 1, GOLD_STR: 3}},
+                                                              {'name': 'm1', 'reward': {GREEN_STR: 3, GOLD_STR: 1}}])
+    priors = victims.unobsPriors[PLAYER]
+    assert len(priors) == len(world_map.all_locations) * len(COLOR_PRIOR_P)
+
+    # no agent observes the unobserved victim variables
+    assert not set(priors) & set(observer.omega)
+    assert not set(priors) & set(agent.omega)
+
+    # the world and every active belief hold the prior, one independent marginal per variable, also after a step
+    world.step(world_map.getMoveAction(agent, 'a', 'b')[0])
+    for state in [world.state] + world.getActiveBeliefs():
+        assert len({state.keyMap[key] for key in priors}) == len(priors)
+        for key in priors:
+            color = key.split('_')[-1]
+            assert state.marginal(key)[True] == COLOR_PRIOR_P[color], key
@@ -0,0 +1,180 @@
+import copy
+from psychsim.probability import Distribution
+from psychsim.pwl import setToConstantMatrix, makeTree, incrementMatrix, modelKey
+from psychsim.reward import maximizeFeature
+from atomic.definitions import Directions
+from atomic.definitions.features import get_mission_phase_key
+from atomic.definitions.victims import GREEN_STR, GOLD_STR
+from atomic.definitions.world import SearchAndRescueWorld, get_mission_phase, MISSION_PHASES, \
+    MISSION_PHASE_END_TIMES
+from atomic.inference import set_player_models
+from atomic.scenarios.single_player import make_single_player_world
+from atomic.scenarios.team import make_team_world
+
+PLAYER = 'p1'
+ADJACENCY = {
+    'a': {Directions.N: 'b', Directions.E: 'c'},
+    'b': {Directions.S: 'a', Directions.E: 'e'},
+    'c': {Directions.W: 'a', Directions.N: 'e'},
+    'e': {Directions.W: 'b', Directions.S: 'c'},
+}
+VICTIMS = {'b': [GREEN_STR], 'e': [GOLD_STR, GREEN_STR]}
+
+
+def _make_world():
+    # a world with a player waiting for ten seconds per step, and a feature it maximizes, changed by scheduled
+    # transitions
+    world = SearchAndRescueWorld()
+    agent = world.addAgent(PLAYER)
+    x = world.defineState(agent.name, 'x', int)
+    world.setFeature(x, 0)
+    wait = agent.addAction({'verb': 'wait'})
+    world.setDynamics(world.time, wait, makeTree(incrementMatrix(world.time, 10)))
+    world.setOrder([{agent.name}])
+    agent.setReward(maximizeFeature(x, agent.name), 1)
+    agent.resetBelief()
+    return world, agent, x, wait
+
+
+def _add_stale_model(agent):
+    # a model whose beliefs are not possible in the world state, like those left behind by past belief updates
+    agent.addModel('stale', parent=agent.get_true_model())
+    agent.setAttribute('beliefs', copy.deepcopy(agent.getBelief(model=agent.get_true_model())), 'stale')
+    return agent.models['stale']['beliefs']
+
+
+def test_scheduled_effects_apply_to_active_beliefs_only():
+    world, agent, x, wait = _make_world()
+    stale = _add_stale_model(agent)
+    assert world.getActiveBeliefs() == [agent.getBelief(model=agent.get_true_model())]
+    world.scheduleEffects(15, [(x, setToConstantMatrix(x, 2))])
+    world.scheduleEffects(5, [(x, setToConstantMatrix(x, 1))])
+
+    world.step(wait)
+    assert world.getFeature(x, unique=True) == 1
+    assert world.getFeature(x, agent.getBelief(model=agent.get_true_model()), unique=True) == 1
+    assert world.getFeature(x, stale, unique=True) == 0
+
+    world.step(wait)
+    assert world.getFeature(x, unique=True) == 2
+    assert world.getFeature(x, agent.getBelief(model=agent.get_true_model()), unique=True) == 2
+    assert world.getFeature(x, stale, unique=True) == 0
+    assert world.nextScheduled == 2
+
+
+def test_scheduled_effects_are_not_applied_in_lookahead():
+    world, agent, x, wait = _make_world()
+    world.scheduleEffects(5, [(x, setToConstantMatrix(x, 1))])
+    world.lookahead = True
+    world.step(wait)
+    assert world.getFeature(x, unique=True) == 0
+    assert world.nextScheduled == 0
+
+
+def test_lookahead_uses_substituted_dynamics():
+    world, agent, x, wait = _make_world()
+    roll = agent.addAction({'verb': 'roll'})
+    world.setDynamics(x, roll, makeTree({'distribution': [(setToConstantMatrix(x, 1), 0.5),
+                                                          (setToConstantMatrix(x, 2), 0.5)]}))
+    world.setLookaheadDynamics(x, roll, makeTree(setToConstantMatrix(x, 1)))
+    agent.setHorizon(2)
+
+    # the player's projections roll a 1, rather than the expected 1.5 of the regular dynamics
+    decision = agent.decide(selection='distribution')[agent.get_true_model()]
+    assert decision['V'][roll]['__ER__'] == [1, 1]
+    assert world.branchCounts['collapsed'] > 0
+    assert world.branchCounts['lookahead'] == 0
+    assert not world.lookahead
+
+    # real steps keep the regular dynamics
+    world.step(roll)
+    assert world.getFeature(x) == Distribution({1: 0.5, 2: 0.5})
+    assert world.branchCounts['real'] == 2
+
+
+def test_mission_phase_boundaries():
+    assert get_mission_phase(0) == MISSION_PHASES[0]
+    for i, end_time in enumerate(MISSION_PHASE_END_TIMES):
+        assert get_mission_phase(end_time) == MISSION_PHASES[i]
+        assert get_mission_phase(end_time + 1) == MISSION_PHASES[i + 1]
+    assert get_mission_phase(10 * 60) == MISSION_PHASES[-1]
+
+
+def test_mission_phase_changes_after_real_steps():
+    world, agent, x, wait = _make_world()
+    for step in range(1, 32):
+        world.step(wait)
+        assert world.getFeature(world.phase, unique=True) == get_mission_phase(10 * step)
+        assert world.getFeature(world.phase, agent.getBelief(model=agent.get_true_model()), unique=True) == \
+               get_mission_phase(10 * step)
+
+
+def _get_trees(world):
+    # the trees of the agents' rewards and legality, and of the regular and lookahead dynamics
+    for agent in world.agents.values():
+        for model in agent.models.values():
+            yield from (model.get('R') or {}).keys()
+        yield from agent.legal.values()
+    for dynamics in [world.dynamics, world.lookaheadDynamics]:
+        for trees in dynamics.values():
+            yield from trees.values() if isinstance(trees, dict) else [trees]
+
+
+def test_mission_phase_is_not_read_in_lookahead():
+    # the phase is changed by scheduled transitions only, which are not projected in the agents' lookahead, so that no
+    # reward, legality or dynamics may depend on it
+    single = make_single_player_world(PLAYER, 'a', ADJACENCY, VICTIMS, use_unobserved=True, full_obs=False,
+                                      scheduled_expiry=True, triage_lookahead='expected')
+    set_player_models(single[0], single[2].name, PLAYER, single[3],
+                      [{'name': 'm0', 'reward': {GREEN_STR: 1, GOLD_STR: 3}},
+                       {'name': 'm1', 'reward': {GREEN_STR: 3, GOLD_STR: 1}}])
+    team = make_team_world([PLAYER, 'p2'], 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True)
+    for world in [single[0], team[0]]:
+        assert world.phase == get_mission_phase_key()
+        assert world.phase not in world.dynamics
+        trees = list(_get_trees(world))
+        assert len(trees) > 0
+        for tree in trees:
+            assert world.phase not in tree.getKeysIn()
+
+
+def _delete_inactive_models(world):
+    # garbage collects the models neither possible in the world state or in the active beliefs, nor parents of those
+    for name, agent in world.agents.items():
+        keep = set()
+        for state in [world.state] + world.getActiveBeliefs():
+            if modelKey(name) in state:
+                for model in world.getFeature(modelKey(name), state).domain():
+                    while model is not None and model not in keep:
+                        keep.add(model)
+                        model = agent.models[model]['parent']
+        for model in list(agent.models):
+            if model not in keep:
+                agent.deleteModel(model)
+
+
+def test_nested_beliefs_get_clock_when_stepped():
+    world, agent, observer, victims, world_map = make_single_player_world(
+        PLAYER, 'a', ADJACENCY, VICTIMS, use_unobserved=False, full_obs=True)
+    set_player_models(world, observer.name, PLAYER, victims, [{'name': 'm0', 'reward': {GREEN_STR: 1, GOLD_STR: 3}},
+                                                              {'name': 'm1', 'reward': {GREEN_STR: 3, GOLD_STR: 1}}])
+    loc = 'a'
+    for seconds, dest in [(20, 'b'), (45, 'e'), (70, 'c'), (90, 'a')]:
+        # syncing the clock leaves the beliefs to the next step
+        beliefs = world.getActiveBeliefs()
+        world.syncClock(seconds)
+        assert world.getFeature(world.time, unique=True) == seconds
+        assert all(world.getFeature(world.time, belief, unique=True) != seconds for belief in beliefs)
+
+        world.step(world_map.getMoveAction(agent, loc, dest)[0])
+        _delete_inactive_models(world)
+        loc = dest
+
+        # the observer's beliefs, and the player's models within them, hold the world's clock
+        beliefs = world.getActiveBeliefs()
+        observer_beliefs = observer.getBelief(model=world.getFeature(modelKey(observer.name), unique=True))
+        assert observer_beliefs in beliefs
+        assert len(world.getFeature(modelKey(PLAYER), observer_beliefs)) == 2
+        assert len(beliefs) == 4
+        for belief in beliefs:
+            assert world.getFeature(world.time, belief, unique=True) == world.getFeature(world.time, unique=True)
@@ -0,0 +1,144 @@
+import pytest
+import atomic.definitions.features
+import atomic.definitions.world_map
+from atomic.definitions import Directions
+from atomic.definitions.features import get_location_visited_bit, get_num_visits_location_key
+from atomic.definitions.map_utils import get_regions, make_region_map
+from atomic.definitions.world import SearchAndRescueWorld
+from atomic.definitions.world_map import WorldMap
+
+N, E, S, W = Directions.N, Directions.E, Directions.S, Directions.W
+
+# a corridor of three parts, with a room on each side of its middle part and a one-way exit
+ADJACENCY = {
+    'hall1': {E: 'hall2'},
+    'hall2': {W: 'hall1', E: 'hall3', N: 'office', S: 'lab'},
+    'hall3': {W: 'hall2', E: 'exit'},
+    'office': {S: 'hall2'},
+    'lab': {N: 'hall2'},
+}
+
+
+def _bfs_distances(src):
+    distances = {src: 0}
+    frontier = [src]
+    while len(frontier) > 0:
+        next_frontier = []
+        for loc in frontier:
+            for n in ADJACENCY.get(loc, {}).values():
+                if n not in distances:
+                    distances[n] = distances[loc] + 1
+                    next_frontier.append(n)
+        frontier = next_frontier
+    return distances
+
+
+def test_next_hops_give_shortest_paths():
+    world_map = WorldMap(SearchAndRescueWorld(), ADJACENCY)
+    locations = set(ADJACENCY) | {'exit'}
+    for src in locations:
+        distances = _bfs_distances(src)
+        for dest in locations - {src}:
+            directions = world_map.getDirection(src, dest)
+            if dest not in distances:
+                assert directions == [-1]
+                continue
+            assert len(directions) == distances[dest]
+            loc = src
+            for d in directions:
+                loc = ADJACENCY[loc][d]
+            assert loc == dest
+
+
+def test_unreachable_destination_has_no_move():
+    world_map = WorldMap(SearchAndRescueWorld(), ADJACENCY)
+    assert world_map.getDirection('exit', 'hall1') == [-1]
+    assert world_map.getMoveAction('p', 'exit', 'hall1') == []
+
+
+def test_regions_join_parts_of_same_room():
+    regions = get_regions(ADJACENCY)
+    assert regions['hall1'] == regions['hall2'] == regions['hall3'] == 'hall'
+    assert regions['office'] == 'office'
+    assert regions['lab'] == 'lab'
+    assert regions['exit'] == 'exit'
+
+
+def test_regions_split_when_directions_clash():
+    # joining both parts would leave two different regions to the north of the hall
+    adjacency = {
+        'hall1': {E: 'hall2', N: 'office'},
+        'hall2': {W: 'hall1', N: 'lab'},
+        'office': {S: 'hall1'},
+        'lab': {S: 'hall2'},
+    }
+    regions = get_regions(adjacency)
+    assert regions['hall1'] != regions['hall2']
+    assert {regions['hall1'], regions['hall2']} == {'hall1', 'hall2'}
+
+
+def test_region_map():
+    regions = get_regions(ADJACENCY)
+    victims = {'hall1': ['Green'], 'hall3': ['Yellow'], 'lab': ['Green']}
+    adjacency, region_victims = make_region_map(ADJACENCY, victims, regions)
+    assert adjacency == {'hall': {N: 'office', S: 'lab', E: 'exit'}, 'office': {S: 'hall'}, 'lab': {N: 'hall'}}
+    assert region_victims == {'hall': ['Green', 'Yellow'], 'lab': ['Green']}
+
+
+def test_world_map_over_regions():
+    regions = get_regions(ADJACENCY)
+    adjacency, _ = make_region_map(ADJACENCY, {}, regions)
+    world_map = WorldMap(SearchAndRescueWorld(), adjacency, regions)
+    assert world_map.getMapLocation('hall3') == 'hall'
+    assert world_map.getMapLocation('office') == 'office'
+    assert world_map.getDirection('office', 'lab') == [S, S]
+
+
+MOVES = ['hall2', 'office', 'hall2', 'lab', 'hall2', 'hall3']
+
+
+def _visit(compact_visits):
+    # moves a player around the map, returning the locations it visited, according to its visits features
+    world = SearchAndRescueWorld()
+    world_map = WorldMap(world, ADJACENCY, compact_visits=compact_visits)
+    agent = world.addAgent('p1')
+    world_map.makePlayerLocation(agent, 'hall1')
+    world.setOrder([{agent.name}])
+    loc = 'hall1'
+    for dest in MOVES:
+        world.step(world_map.getMoveAction(agent, loc, dest)[0])
+        loc = dest
+    assert world.getState(agent.name, 'loc', unique=True) == loc
+
+    if not compact_visits:
+        return {visited for visited in world_map.all_locations
+                if world.getFeature(get_num_visits_location_key(agent, visited), unique=True) > 0}
+    # compact visits only tell which locations were left, i.e., all visited ones but the current location
+    left = set()
+    for visited in world_map.all_locations:
+        key, bit = get_location_visited_bit(agent, visited)
+        if world.getFeature(key, unique=True) >> bit & 1:
+            left.add(visited)
+    assert loc not in left
+    return left | {loc}
+
+
+@pytest.mark.parametrize('word_bits', [atomic.definitions.world_map.VISIT_WORD_BITS, 2])
+def test_compact_visits_give_visited_locations(monkeypatch, word_bits):
+    monkeypatch.setattr(atomic.definitions.world_map, 'VISIT_WORD_BITS', word_bits)
+    monkeypatch.setattr(atomic.definitions.features, 'VISIT_WORD_BITS', word_bits)
+    assert _visit(True) == _visit(False) == {'hall1', 'hall2', 'hall3', 'office', 'lab'}
+
+
+def test_frequency_reward_rejects_compact_visits():
+    rewards = pytest.importorskip('atomic.model_learning.linear.rewards')
+    for compact_visits in [False, True]:
+        world = SearchAndRescueWorld()
+        world_map = WorldMap(world, ADJACENCY, compact_visits=compact_visits)
+        agent = world.addAgent('p1')
+        world_map.makePlayerLocation(agent, 'hall1')
+        if compact_visits:
+            with pytest.raises(ValueError):
+                rewards.LocationFrequencyReward('freq', agent, world_map.all_locations)
+        else:
+            rewards.LocationFrequencyReward('freq', agent, world_map.all_locations)